@@ -0,0 +1,160 @@
+"""
+Load-aware job admission.
+
+LiveKit only offers a job to workers that report load below their
+threshold, so the worker's load function decides where new rooms land.
+AdmissionController reports the highest pressure among five signals, each
+relative to its limit:
+- rooms running in this worker
+- CPU
+- the worst event loop lag in any job process
+- open STT streams
+- free memory
+
+A load of 1.0 means some limit has been reached. The worker then stops
+being offered jobs, and a request that still arrives is rejected so LiveKit
+can try another worker. Job processes publish their STT streams and loop lag
+through Prometheus multiprocess gauges (report_job_load, with the lag sampled
+by loop_monitor.py), which the worker process aggregates.
+"""
+import collections
+import logging
+import os
+import re
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import psutil
+from livekit.agents import JobContext
+from prometheus_client import CollectorRegistry, multiprocess
+
+from loop_monitor import LoopMonitor
+from voice_metrics import ADMISSION_DECISIONS, STT_STREAMS
+
+logger = logging.getLogger("dialogLens-admission")
+
+# Gauge files left by job processes, e.g. gauge_livesum_1234.db
+_LIVE_GAUGE_FILE = re.compile(r"^gauge_live\w+_(\d+)\.db$")
+
+
+class AdmissionController:
+    """Worker load function and accept/reject decisions from local load signals"""
+
+    def __init__(
+        self,
+        agent_type: str,
+        max_rooms: int = 20,
+        max_cpu: float = 0.8,
+        max_loop_lag: float = 0.2,
+        max_stt_streams: int = 40,
+        min_free_memory_mb: int = 512,
+    ) -> None:
+        self.agent_type = agent_type
+        self.max_rooms = max_rooms
+        self.max_cpu = max_cpu
+        self.max_loop_lag = max_loop_lag
+        self.max_stt_streams = max_stt_streams
+        self.min_free_memory_mb = min_free_memory_mb
+        self._cpu_samples: Deque[float] = collections.deque(maxlen=5)
+        self.pressures: Dict[str, float] = {}
+
+        # Admission counters
+        self.accepted = 0
+        self.rejected: Dict[str, int] = collections.Counter()
+
+    @classmethod
+    def from_env(cls, agent_type: str) -> "AdmissionController":
+        return cls(
+            agent_type,
+            max_rooms=int(os.getenv("MAX_ROOMS_PER_WORKER", "20")),
+            max_cpu=float(os.getenv("ADMISSION_MAX_CPU", "0.8")),
+            max_loop_lag=float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "200")) / 1000,
+            max_stt_streams=int(os.getenv("ADMISSION_MAX_STT_STREAMS", "40")),
+            min_free_memory_mb=int(os.getenv("ADMISSION_MIN_FREE_MEMORY_MB", "512")),
+        )
+
+    def worker_options(self) -> Dict[str, Any]:
+        """WorkerOptions arguments that report this controller's load"""
+        return {"load_fnc": self.load, "load_threshold": 1.0}
+
+    def load(self, worker) -> float:
+        """Highest signal pressure, 1.0 at any limit (runs in an executor thread)"""
+        self._cpu_samples.append(psutil.cpu_percent() / 100)
+        stt_streams, loop_lag = _job_signals()
+        free_mb = psutil.virtual_memory().available / (1024 * 1024)
+
+        self.pressures = {
+            "rooms": len(worker.active_jobs) / self.max_rooms,
+            "cpu": sum(self._cpu_samples) / len(self._cpu_samples) / self.max_cpu,
+            "loop_lag": loop_lag / self.max_loop_lag,
+            "stt_streams": stt_streams / self.max_stt_streams,
+            "memory": self.min_free_memory_mb / max(free_mb, 1.0),
+        }
+        return min(max(self.pressures.values()), 1.0)
+
+    def admit(self, room_name: str) -> bool:
+        """Decide on a job request from the latest load sample, and count it"""
+        reason = self._limiting_signal()
+        if reason is None:
+            self.accepted += 1
+            ADMISSION_DECISIONS.labels(agent_type=self.agent_type, decision="accept", reason="").inc()
+            return True
+
+        self.rejected[reason] += 1
+        ADMISSION_DECISIONS.labels(agent_type=self.agent_type, decision="reject", reason=reason).inc()
+        logger.warning(
+            f"Rejecting room {room_name}: {reason} at {self.pressures[reason]:.0%} of its limit "
+            f"({self.stats()})"
+        )
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+            "pressures": {signal: round(value, 2) for signal, value in self.pressures.items()},
+        }
+
+    def _limiting_signal(self) -> Optional[str]:
+        signal = max(self.pressures, key=self.pressures.get, default=None)
+        if signal is None or self.pressures[signal] < 1.0:
+            return None
+        return signal
+
+
+def read_job_metrics() -> Dict[str, List[Any]]:
+    """Samples of the metrics published by live job processes, by metric name"""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path or not os.path.isdir(path):
+        return {}
+
+    # Processes that exited without cleaning up would otherwise count forever
+    for filename in os.listdir(path):
+        match = _LIVE_GAUGE_FILE.match(filename)
+        if match and not psutil.pid_exists(int(match.group(1))):
+            multiprocess.mark_process_dead(int(match.group(1)), path)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=path)
+    return {metric.name: metric.samples for metric in registry.collect()}
+
+
+def _job_signals() -> Tuple[float, float]:
+    """Open STT streams and worst loop lag published by live job processes"""
+    metrics = read_job_metrics()
+    stt_streams = sum(sample.value for sample in metrics.get("dialoglens_stt_streams", []))
+    loop_lag = max((sample.value for sample in metrics.get("dialoglens_event_loop_lag_seconds", [])), default=0.0)
+    return stt_streams, loop_lag
+
+
+def report_job_load(ctx: JobContext, agent_type: str, stt_streams: int = 1, interval: float = 0.25) -> None:
+    """Publish this job's STT streams and event loop health until it shuts down"""
+    streams = STT_STREAMS.labels(agent_type=agent_type)
+    streams.inc(stt_streams)
+    monitor = LoopMonitor.from_env(agent_type, interval=interval)
+    monitor.start()
+
+    async def stop() -> None:
+        monitor.stop()
+        streams.dec(stt_streams)
+
+    ctx.add_shutdown_callback(stop)
@@ -0,0 +1,319 @@
+"""
+Shared HTTP client for agent-to-API communication.
+
+Every job running in a worker process shares one keep-alive connection pool
+instead of opening a new session (TCP connection, DNS lookup, connector) per
+segment or interaction. Jobs acquire the client when they start and release
+it on shutdown; the pool is closed when the last job releases it.
+
+Uploads follow the shared UploadPolicy (deadlines, jittered retries, circuit
+breaker). Uploads that still cannot reach the API are written to the local
+upload spool and replayed in order once it recovers.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+from upload_policy import CircuitBreaker, UploadPolicy
+from upload_spool import UploadSpool
+from wire_format import WireCodec
+
+logger = logging.getLogger("dialogLens-api-client")
+
+
+class APIClient:
+    """Keep-alive HTTP client for the DialogLens backend API"""
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        limit: int = 100,
+        limit_per_host: int = 32,
+        keepalive_timeout: float = 30.0,
+        spool: Optional[UploadSpool] = None,
+        replay_interval: float = 2.0,
+        policy: Optional[UploadPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        codec: Optional[WireCodec] = None,
+    ) -> None:
+        self.api_url = api_url.rstrip("/")
+        self.api_key = api_key
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+        self.spool = spool
+        self.replay_interval = replay_interval
+        self.policy = policy or UploadPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.codec = codec
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._replay_task: Optional[asyncio.Task] = None
+
+        # Pool usage counters
+        self.requests_total = 0
+        self.requests_failed = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.retries = 0
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self) -> None:
+        """Create the connection pool"""
+        if self.started:
+            return
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            trace_configs=[trace_config],
+        )
+        if self.spool is not None:
+            self._replay_task = asyncio.create_task(self._replay_loop())
+        logger.info(
+            f"API client started (limit={self.limit}, limit_per_host={self.limit_per_host})"
+        )
+
+    async def close(self) -> None:
+        """Close the connection pool"""
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+            self._replay_task = None
+        if self.spool is not None:
+            await self.spool.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            logger.info(f"API client closed: {self.stats()}")
+
+    async def post(self, path: str, data: Dict[str, Any]) -> Tuple[int, str]:
+        """POST a payload to an API path and return the status code and body"""
+        if self.codec is None or not self.codec.handles(path):
+            return await self._post(path, json=data)
+
+        # A handle the API no longer knows (410) is registered again once
+        for _ in range(2):
+            encoded = await self.codec.encode(path, data, self._post_json)
+            if encoded is None:
+                break
+            body, headers = encoded
+            status, text = await self._post(path, data=body, headers=headers)
+            if status != 410:
+                return status, text
+            self.codec.forget(data["roomId"])
+        return await self._post(path, json=data)
+
+    async def _post_json(self, path: str, data: Dict[str, Any]) -> Tuple[int, str]:
+        return await self._post(path, json=data)
+
+    async def _post(self, path: str, **kwargs: Any) -> Tuple[int, str]:
+        if not self.started:
+            await self.start()
+
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            async with self._session.post(
+                f"{self.api_url}{path}",
+                timeout=aiohttp.ClientTimeout(total=self.policy.request_timeout),
+                **kwargs,
+            ) as response:
+                body = await response.text()
+                if response.status != 200:
+                    self.requests_failed += 1
+                return response.status, body
+        except Exception:
+            self.requests_failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def send(self, path: str, data: Dict[str, Any]) -> bool:
+        """
+        Deliver a payload to the API, spooling it if the API is unavailable.
+
+        Returns True once the payload was accepted or spooled for replay and
+        False if the API rejected it.
+        """
+        # Keep ordering while a backlog is waiting for replay
+        if self.spool is not None and self.spool.depth > 0:
+            await self.spool.append(path, data)
+            return True
+
+        status, body = await self.post_with_retry(path, data)
+
+        if status == 200:
+            return True
+        if self.policy.is_retryable(status):
+            if self.spool is not None:
+                await self.spool.append(path, data)
+                return True
+            logger.error(f"Dropped upload to {path}: API unavailable ({status})")
+            return False
+
+        logger.error(f"API rejected upload to {path}: {status} - {body}")
+        return False
+
+    async def post_with_retry(self, path: str, data: Dict[str, Any]) -> Tuple[int, str]:
+        """
+        POST with the upload policy applied.
+
+        Retries connection errors and 5xx responses with jittered backoff
+        until the deadline, and fails fast while the circuit breaker is open.
+        Connection failures are reported as status 0.
+        """
+        deadline = time.monotonic() + self.policy.deadline
+        attempt = 0
+
+        while True:
+            if not self.breaker.allow():
+                return 0, "circuit breaker open"
+
+            try:
+                status, body = await self.post(path, data)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, body = 0, str(e) or type(e).__name__
+            except BaseException:
+                # Cancelled or failed before reaching the API; a half-open probe must not stay taken
+                self.breaker.release_probe()
+                raise
+
+            if not self.policy.is_retryable(status):
+                self.breaker.record_success()
+                return status, body
+            self.breaker.record_failure()
+
+            delay = self.policy.backoff(attempt)
+            if attempt >= self.policy.max_retries or time.monotonic() + delay >= deadline:
+                logger.warning(f"API unavailable for {path} after {attempt + 1} attempts: {status} {body}")
+                return status, body
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool usage counters"""
+        stats: Dict[str, Any] = {
+            "requests_total": self.requests_total,
+            "requests_failed": self.requests_failed,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "retries": self.retries,
+            "breaker": self.breaker.stats(),
+        }
+        if self.spool is not None:
+            stats["spool"] = self.spool.stats()
+        if self.codec is not None:
+            stats["wire_format"] = self.codec.stats()
+        return stats
+
+    async def _replay_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            if self.spool.depth > 0:
+                try:
+                    await self.spool.replay(self._replay_one)
+                except Exception as e:
+                    logger.error(f"Error replaying upload spool: {e}")
+
+    async def _replay_one(self, path: str, data: Dict[str, Any]) -> bool:
+        # Stays parked while the breaker is open; its half-open probe is the replay
+        if not self.breaker.allow():
+            return False
+        try:
+            status, body = await self.post(path, data)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status, body = 0, ""
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+
+        if self.policy.is_retryable(status):
+            self.breaker.record_failure()
+            return False
+        self.breaker.record_success()
+
+        if 400 <= status < 500:
+            # Never going to succeed; don't let it block the backlog
+            logger.error(f"Discarding spooled upload to {path}: {status} - {body}")
+            return True
+        return status == 200
+
+    async def _on_connection_created(self, session, trace_ctx, params) -> None:
+        self.connections_created += 1
+
+    async def _on_connection_reused(self, session, trace_ctx, params) -> None:
+        self.connections_reused += 1
+
+
+_client: Optional[APIClient] = None
+_client_refs = 0
+
+
+async def acquire_client() -> APIClient:
+    """Get the process-wide API client, starting it for the first job"""
+    global _client, _client_refs
+
+    if _client is None:
+        _client = APIClient(
+            api_url=os.getenv("API_URL", "http://localhost:3000/api"),
+            api_key=os.getenv("API_KEY", ""),
+            limit=int(os.getenv("API_POOL_LIMIT", "100")),
+            limit_per_host=int(os.getenv("API_POOL_LIMIT_PER_HOST", "32")),
+            keepalive_timeout=float(os.getenv("API_POOL_KEEPALIVE", "30")),
+            policy=UploadPolicy.from_env(),
+            breaker=CircuitBreaker.from_env(),
+            codec=WireCodec.from_env(),
+        )
+
+        spool = UploadSpool(
+            os.getenv("SPOOL_DIR", "/app/.cache/spool"),
+            max_bytes=int(os.getenv("SPOOL_MAX_MB", "256")) * 1024 * 1024,
+        )
+        if spool.open():
+            _client.spool = spool
+
+    await _client.start()
+    _client_refs += 1
+    return _client
+
+
+async def release_client() -> None:
+    """Release the process-wide API client, closing it after the last job"""
+    global _client, _client_refs
+
+    _client_refs = max(_client_refs - 1, 0)
+    if _client_refs == 0 and _client is not None:
+        await _client.close()
+        _client = None
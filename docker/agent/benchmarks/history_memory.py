@@ -0,0 +1,55 @@
+"""
+Memory per room for the conversation history as a call grows.
+
+Compares the old unbounded list of dicts with ConversationHistory at the
+configured retention. Run from docker/agent:
+
+    python benchmarks/history_memory.py
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_history import ConversationHistory  # noqa: E402
+
+TURN_TEXT = "Sure, I can help with that. Could you tell me which plan you are on?"
+
+
+def measure(build, turns: int) -> int:
+    """Bytes still allocated after recording `turns` turns"""
+    tracemalloc.start()
+    history = build()
+    for i in range(turns):
+        # Fresh string per turn, as STT results would be
+        history.append(("user", f"{TURN_TEXT} {i}", i * 1000))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+class ListHistory(list):
+    """The previous unbounded list of dicts"""
+
+    def append(self, turn):
+        speaker, text, timestamp = turn
+        super().append({"speaker": speaker, "text": text, "timestamp": timestamp})
+
+
+class RingHistory(ConversationHistory):
+    def append(self, turn):
+        return super().append(*turn)
+
+
+def main() -> None:
+    max_turns = int(os.getenv("HISTORY_MAX_TURNS", "50"))
+    print(f"{'turns':>8} {'list of dicts':>16} {'ring buffer':>14}")
+    for turns in (100, 1_000, 10_000, 100_000):
+        unbounded = measure(ListHistory, turns)
+        bounded = measure(lambda: RingHistory(max_turns), turns)
+        print(f"{turns:>8} {unbounded / 1024:>13.1f} KB {bounded / 1024:>11.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,519 @@
+"""
+Offline load test for the agent worker.
+
+Runs N simulated rooms in one process against the real agent code and
+upload path. Transcription rooms feed scripted STT results into the
+transcript pipeline. Customer rooms run a real AgentSession around
+CustomerServiceAgent, so every turn goes through the session's turn
+handling and the agent's own llm_node (FAQ router, context window), with
+fake STT, LLM and TTS plugins and paced audio input and output in place of
+LiveKit and the providers. A local aiohttp server stands in for the Next.js
+API. No network access is needed. Run from docker/agent:
+
+    python benchmarks/loadtest.py --rooms 10,50,100 --duration 30
+
+For each room count it reports segments and interactions per second,
+p50/p99 upload latency (creation to API receipt), p99 reply latency (end of
+user speech to agent audio), event loop lag and RSS per room. The largest step whose p99 stays under --slo-ms is reported as
+the rooms-per-worker limit.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livekit import rtc  # noqa: E402
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, AgentSession, llm, stt, tts  # noqa: E402
+from livekit.agents.voice import io  # noqa: E402
+
+from caption_stabilizer import CaptionStabilizer  # noqa: E402
+from context_window import ContextWindow  # noqa: E402
+from customer_agent import CustomerServiceAgent  # noqa: E402
+from faq_router import FAQRouter  # noqa: E402
+from segment_uploader import SegmentUploader  # noqa: E402
+from transcript_pipeline import TranscriptPipeline  # noqa: E402
+from transport import HTTPTransport  # noqa: E402
+from upload_dispatcher import UploadDispatcher  # noqa: E402
+
+USER_LINES = [
+    "I can't find the transcript from yesterday's meeting",
+    "Do you support multiple languages and accents?",
+    "The speaker names in my transcript are wrong",
+    "Does it work with Zoom or Google Meet?",
+    "I'd like to change the email address on my account",
+    "Can I get a summary of my meeting?",
+    "The recording stopped halfway through the call",
+    "How do I share a transcript with my team?",
+]
+
+WORDS = (
+    "so the main thing we need to decide today is how we roll out the new "
+    "pricing to existing customers and whether support is ready for the "
+    "questions that will come in after the announcement goes out next week"
+).split()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class MockAPI:
+    """Local stand-in for the agent-facing API routes"""
+
+    def __init__(self, latency: float, error_rate: float) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.segments = 0
+        self.interactions = 0
+        self.upload_latencies: List[float] = []
+        self._runner = None
+        self.url = ""
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.add_routes([
+            web.post("/api/transcripts/segment/batch", self._segment_batch),
+            web.post("/api/transcripts/segment", self._segment),
+            web.post("/api/conversations/interaction", self._interaction),
+        ])
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/api"
+
+    async def close(self) -> None:
+        await self._runner.cleanup()
+
+    def reset(self) -> None:
+        self.segments = 0
+        self.interactions = 0
+        self.upload_latencies = []
+
+    async def _respond(self, items: List[Dict[str, Any]]) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            return web.json_response({"error": "injected failure"}, status=503)
+        # Timestamps are epoch ms, the clock the agents stamp items with
+        now = time.time() * 1000
+        self.upload_latencies.extend((now - item["timestamp"]) / 1000 for item in items)
+        return web.json_response({"success": True})
+
+    async def _segment_batch(self, request: web.Request) -> web.Response:
+        segments = (await request.json())["segments"]
+        response = await self._respond(segments)
+        if response.status == 200:
+            self.segments += len(segments)
+        return response
+
+    async def _segment(self, request: web.Request) -> web.Response:
+        response = await self._respond([await request.json()])
+        if response.status == 200:
+            self.segments += 1
+        return response
+
+    async def _interaction(self, request: web.Request) -> web.Response:
+        response = await self._respond([await request.json()])
+        if response.status == 200:
+            self.interactions += 1
+        return response
+
+
+class SpeechScript:
+    """Scripted speaker for one participant: growing interims, then a final"""
+
+    def __init__(self, rng: random.Random, words_per_second: float = 2.5, interim_interval: float = 0.15):
+        self.rng = rng
+        self.words_per_second = words_per_second
+        self.interim_interval = interim_interval
+
+    async def utterance(self, text: str, emit) -> None:
+        words = text.split()
+        spoken = 0.0
+        while spoken < len(words):
+            await asyncio.sleep(self.interim_interval)
+            spoken += self.words_per_second * self.interim_interval
+            await emit(" ".join(words[:int(spoken) + 1]), False)
+        await emit(text, True)
+
+    def random_utterance(self) -> str:
+        start = self.rng.randrange(len(WORDS) - 15)
+        return " ".join(WORDS[start:start + self.rng.randint(6, 15)])
+
+
+SAMPLE_RATE = 16000
+
+
+class FakeSTT(stt.STT):
+    """Streaming STT plugin that recognizes whatever the room's user says next"""
+
+    def __init__(self, script: SpeechScript) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=True))
+        self.script = script
+        self.ended_at: Optional[float] = None
+        self._utterances: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue()
+
+    async def say(self, text: str) -> None:
+        """Speak a line and wait until the STT has emitted its end of speech"""
+        done = asyncio.get_running_loop().create_future()
+        await self._utterances.put((text, done))
+        await done
+
+    async def _recognize_impl(self, buffer, *, language=None, conn_options=None):
+        raise NotImplementedError("the load test only streams")
+
+    def stream(self, *, language=None, conn_options=DEFAULT_API_CONNECT_OPTIONS) -> "FakeRecognizeStream":
+        return FakeRecognizeStream(stt=self, conn_options=conn_options)
+
+
+class FakeRecognizeStream(stt.RecognizeStream):
+    async def _run(self) -> None:
+        async def drain_audio() -> None:
+            async for _ in self._input_ch:
+                pass
+
+        drain = asyncio.create_task(drain_audio())
+        try:
+            while True:
+                text, done = await self._stt._utterances.get()
+                self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH))
+
+                async def emit(transcript: str, is_final: bool) -> None:
+                    kind = stt.SpeechEventType.FINAL_TRANSCRIPT if is_final else stt.SpeechEventType.INTERIM_TRANSCRIPT
+                    alternative = stt.SpeechData(language="en", text=transcript, confidence=0.95)
+                    self._event_ch.send_nowait(stt.SpeechEvent(type=kind, alternatives=[alternative]))
+
+                await self._stt.script.utterance(text, emit)
+                self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH))
+                self._stt.ended_at = time.monotonic()
+                done.set_result(None)
+        finally:
+            drain.cancel()
+
+
+class FakeLLM(llm.LLM):
+    """LLM plugin that streams a canned reply after a jittered time to first token"""
+
+    def __init__(self, rng: random.Random, ttft: float, tokens_per_second: float = 50) -> None:
+        super().__init__()
+        self.rng = rng
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+
+    def chat(self, *, chat_ctx, tools=None, conn_options=DEFAULT_API_CONNECT_OPTIONS, **kwargs) -> "FakeLLMStream":
+        return FakeLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class FakeLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        fake = self._llm
+        await asyncio.sleep(max(fake.rng.gauss(fake.ttft, fake.ttft / 4), 0.0))
+        request_id = uuid.uuid4().hex
+        for word in ("Let me look into that for you. " * fake.rng.randint(1, 3)).split():
+            delta = llm.ChoiceDelta(role="assistant", content=word + " ")
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=delta))
+            await asyncio.sleep(1 / fake.tokens_per_second)
+
+
+class FakeTTS(tts.TTS):
+    """TTS plugin that returns silence of the text's speaking length after a fixed time to first byte"""
+
+    def __init__(self, ttfb: float, words_per_second: float = 3.0) -> None:
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=SAMPLE_RATE, num_channels=1)
+        self.ttfb = ttfb
+        self.words_per_second = words_per_second
+
+    def synthesize(self, text: str, *, conn_options=DEFAULT_API_CONNECT_OPTIONS) -> "FakeChunkedStream":
+        return FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        output_emitter.initialize(
+            request_id=uuid.uuid4().hex, sample_rate=SAMPLE_RATE, num_channels=1, mime_type="audio/pcm"
+        )
+        await asyncio.sleep(self._tts.ttfb)
+        seconds = len(self._input_text.split()) / self._tts.words_per_second
+        output_emitter.push(bytes(2 * int(SAMPLE_RATE * seconds)))
+        output_emitter.flush()
+
+
+class SilentAudioInput(io.AudioInput):
+    """Microphone stand-in: 20ms frames of silence in real time"""
+
+    def __init__(self) -> None:
+        super().__init__(label="loadtest-silence")
+        samples = SAMPLE_RATE // 50
+        self._frame = rtc.AudioFrame(bytes(2 * samples), SAMPLE_RATE, 1, samples)
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        await asyncio.sleep(0.02)
+        return self._frame
+
+
+class PacedAudioOutput(io.AudioOutput):
+    """Speaker stand-in that reports playback finished once the audio would have played"""
+
+    def __init__(self) -> None:
+        super().__init__(label="loadtest-playout", capabilities=io.AudioOutputCapabilities(pause=False))
+        self._pushed = 0.0
+        self._started: Optional[float] = None
+        self._playout: Optional[asyncio.Task] = None
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        if self._started is None:
+            self._started = time.monotonic()
+            self.on_playback_started(created_at=time.time())
+        self._pushed += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        if self._started is None:
+            return
+        pushed, remaining = self._pushed, self._pushed - (time.monotonic() - self._started)
+        self._pushed, self._started = 0.0, None
+
+        async def play_out() -> None:
+            await asyncio.sleep(max(remaining, 0.0))
+            self.on_playback_finished(playback_position=pushed, interrupted=False)
+
+        self._playout = asyncio.create_task(play_out())
+
+    def clear_buffer(self) -> None:
+        if self._playout is not None and not self._playout.done():
+            self._playout.cancel()
+            self.on_playback_finished(playback_position=0.0, interrupted=True)
+        elif self._started is not None:
+            self.on_playback_finished(playback_position=time.monotonic() - self._started, interrupted=True)
+        self._pushed, self._started = 0.0, None
+
+
+async def transcription_room(index: int, api, stop: asyncio.Event) -> None:
+    async def publish_caption(participant_id: str, text: str, is_final: bool) -> int:
+        return len(text)
+
+    room = f"load-transcription-{index}"
+    pipeline = TranscriptPipeline(
+        SegmentUploader(HTTPTransport(api), room),
+        CaptionStabilizer(publish=publish_caption),
+    )
+    pipeline.start()
+
+    rng = random.Random(index)
+    speakers = []
+    for n in range(2):
+        speakers.append(SimpleNamespace(identity=f"user-{index}-{n}", name=f"User {n}"))
+
+    script = SpeechScript(rng)
+    try:
+        while not stop.is_set():
+            speaker = rng.choice(speakers)
+
+            async def emit(text: str, is_final: bool) -> None:
+                await pipeline.on_transcription(speaker.identity, speaker.name, text, is_final, 0.95)
+
+            await script.utterance(script.random_utterance(), emit)
+            await asyncio.sleep(rng.uniform(0.3, 1.5))
+    finally:
+        await pipeline.close()
+
+
+async def customer_room(
+    index: int, api, stop: asyncio.Event, llm_ttft: float, tts_ttfb: float, reply_latencies: List[float]
+) -> None:
+    async def summarize(previous: str, transcript: str) -> str:
+        await asyncio.sleep(llm_ttft * 2)
+        return (previous + " " + transcript)[-600:]
+
+    dispatcher = UploadDispatcher(api)
+    dispatcher.start()
+    context_window = ContextWindow(summarize)
+    agent = CustomerServiceAgent(
+        dispatcher, f"load-customer-{index}", {"name": "Sam"}, context_window, FAQRouter.from_env()
+    )
+
+    rng = random.Random(1000 + index)
+    user = FakeSTT(SpeechScript(rng))
+    session = AgentSession(
+        stt=user,
+        llm=FakeLLM(rng, llm_ttft),
+        tts=FakeTTS(tts_ttfb),
+        # The fake STT's end of speech closes the turn, as no VAD runs; the
+        # paced output cannot pause, so false interruptions are not resumed
+        turn_handling={"turn_detection": "stt", "interruption": {"resume_false_interruption": False}},
+    )
+    session.input.audio = SilentAudioInput()
+    session.output.audio = PacedAudioOutput()
+    agent.attach_session(session)
+
+    replied = asyncio.Event()
+
+    @session.on("agent_state_changed")
+    def on_agent_state(event) -> None:
+        if event.new_state == "speaking" and user.ended_at is not None:
+            reply_latencies.append(time.monotonic() - user.ended_at)
+            user.ended_at = None
+        elif event.old_state == "speaking":
+            replied.set()
+
+    await session.start(agent, record=False)
+    try:
+        while not stop.is_set():
+            replied.clear()
+            await user.say(rng.choice(USER_LINES))
+            # The agent replies and speaks, then the user thinks
+            try:
+                await asyncio.wait_for(replied.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(rng.uniform(0.5, 2.0))
+    finally:
+        await session.aclose()
+        await context_window.close()
+        await dispatcher.close()
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.1) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(loop.time() - expected, 0.0))
+
+
+async def run_step(rooms: int, args, mock: MockAPI, api) -> Dict[str, Any]:
+    process = psutil.Process()
+    baseline_rss = process.memory_info().rss
+    mock.reset()
+
+    stop = asyncio.Event()
+    reply_latencies: List[float] = []
+    transcription_rooms = round(rooms * args.transcription_share)
+    tasks = [
+        asyncio.create_task(transcription_room(i, api, stop)) for i in range(transcription_rooms)
+    ] + [
+        asyncio.create_task(customer_room(
+            i, api, stop, args.llm_ttft_ms / 1000, args.tts_ttfb_ms / 1000, reply_latencies
+        ))
+        for i in range(rooms - transcription_rooms)
+    ]
+    lag: List[float] = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag))
+
+    peak_rss = baseline_rss
+    started = time.monotonic()
+    while time.monotonic() - started < args.duration:
+        await asyncio.sleep(1.0)
+        peak_rss = max(peak_rss, process.memory_info().rss)
+    elapsed = time.monotonic() - started
+
+    stop.set()
+    await asyncio.gather(*tasks, lag_task)
+
+    return {
+        "rooms": rooms,
+        "segments_per_s": mock.segments / elapsed,
+        "interactions_per_s": mock.interactions / elapsed,
+        "upload_p50_ms": percentile(mock.upload_latencies, 0.50) * 1000,
+        "upload_p99_ms": percentile(mock.upload_latencies, 0.99) * 1000,
+        "reply_p99_ms": percentile(reply_latencies, 0.99) * 1000,
+        "loop_lag_p99_ms": percentile(lag, 0.99) * 1000,
+        "rss_per_room_kb": max(peak_rss - baseline_rss, 0) / rooms / 1024,
+    }
+
+
+async def run_worker(args) -> Dict[str, Any]:
+    """One load step in this process: mock API, shared client, N rooms"""
+    random.seed(args.seed)
+    mock = MockAPI(args.api_latency_ms / 1000, args.api_error_rate)
+    await mock.start()
+
+    os.environ.update({
+        "API_URL": mock.url,
+        "API_KEY": "loadtest",
+        "SPOOL_DIR": tempfile.mkdtemp(prefix="loadtest-spool-"),
+        "TTS_CACHE_DIR": "",
+    })
+
+    from api_client import acquire_client, release_client
+    api = await acquire_client()
+    try:
+        result = await run_step(args.rooms[0], args, mock, api)
+        result["api_client"] = api.stats()
+        return result
+    finally:
+        await release_client()
+        await mock.close()
+
+
+async def main(args) -> None:
+    """Run each room count in a fresh worker process so RSS is not shared between steps"""
+    print(
+        f"{'rooms':>6} {'seg/s':>8} {'int/s':>7} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'reply p99':>9} {'lag p99':>8} {'RSS/room':>10}"
+    )
+    limit = 0
+    for rooms in args.rooms:
+        child = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--step", str(rooms),
+            stdout=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await child.communicate()
+        if child.returncode != 0:
+            print(f"{rooms:>6} step failed with exit code {child.returncode}")
+            continue
+
+        result = json.loads(stdout.decode().strip().splitlines()[-1])
+        print(
+            f"{result['rooms']:>6} {result['segments_per_s']:>8.1f} {result['interactions_per_s']:>7.1f} "
+            f"{result['upload_p50_ms']:>8.1f} {result['upload_p99_ms']:>8.1f} "
+            f"{result['reply_p99_ms']:>9.1f} {result['loop_lag_p99_ms']:>8.1f} {result['rss_per_room_kb']:>7.0f} KB"
+        )
+        if result["upload_p99_ms"] <= args.slo_ms:
+            limit = rooms
+
+    print(f"Rooms per worker within p99 upload SLO of {args.slo_ms:.0f}ms: {limit or 'none of the tested steps'}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=lambda v: [int(n) for n in v.split(",")], default=[10, 50, 100],
+                        help="comma-separated room counts to step through")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per step")
+    parser.add_argument("--transcription-share", type=float, default=0.5,
+                        help="fraction of rooms that are transcription rooms")
+    parser.add_argument("--api-latency-ms", type=float, default=20, help="mock API response time")
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="fraction of mock API 503s")
+    parser.add_argument("--llm-ttft-ms", type=float, default=400, help="fake LLM time to first token")
+    parser.add_argument("--tts-ttfb-ms", type=float, default=150, help="fake TTS time to first byte")
+    parser.add_argument("--slo-ms", type=float, default=1000, help="p99 upload latency SLO")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--step", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.step is not None:
+        args.rooms = [args.step]
+        print(json.dumps(asyncio.run(run_worker(args))))
+    else:
+        asyncio.run(main(args))
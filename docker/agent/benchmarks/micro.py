@@ -0,0 +1,358 @@
+"""
+Micro-benchmarks for the agents' per-event hot paths.
+
+Each case runs one handler the way a live room calls it (segment dispatch
+in the transcript pipeline, process_interaction, instruction and greeting
+building, room-metadata parsing in the job request handlers, and encoding a
+segment batch as JSON or in the compact wire format) with uploads queued
+but never sent. For every case it reports throughput and the
+bytes allocated per call, measured with tracemalloc. Run from docker/agent:
+
+    python benchmarks/micro.py                  # table
+    python benchmarks/micro.py --json           # stable JSON on stdout
+    python benchmarks/micro.py --check          # fail on regression vs baselines.json
+    python benchmarks/micro.py --save-baseline  # refresh baselines.json
+
+--check exits non-zero when a case's allocation per call grows by more than
+--max-alloc-growth relative to the stored baseline. Allocations are
+deterministic for a given code path, so the gate holds on any machine.
+Throughput is the median of the repeats and differs by host and load, so it
+is only reported against the baseline unless --max-slowdown is given.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import customer_agent  # noqa: E402
+import main as assistant_agent  # noqa: E402
+import transcription_agent  # noqa: E402
+from caption_stabilizer import CaptionStabilizer  # noqa: E402
+from context_window import ContextWindow  # noqa: E402
+from segment_uploader import SegmentUploader  # noqa: E402
+from transcript_pipeline import TranscriptPipeline  # noqa: E402
+from upload_dispatcher import UploadDispatcher  # noqa: E402
+from wire_format import SEGMENT_BATCH_PATH, WireCodec  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+SEGMENT_TEXT = "so the main thing we need to decide today is how we roll out the new pricing"
+CUSTOMER_CONTEXT = {"name": "Sam", "company": "Acme", "purpose": "billing question"}
+ROOM_METADATA = json.dumps({
+    "requiresAgent": False,
+    "requiresTranscription": True,
+    "requiresCustomerAgent": False,
+    "customerContext": CUSTOMER_CONTEXT,
+})
+
+# A case builds fresh state and returns the operation to time (sync or async)
+Case = Callable[[], Callable[[], Any]]
+CASES: Dict[str, Case] = {}
+
+
+def case(name: str):
+    def register(setup: Case) -> Case:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class _NullTransport:
+    async def send_segments(self, room_name, segments) -> bool:
+        return True
+
+    async def spill_segments(self, room_name, segments) -> bool:
+        return True
+
+
+def _transcript_pipeline() -> TranscriptPipeline:
+    # Uploader is never started, so segments stay queued instead of being sent
+    uploader = SegmentUploader(_NullTransport(), "bench-room", max_queue_size=1_000_000, overflow_policy="block")
+    return TranscriptPipeline(uploader, CaptionStabilizer())
+
+
+def _dispatcher() -> UploadDispatcher:
+    return UploadDispatcher(None, max_queue_size=1_000_000, policy="block")
+
+
+@case("segment_final")
+def segment_final():
+    pipeline = _transcript_pipeline()
+
+    async def op():
+        await pipeline.on_transcription("speaker-1", "Speaker One", SEGMENT_TEXT, True, 0.93)
+    return op
+
+
+@case("segment_interim")
+def segment_interim():
+    pipeline = _transcript_pipeline()
+
+    async def op():
+        await pipeline.on_transcription("speaker-1", "Speaker One", SEGMENT_TEXT, False, 0.81)
+    return op
+
+
+@case("assistant_process_interaction")
+def assistant_process_interaction():
+    agent = assistant_agent.DialogLensAssistant(_dispatcher(), "bench-room")
+
+    async def op():
+        await agent.process_interaction("user", SEGMENT_TEXT)
+    return op
+
+
+@case("customer_process_interaction")
+def customer_process_interaction():
+    agent = customer_agent.CustomerServiceAgent(
+        _dispatcher(), "bench-room", CUSTOMER_CONTEXT, ContextWindow(None)
+    )
+
+    async def op():
+        await agent.process_interaction("user", SEGMENT_TEXT)
+    return op
+
+
+@case("build_instructions")
+def build_instructions():
+    agent = customer_agent.CustomerServiceAgent(
+        _dispatcher(), "bench-room", CUSTOMER_CONTEXT, ContextWindow(None)
+    )
+    return lambda: agent._build_instructions(CUSTOMER_CONTEXT)
+
+
+@case("generate_greeting")
+def generate_greeting():
+    return lambda: customer_agent._generate_greeting(CUSTOMER_CONTEXT)
+
+
+@case("assistant_request_fn")
+def assistant_request_fn():
+    ctx = SimpleNamespace(room=SimpleNamespace(name="bench-room", metadata=ROOM_METADATA))
+
+    async def op():
+        await assistant_agent.request_fn(ctx)
+    return op
+
+
+@case("transcription_request_fn")
+def transcription_request_fn():
+    # Combined mode is off, so the transcription agent owns the room;
+    # the entrypoint itself needs a room, so it is stubbed out of the timing
+    ctx = SimpleNamespace(room=SimpleNamespace(name="bench-room", metadata=ROOM_METADATA))
+
+    async def op():
+        await transcription_agent.request_fn(ctx)
+    return op
+
+
+@case("customer_request_handler")
+def customer_request_handler():
+    async def reject() -> None:
+        pass
+
+    request = SimpleNamespace(
+        room=SimpleNamespace(name="bench-room", metadata=ROOM_METADATA), reject=reject
+    )
+
+    async def op():
+        await customer_agent.request_handler(request)
+    return op
+
+
+def _segment_batch(size: int = 20) -> Dict[str, Any]:
+    return {
+        "roomId": "bench-room",
+        "segments": [
+            {
+                "segmentId": f"{i:032x}",
+                "participantId": f"speaker-{i % 2}",
+                "participantName": f"Speaker {i % 2}",
+                "text": SEGMENT_TEXT,
+                "isFinal": True,
+                "timestamp": 1_700_000_000_000 + i * 700,
+                "confidence": 0.93,
+            }
+            for i in range(size)
+        ],
+    }
+
+
+@case("segment_batch_json")
+def segment_batch_json():
+    batch = _segment_batch()
+    return lambda: json.dumps(batch).encode()
+
+
+@case("segment_batch_compact")
+def segment_batch_compact():
+    # Session already registered, as for every batch after a room's first
+    codec = WireCodec()
+    batch = _segment_batch()
+
+    async def register(path, data):
+        return 200, '{"handle": "bench-handle"}'
+
+    async def op():
+        await codec.encode(SEGMENT_BATCH_PATH, batch, register)
+    return op
+
+
+async def _time(op: Callable[[], Any], number: int) -> float:
+    # Collector pauses land in whichever case happens to trigger them (as timeit)
+    gc.collect()
+    gc.disable()
+    try:
+        if asyncio.iscoroutinefunction(op):
+            started = time.perf_counter()
+            for _ in range(number):
+                await op()
+        else:
+            started = time.perf_counter()
+            for _ in range(number):
+                op()
+        return time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+async def _allocated(op: Callable[[], Any], number: int) -> float:
+    """Mean bytes allocated during one call (peak over the call, not retained)"""
+    is_async = asyncio.iscoroutinefunction(op)
+    # Warm caches and lazily created state outside the measurement
+    await op() if is_async else op()
+
+    total = 0
+    tracemalloc.start()
+    for _ in range(number):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await op() if is_async else op()
+        _, peak = tracemalloc.get_traced_memory()
+        total += peak - before
+    tracemalloc.stop()
+    return total / number
+
+
+async def run_case(setup: Case, number: int, repeat: int) -> Dict[str, float]:
+    # Median of several repeats, each on fresh state, so one lucky or unlucky run does not decide
+    median = statistics.median([await _time(setup(), number) for _ in range(repeat)])
+    return {
+        "ops_per_sec": round(number / median),
+        "us_per_op": round(median / number * 1e6, 3),
+        "alloc_bytes_per_op": round(await _allocated(setup(), min(number, 1000))),
+    }
+
+
+async def run(names: List[str], number: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    return {name: await run_case(CASES[name], number, repeat) for name in names}
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baselines: Dict[str, Dict[str, float]],
+    max_slowdown: Optional[float],
+    max_alloc_growth: float,
+) -> List[str]:
+    """Regressions beyond the thresholds, one message per failing metric"""
+    failures = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        if max_slowdown is not None:
+            floor = baseline["ops_per_sec"] * (1 - max_slowdown)
+            if result["ops_per_sec"] < floor:
+                failures.append(
+                    f"{name}: {result['ops_per_sec']} ops/s is below {floor:.0f} "
+                    f"(baseline {baseline['ops_per_sec']}, -{max_slowdown:.0%} allowed)"
+                )
+        # Small absolute slack so a few bytes of jitter never fails a tiny case
+        ceiling = baseline["alloc_bytes_per_op"] * (1 + max_alloc_growth) + 64
+        if result["alloc_bytes_per_op"] > ceiling:
+            failures.append(
+                f"{name}: {result['alloc_bytes_per_op']} B/op is above {ceiling:.0f} "
+                f"(baseline {baseline['alloc_bytes_per_op']}, +{max_alloc_growth:.0%} allowed)"
+            )
+    return failures
+
+
+def print_table(results: Dict[str, Dict[str, float]], baselines: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'case':<32}{'ops/s':>12}{'us/op':>10}{'B/op':>10}{'vs base':>10}")
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        change = f"{result['ops_per_sec'] / baseline['ops_per_sec'] - 1:+.0%}" if baseline else "-"
+        print(
+            f"{name:<32}{result['ops_per_sec']:>12}{result['us_per_op']:>10}"
+            f"{result['alloc_bytes_per_op']:>10}{change:>10}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cases", nargs="*", help="Cases to run (default: all)")
+    parser.add_argument("--number", type=int, default=20000, help="Calls per repeat")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeats; the median is kept")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--check", action="store_true", help="Exit 1 on regression against the baselines")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results to the baselines file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baselines file")
+    parser.add_argument("--max-slowdown", type=float,
+                        help="Also fail on a throughput drop beyond this fraction (same machine only)")
+    parser.add_argument("--max-alloc-growth", type=float, default=0.10, help="Allowed allocation growth (fraction)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        print(f"Unknown cases: {', '.join(unknown)}; available: {', '.join(CASES)}", file=sys.stderr)
+        return 2
+
+    # Handlers log at INFO per call; benchmark the work, not the log handler
+    logging.disable(logging.CRITICAL)
+    os.environ["COMBINED_TRANSCRIPTION"] = "false"
+
+    async def skip_entrypoint(ctx) -> None:
+        pass
+    assistant_agent.entrypoint = skip_entrypoint
+    transcription_agent.entrypoint = skip_entrypoint
+
+    results = asyncio.run(run(args.cases or list(CASES), args.number, args.repeat))
+
+    baselines: Dict[str, Dict[str, float]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({**baselines, **results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print_table(results, baselines)
+
+    if args.check:
+        failures = compare(results, baselines, args.max_slowdown, args.max_alloc_growth)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
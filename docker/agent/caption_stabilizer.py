@@ -0,0 +1,174 @@
+"""
+Interim transcript stabilization.
+
+Deepgram emits many non-final hypotheses per second per speaker. Only finals
+are persisted; interim text is kept per participant (latest wins) and
+forwarded as a throttled live-caption stream that is never stored.
+
+Every interim is counted once as forwarded (it rewrote the live caption) or
+suppressed (a newer hypothesis, a final or a repeat of the shown text made it
+redundant) in CAPTION_INTERIMS.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from voice_metrics import CAPTION_INTERIMS
+
+logger = logging.getLogger("dialogLens-caption-stabilizer")
+
+# publish(participant_id, text, is_final) -> number of bytes sent
+CaptionPublisher = Callable[[str, str, bool], Awaitable[int]]
+
+
+class _ParticipantCaption:
+    __slots__ = ("latest", "last_sent", "last_sent_at", "flush_handle")
+
+    def __init__(self) -> None:
+        self.latest = ""
+        self.last_sent = ""
+        self.last_sent_at = 0.0
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+
+
+class CaptionStabilizer:
+    """Throttles interim hypotheses per participant into live captions"""
+
+    def __init__(
+        self,
+        publish: Optional[CaptionPublisher] = None,
+        min_interval: float = 0.2,
+    ) -> None:
+        self.publish = publish
+        self.min_interval = min_interval
+        self._captions: Dict[str, _ParticipantCaption] = {}
+        # Scheduled flushes, kept so they are not collected before they run
+        self._flushes: Set[asyncio.Task] = set()
+        self._forwarded_metric = CAPTION_INTERIMS.labels(outcome="forwarded")
+        self._suppressed_metric = CAPTION_INTERIMS.labels(outcome="suppressed")
+
+        # Emission counters
+        self.interim_received = 0
+        self.interim_forwarded = 0
+        self.interim_suppressed = 0
+        self.finals_received = 0
+        self.final_bytes = 0
+        self.caption_bytes = 0
+
+    async def update(self, participant_id: str, text: str, is_final: bool) -> bool:
+        """
+        Handle a hypothesis for a participant.
+
+        Returns True when the text is final and should be persisted.
+        """
+        caption = self._captions.get(participant_id)
+        if caption is None:
+            caption = self._captions[participant_id] = _ParticipantCaption()
+
+        if is_final:
+            self.finals_received += 1
+            self.final_bytes += len(text.encode())
+            self._cancel_flush(caption)
+            self._drop_unsent(caption)
+            caption.latest = ""
+            caption.last_sent = ""
+            await self._send(participant_id, text, True)
+            return True
+
+        self.interim_received += 1
+        self._drop_unsent(caption)
+        caption.latest = text
+        if text == caption.last_sent:
+            # Already on screen; nothing to send
+            self._suppress()
+
+        elapsed = time.monotonic() - caption.last_sent_at
+        if elapsed >= self.min_interval:
+            self._cancel_flush(caption)
+            await self._send_interim(participant_id, caption)
+        elif caption.flush_handle is None:
+            # Send the latest text once the interval has passed
+            loop = asyncio.get_running_loop()
+            caption.flush_handle = loop.call_later(
+                self.min_interval - elapsed, self._schedule_flush, participant_id
+            )
+        return False
+
+    def remove(self, participant_id: str) -> None:
+        """Forget a participant that left the room"""
+        caption = self._captions.pop(participant_id, None)
+        if caption is not None:
+            self._cancel_flush(caption)
+            self._drop_unsent(caption)
+
+    def close(self) -> None:
+        """Cancel pending caption flushes"""
+        for caption in self._captions.values():
+            self._cancel_flush(caption)
+            self._drop_unsent(caption)
+        self._captions.clear()
+        for task in self._flushes:
+            task.cancel()
+        logger.info(f"Caption stabilizer closed: {self.stats()}")
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of emitted row and byte counters"""
+        return {
+            "interim_received": self.interim_received,
+            "interim_forwarded": self.interim_forwarded,
+            "interim_suppressed": self.interim_suppressed,
+            "rows_persisted": self.finals_received,
+            "bytes_persisted": self.final_bytes,
+            "caption_bytes": self.caption_bytes,
+        }
+
+    def _schedule_flush(self, participant_id: str) -> None:
+        task = asyncio.create_task(self._flush(participant_id))
+        self._flushes.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task) -> None:
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error flushing live caption: {task.exception()!r}")
+
+    async def _flush(self, participant_id: str) -> None:
+        caption = self._captions.get(participant_id)
+        if caption is None:
+            return
+        caption.flush_handle = None
+        if caption.latest:
+            await self._send_interim(participant_id, caption)
+
+    async def _send_interim(self, participant_id: str, caption: _ParticipantCaption) -> None:
+        caption.last_sent_at = time.monotonic()
+        if caption.latest == caption.last_sent:
+            return
+        caption.last_sent = caption.latest
+        self.interim_forwarded += 1
+        self._forwarded_metric.inc()
+        await self._send(participant_id, caption.latest, False)
+
+    def _drop_unsent(self, caption: _ParticipantCaption) -> None:
+        """Count the participant's pending interim as suppressed when something replaces it"""
+        if caption.latest and caption.latest != caption.last_sent:
+            self._suppress()
+
+    def _suppress(self) -> None:
+        self.interim_suppressed += 1
+        self._suppressed_metric.inc()
+
+    async def _send(self, participant_id: str, text: str, is_final: bool) -> None:
+        if self.publish is None:
+            return
+        try:
+            self.caption_bytes += await self.publish(participant_id, text, is_final)
+        except Exception as e:
+            logger.debug(f"Failed to publish live caption: {e}")
+
+    @staticmethod
+    def _cancel_flush(caption: _ParticipantCaption) -> None:
+        if caption.flush_handle is not None:
+            caption.flush_handle.cancel()
+            caption.flush_handle = None
@@ -0,0 +1,211 @@
+"""
+Rolling-summary context window for the LLM.
+
+The chat context an AgentSession sends to the LLM grows with every turn, so
+time-to-first-token and token cost grow with call length. ContextWindow
+rewrites the context before each LLM call: instructions, a rolling summary of
+older turns, and the last N turns verbatim, trimmed to a token budget.
+
+Older turns are folded into the summary by a background task, off the
+reply's critical path. Until a fold lands, the unfolded turns stay in the
+prompt verbatim. The token budget only trims turns the summary already
+covers. Turns over budget that it does not cover yet are folded first, so
+nothing disappears from the context while the summary catches up.
+
+prepare() is called once per committed LLM call and records the prompt
+stats; preview() builds the same prompt without side effects, for
+speculative responses that may be discarded.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from livekit.agents import llm
+
+logger = logging.getLogger("dialogLens-context-window")
+
+# summarize(previous_summary, transcript_of_new_turns) -> updated summary
+Summarizer = Callable[[str, str], Awaitable[str]]
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a customer support call. Update the "
+    "summary with the new turns. Keep names, account details, the customer's "
+    "problem, what has been tried and any commitments made. Reply with the "
+    "summary only, in at most 150 words."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)"""
+    return (len(text) + 3) // 4
+
+
+def _item_text(item: llm.ChatItem) -> str:
+    if item.type == "message":
+        return item.text_content or ""
+    if item.type == "function_call":
+        return f"{item.name}({item.arguments})"
+    if item.type == "function_call_output":
+        return item.output
+    return ""
+
+
+def _is_instruction(item: llm.ChatItem) -> bool:
+    return item.type == "message" and item.role in ("system", "developer")
+
+
+class ContextWindow:
+    """Keeps the prompt to instructions, a rolling summary and recent turns"""
+
+    def __init__(
+        self,
+        summarize: Summarizer,
+        keep_turns: int = 8,
+        token_budget: int = 2000,
+        fold_batch: int = 4,
+    ) -> None:
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.fold_batch = fold_batch
+        self.summary = ""
+        self._folded: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+        # Per-turn prompt size and summarizer counters
+        self.turns = 0
+        self.last_prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.total_prompt_tokens = 0
+        self.items_trimmed = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    @classmethod
+    def from_env(cls, summarize: Summarizer) -> "ContextWindow":
+        return cls(
+            summarize,
+            keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "8")),
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000")),
+            fold_batch=int(os.getenv("CONTEXT_FOLD_BATCH", "4")),
+        )
+
+    def prepare(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        """Build the prompt for this turn, record its size and schedule folding of older turns"""
+        prompt, tokens, trimmed, to_fold = self._build(chat_ctx)
+        if to_fold and self._task is None:
+            self._task = asyncio.create_task(self._fold(to_fold))
+        self.items_trimmed += trimmed
+        self._record(tokens, len(prompt.items))
+        return prompt
+
+    def preview(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        """The prompt prepare() would build, without recording or folding anything"""
+        return self._build(chat_ctx)[0]
+
+    def _build(self, chat_ctx: llm.ChatContext) -> Tuple[llm.ChatContext, int, int, List[llm.ChatItem]]:
+        """The prompt, its token estimate, the items trimmed and the items to fold next"""
+        instructions = [item for item in chat_ctx.items if _is_instruction(item)]
+        turns = [item for item in chat_ctx.items if not _is_instruction(item)]
+
+        # Never start the verbatim window on a dangling function call/output
+        cut = max(len(turns) - self.keep_turns, 0)
+        while cut < len(turns) and turns[cut].type in ("function_call", "function_call_output"):
+            cut += 1
+        older, recent = turns[:cut], turns[cut:]
+        unfolded = [item for item in older if item.id not in self._folded]
+
+        prefix = list(instructions)
+        if self.summary:
+            prefix.append(llm.ChatMessage(
+                role="system",
+                content=[f"Summary of the conversation so far: {self.summary}"],
+            ))
+        window = unfolded + recent
+        tokens = sum(estimate_tokens(_item_text(item)) for item in prefix + window)
+
+        # Oldest items that would have to go to fit the budget, keeping the latest turn
+        excess, over = 0, tokens
+        while over > self.token_budget and excess < len(window) - 1:
+            over -= estimate_tokens(_item_text(window[excess]))
+            excess += 1
+
+        # Fold a few turns per summarizer call rather than one call per turn, and
+        # the over-budget ones as soon as possible so the budget can drop them
+        fold_end = max(len(unfolded) if len(unfolded) >= self.fold_batch else 0, excess)
+        to_fold = [item for item in window[:fold_end] if item.id not in self._folded]
+
+        # Only turns the summary covers may leave the prompt
+        trimmed = 0
+        while tokens > self.token_budget and len(window) > 1 and window[0].id in self._folded:
+            tokens -= estimate_tokens(_item_text(window.pop(0)))
+            trimmed += 1
+        while window and window[0].type == "function_call_output" and window[0].id in self._folded:
+            tokens -= estimate_tokens(_item_text(window.pop(0)))
+
+        return llm.ChatContext(prefix + window), tokens, trimmed, to_fold
+
+    async def close(self) -> None:
+        """Let an in-flight fold finish and log the final prompt stats"""
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+        logger.info(f"Context window closed: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "avg_prompt_tokens": round(self.total_prompt_tokens / self.turns) if self.turns else 0,
+            "items_trimmed": self.items_trimmed,
+            "summary_tokens": estimate_tokens(self.summary),
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+        }
+
+    def _record(self, tokens: int, items: int) -> None:
+        self.turns += 1
+        self.last_prompt_tokens = tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, tokens)
+        self.total_prompt_tokens += tokens
+        logger.info(f"Turn {self.turns} prompt: ~{tokens} tokens in {items} items")
+
+    async def _fold(self, items: List[llm.ChatItem]) -> None:
+        transcript = "\n".join(
+            f"{item.role}: {item.text_content}"
+            for item in items
+            if item.type == "message" and item.text_content
+        )
+        try:
+            if transcript:
+                self.summary = await self.summarize(self.summary, transcript)
+                self.summaries += 1
+            self._folded.update(item.id for item in items)
+        except Exception as e:
+            # Unfolded turns stay verbatim and are retried on the next turn
+            self.summary_failures += 1
+            logger.warning(f"Failed to update conversation summary: {e}")
+        finally:
+            self._task = None
+
+
+def llm_summarizer(model: llm.LLM) -> Summarizer:
+    """Summarizer that asks `model` to fold new turns into the summary"""
+
+    async def summarize(previous: str, transcript: str) -> str:
+        chat_ctx = llm.ChatContext.empty()
+        chat_ctx.add_message(role="system", content=SUMMARY_PROMPT)
+        chat_ctx.add_message(
+            role="user",
+            content=f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}",
+        )
+
+        parts = []
+        async with model.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    parts.append(chunk.delta.content)
+        return "".join(parts).strip() or previous
+
+    return summarize
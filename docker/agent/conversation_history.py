@@ -0,0 +1,67 @@
+"""
+Bounded in-memory conversation history for the assistant agents.
+
+Every interaction is already uploaded through the dispatcher, so the API is
+the record of the whole call. The agent only needs the recent turns, kept in
+a fixed-size ring buffer of slotted records so memory per room stays flat
+however long the call runs.
+"""
+import collections
+import os
+from typing import Any, Deque, Dict, Iterator, List
+
+
+class Turn:
+    __slots__ = ("speaker", "text", "timestamp")
+
+    def __init__(self, speaker: str, text: str, timestamp: int) -> None:
+        self.speaker = speaker
+        self.text = text
+        self.timestamp = timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"speaker": self.speaker, "text": self.text, "timestamp": self.timestamp}
+
+
+class ConversationHistory:
+    """Ring buffer of the most recent turns in a conversation"""
+
+    def __init__(self, max_turns: int = 50) -> None:
+        self.max_turns = max_turns
+        self._turns: Deque[Turn] = collections.deque(maxlen=max_turns)
+
+        # History counters
+        self.total_turns = 0
+        self.evicted = 0
+
+    @classmethod
+    def from_env(cls) -> "ConversationHistory":
+        return cls(max_turns=int(os.getenv("HISTORY_MAX_TURNS", "50")))
+
+    def append(self, speaker: str, text: str, timestamp: int) -> Turn:
+        """Record a turn, evicting the oldest one when full"""
+        if len(self._turns) == self.max_turns:
+            self.evicted += 1
+        turn = Turn(speaker, text, timestamp)
+        self._turns.append(turn)
+        self.total_turns += 1
+        return turn
+
+    def recent(self, count: int) -> List[Turn]:
+        """The last `count` turns, oldest first"""
+        if count <= 0:
+            return []
+        return list(self._turns)[-count:]
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def __iter__(self) -> Iterator[Turn]:
+        return iter(self._turns)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retained": len(self._turns),
+            "total_turns": self.total_turns,
+            "evicted": self.evicted,
+        }
@@ -1,48 +1,73 @@
 import asyncio
+import functools
 import logging
 import os
+import time
+import uuid
 from typing import Optional, Dict, Any
 import json
 
 from dotenv import load_dotenv
-from livekit import agents, rtc
 from livekit.agents import (
+    llm,
     AgentSession, 
     Agent, 
+    AgentServer,
     RoomInputOptions, 
     JobContext, 
     JobRequest,
     WorkerOptions, 
     cli
 )
-from livekit.plugins import (
-    deepgram,
-    openai,
-    cartesia,
-    silero,
-    noise_cancellation,
-)
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
-import aiohttp
+
+from admission import AdmissionController, report_job_load
+from api_client import acquire_client, release_client
+from context_window import ContextWindow, llm_summarizer
+from conversation_history import ConversationHistory
+from faq_router import FAQRouter
+from health import HealthServer
+from models import executor_options, install_batching, load_turn_detector, load_vad, prewarm
+from plugins import load_plugins, print_import_profile
+from prespawner import AdaptivePrespawner
+from speculative_llm import SpeculativeResponder, speculation_enabled
+from transcript_pipeline import create_transcript_pipeline, epoch_ms, transcription_owner
+from tts_cache import phrase_cache
+from upload_dispatcher import UploadDispatcher
+from voice_metrics import TurnLatencyTracker, prometheus_options, room_type
 
 load_dotenv()
 
 logger = logging.getLogger("dialogLens-customer-agent")
 
+# Consulted in the worker process before a room is accepted
+admission = AdmissionController.from_env("customer-service")
+
 
 class CustomerServiceAgent(Agent):
     """Customer service agent with specialized knowledge about DialogLens"""
     
-    def __init__(self, api_url: str, api_key: str, room_name: str, customer_context: Dict[str, Any]) -> None:
+    def __init__(
+        self,
+        dispatcher: UploadDispatcher,
+        room_name: str,
+        customer_context: Dict[str, Any],
+        context_window: ContextWindow,
+        faq_router: Optional[FAQRouter] = None,
+    ) -> None:
         # Build dynamic instructions based on customer context
         instructions = self._build_instructions(customer_context)
         super().__init__(instructions=instructions)
         
-        self.api_url = api_url
-        self.api_key = api_key
+        self.dispatcher = dispatcher
         self.room_name = room_name
         self.customer_context = customer_context
-        self.conversation_history = []
+        self.context_window = context_window
+        self.faq_router = faq_router
+        self.speculation: Optional[SpeculativeResponder] = None
+        # Recent turns only; the API keeps the full conversation
+        self.conversation_history = ConversationHistory.from_env()
+        # Interaction uploads scheduled from session event handlers
+        self._pending: set = set()
         
     def _build_instructions(self, customer_context: Dict[str, Any]) -> str:
         """Build dynamic instructions based on customer context"""
@@ -79,63 +104,180 @@ class CustomerServiceAgent(Agent):
         
         return instructions
         
+    def enable_speculation(self, model: llm.LLM) -> SpeculativeResponder:
+        """Start LLM responses from interim transcripts ahead of end-of-turn"""
+        self.speculation = SpeculativeResponder.from_env(model, self._speculative_context)
+        return self.speculation
+        
+    def _speculative_context(self, user_text: str) -> llm.ChatContext:
+        chat_ctx = self.chat_ctx.copy()
+        chat_ctx.add_message(role="user", content=user_text)
+        # May be discarded, so it must not count as a turn or start a fold
+        return self.context_window.preview(chat_ctx)
+        
+    async def llm_node(self, chat_ctx: llm.ChatContext, tools, model_settings):
+        """Answer common questions locally, otherwise call the LLM with a budgeted context"""
+        started = time.perf_counter()
+        
+        # Only a fresh user turn can be an FAQ or speculated on (not tool results or instructed replies)
+        last = chat_ctx.items[-1] if chat_ctx.items else None
+        user_text = None
+        if last is not None and last.type == "message" and last.role == "user":
+            user_text = last.text_content or ""
+        
+        if self.faq_router is not None and user_text is not None:
+            match = self.faq_router.answer(user_text)
+            if match is not None:
+                if self.speculation is not None:
+                    self.speculation.discard()
+                self.faq_router.record("faq", time.perf_counter() - started)
+                yield match.answer
+                return
+        
+        # Once per committed turn, whether the reply comes from speculation or a new call
+        chat_ctx = self.context_window.prepare(chat_ctx)
+        
+        if self.speculation is not None and user_text is not None:
+            speculative = self.speculation.take(user_text)
+            if speculative is not None:
+                first_chunk = True
+                try:
+                    async for chunk in speculative:
+                        if first_chunk and self.faq_router is not None:
+                            self.faq_router.record("speculative", time.perf_counter() - started)
+                        first_chunk = False
+                        yield chunk
+                    return
+                except Exception as e:
+                    if not first_chunk:
+                        raise
+                    logger.warning(f"Speculative response failed, calling the LLM: {e}")
+        
+        first_chunk = True
+        async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+            if first_chunk and self.faq_router is not None:
+                self.faq_router.record("llm", time.perf_counter() - started)
+                first_chunk = False
+            yield chunk
+        
     async def process_interaction(self, speaker: str, text: str):
-        """Record interaction to API and local history"""
-        interaction = {
+        """Queue interaction for the API and local history"""
+        # Add to local history
+        turn = self.conversation_history.append(
+            speaker, text, epoch_ms()
+        )
+        
+        # Send to API
+        data = {
+            "interactionId": uuid.uuid4().hex,  # Idempotency key for replays
+            "roomId": self.room_name,
             "speaker": speaker,
             "text": text,
-            "timestamp": int(asyncio.get_event_loop().time() * 1000),
+            "timestamp": turn.timestamp,
+            "metadata": {
+                "agentType": "customer-service",
+                "customerContext": self.customer_context,
+            }
         }
         
-        # Add to local history
-        self.conversation_history.append(interaction)
+        # Sent in the background so a slow API never delays the voice pipeline
+        await self.dispatcher.submit("/conversations/interaction", data)
+    
+    def queue_interaction(self, speaker: str, text: str) -> None:
+        """Schedule process_interaction from a synchronous event handler"""
+        task = asyncio.create_task(self.process_interaction(speaker, text))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+    
+    def attach_session(self, session: AgentSession) -> None:
+        """Record the session's user and agent turns (callbacks must be synchronous)"""
         
-        # Send to API
-        try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}",
-                }
-                
-                data = {
-                    "roomId": self.room_name,
-                    "speaker": speaker,
-                    "text": text,
-                    "timestamp": interaction["timestamp"],
-                    "metadata": {
-                        "agentType": "customer-service",
-                        "customerContext": self.customer_context,
-                    }
-                }
-                
-                async with session.post(
-                    f"{self.api_url}/conversations/interaction",
-                    json=data,
-                    headers=headers,
-                ) as response:
-                    if response.status != 200:
-                        logger.error(
-                            f"Failed to record interaction: {response.status}"
-                        )
-        except Exception as e:
-            logger.error(f"Error recording interaction: {e}")
+        @session.on("user_input_transcribed")
+        def on_user_transcribed(event):
+            if event.is_final and event.transcript:
+                self.queue_interaction("user", event.transcript)
+        
+        @session.on("conversation_item_added")
+        def on_conversation_item(event):
+            item = event.item
+            if item.type == "message" and item.role == "assistant" and item.text_content:
+                self.queue_interaction("assistant", item.text_content)
 
 
 async def entrypoint(ctx: JobContext):
     """Main entry point for the customer service agent"""
     logger.info(f"Customer agent connecting to room {ctx.room.name}")
     
-    # Get configuration
-    api_url = os.getenv("API_URL", "http://localhost:3000/api")
-    api_key = os.getenv("API_KEY", "")
+    # Already loaded for this role by the worker or prewarm (plugins.py)
+    from livekit.plugins import cartesia, deepgram, noise_cancellation, openai
+    
+    # One STT stream per room; loop lag and streams feed the worker's load function
+    report_job_load(ctx, "customer-service")
+    
+    # Upload interactions in the background over the worker's pooled API client
+    api = await acquire_client()
+    dispatcher = UploadDispatcher(
+        api,
+        max_queue_size=int(os.getenv("UPLOAD_QUEUE_SIZE", "1000")),
+        policy=os.getenv("UPLOAD_OVERFLOW_POLICY", "spill"),
+    )
+    dispatcher.start()
     
     # Get customer context from room metadata
     metadata = json.loads(ctx.room.metadata or "{}")
     customer_context = metadata.get("customerContext", {})
     
+    # In combined mode this session's STT stream also feeds the transcript path
+    pipeline = None
+    if transcription_owner(metadata) == "customer-service":
+        pipeline = create_transcript_pipeline(ctx, api)
+        pipeline.start()
+    
+    # Older turns are folded into a rolling summary off the reply path
+    context_window = ContextWindow.from_env(
+        llm_summarizer(openai.LLM(
+            model=os.getenv("SUMMARY_MODEL", "gpt-4o-mini"),
+            temperature=0.2,
+        ))
+    )
+    
+    # Common product questions are answered in-process without the LLM
+    faq_router = FAQRouter.from_env()
+    
+    # Set below; shutdown can run before the agent is built if setup fails
+    agent: Optional[CustomerServiceAgent] = None
+    
+    async def shutdown():
+        # Send queued interactions and segments before the client is released
+        if faq_router is not None:
+            logger.info(f"Response routes: {faq_router.stats()}")
+        if agent is not None and agent.speculation is not None:
+            agent.speculation.close()
+        await context_window.close()
+        await dispatcher.close()
+        if pipeline is not None:
+            await pipeline.close()
+        await release_client()
+    
+    ctx.add_shutdown_callback(shutdown)
+    
     # Create the customer service agent
-    agent = CustomerServiceAgent(api_url, api_key, ctx.room.name, customer_context)
+    agent = CustomerServiceAgent(
+        dispatcher, ctx.room.name, customer_context, context_window, faq_router
+    )
+    
+    llm_engine = openai.LLM(
+        model="gpt-4o-mini",
+        temperature=0.7,
+    )
+    
+    # Opt-in: start replies from stable interim transcripts (SPECULATIVE_LLM)
+    speculation = None
+    if speculation_enabled(metadata.get("isTelephony", False)):
+        speculation = agent.enable_speculation(llm_engine)
+    
+    voice_id = "79a125e8-cd45-4c13-8a67-188112f4dd22"  # Professional female voice
+    tts_engine = cartesia.TTS(voice_id=voice_id, language="en", speed=1.0)
     
     # Create session with high-quality STT-LLM-TTS pipeline
     session = AgentSession(
@@ -144,36 +286,32 @@ async def entrypoint(ctx: JobContext):
             language="en",
             punctuate=True,
             smart_format=True,
-            diarize=True,  # Help identify different speakers
-        ),
-        llm=openai.LLM(
-            model="gpt-4o-mini",
-            temperature=0.7,
+            enable_diarization=True,  # Help identify different speakers
         ),
-        tts=cartesia.TTS(
-            voice_id="79a125e8-cd45-4c13-8a67-188112f4dd22",  # Professional female voice
-            language="en",
-            speed=1.0,
-        ),
-        vad=silero.VAD.load(),
-        turn_detection=MultilingualModel(),
+        llm=llm_engine,
+        tts=tts_engine,
+        # VAD is loaded once per process by prewarm, not per room join
+        vad=load_vad(ctx.proc),
+        turn_detection=load_turn_detector(),
     )
     
     # Connect to room
     await ctx.connect()
     
-    # Set up event handlers for tracking conversations
-    @session.on("user_speech_finished")
-    async def on_user_speech(event):
-        """Handle when user finishes speaking"""
-        if event.text:
-            await agent.process_interaction("user", event.text)
+    # Track the conversation's turns
+    agent.attach_session(session)
+    
+    if pipeline is not None:
+        pipeline.attach_session(session)
     
-    @session.on("agent_speech_started")
-    async def on_agent_speech(event):
-        """Handle when agent starts speaking"""
-        if event.text:
-            await agent.process_interaction("assistant", event.text)
+    # Per-turn stage latencies, exported on the worker's /metrics endpoint
+    TurnLatencyTracker("customer-service", room_type(metadata)).attach(session)
+    
+    if speculation is not None:
+        @session.on("user_input_transcribed")
+        def on_user_transcribed(event):
+            """Feed interim and final hypotheses to the speculative responder"""
+            speculation.on_transcript(event.transcript, event.is_final)
     
     # Start the session with noise cancellation for telephony if using LiveKit Cloud
     try:
@@ -197,10 +335,13 @@ async def entrypoint(ctx: JobContext):
     
     # Generate contextual greeting
     greeting = _generate_greeting(customer_context)
-    await session.generate_reply(instructions=greeting)
     
-    # Record the greeting
-    await agent.process_interaction("assistant", greeting)
+    # The fixed greeting is spoken from the phrase cache so the first words play without
+    # a TTS round-trip; one built from the customer's details is never cached
+    if customer_context.get("name") or customer_context.get("purpose"):
+        session.say(greeting)
+    else:
+        session.say(greeting, audio=phrase_cache().stream(tts_engine, greeting, voice_id, "en", 1.0))
     
     logger.info("Customer service agent started successfully")
 
@@ -230,7 +371,11 @@ async def request_handler(request: JobRequest) -> None:
     metadata = json.loads(request.room.metadata or "{}")
     
     if metadata.get("requiresCustomerAgent", False):
-        await request.accept(entrypoint)
+        if not admission.admit(request.room.name):
+            # Not terminal, so LiveKit offers the room to another worker
+            await request.reject(terminate=False)
+            return
+        await request.accept()
         logger.info(f"Accepted customer service job for room {request.room.name}")
     else:
         await request.reject()
@@ -255,12 +400,37 @@ if __name__ == "__main__":
         logger.info("Model files downloaded successfully")
         sys.exit(0)
     
+    # Report what importing this agent and its plugins costs a new process
+    if len(sys.argv) > 1 and sys.argv[1] == "profile-imports":
+        print_import_profile("customer_agent", "customer-service")
+        sys.exit(0)
+    
+    # Only this role's plugins, so the forkserver preloads exactly these
+    load_plugins("customer-service")
+    
+    # Opt-in: batch VAD and turn detection across sessions (INFERENCE_BATCHING)
+    install_batching()
+    
+    # Warm processes follow the call arrival rate instead of a fixed count
+    prespawner = AdaptivePrespawner.from_env("customer-service")
+    
     # Run the worker
-    cli.run_app(
+    server = AgentServer.from_server_options(
         WorkerOptions(
-            request_handler=request_handler,
+            entrypoint_fnc=entrypoint,
+            request_fnc=request_handler,
+            prewarm_fnc=functools.partial(prewarm, role="customer-service"),
+            **admission.worker_options(),
+            **executor_options(),
+            **prespawner.worker_options(),
+            **prometheus_options(),
             worker_type="customer-service",
-            max_idle_time=60.0,  # Disconnect after 60 seconds of inactivity
-            num_idle_processes=2,  # Keep 2 processes ready for quick response
         )
-    )
\ No newline at end of file
+    )
+    prespawner.attach(server)
+    
+    # Liveness and readiness for orchestration (HEALTH_PORT)
+    health = HealthServer.from_env("customer-service", admission)
+    if health is not None:
+        health.attach(server)
+    cli.run_app(server)
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+In-process FAQ answers for common product questions.
+
+Most customer questions repeat the product facts in the agent's
+instructions, and each one costs a full LLM round-trip. FAQRouter matches
+the user's turn against a curated answer set (faq.json) with a small TF-IDF
+index on CPU; a confident match is answered directly in milliseconds and
+everything else falls through to the LLM. Latency is tracked per route so
+the two paths can be compared.
+"""
+import collections
+import json
+import logging
+import math
+import os
+import re
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger("dialogLens-faq")
+
+STOPWORDS = frozenset(
+    "a an and are as at be can could do does for from have how i in is it its "
+    "me my of on or our so that the this to want was we what when which who will "
+    "with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, with plurals folded"""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class FAQMatch:
+    __slots__ = ("faq_id", "answer", "score")
+
+    def __init__(self, faq_id: str, answer: str, score: float) -> None:
+        self.faq_id = faq_id
+        self.answer = answer
+        self.score = score
+
+
+class FAQIndex:
+    """TF-IDF index over the question variants of each answer"""
+
+    def __init__(self, entries: List[Dict[str, Any]]) -> None:
+        self._answers: Dict[str, str] = {}
+        documents = []
+        for entry in entries:
+            self._answers[entry["id"]] = entry["answer"]
+            for question in entry["questions"]:
+                documents.append((entry["id"], tokenize(question)))
+
+        frequency: Dict[str, int] = collections.Counter()
+        for _, tokens in documents:
+            frequency.update(set(tokens))
+        self._idf = {
+            term: math.log((1 + len(documents)) / (1 + count)) + 1
+            for term, count in frequency.items()
+        }
+        # Unknown terms weigh like the rarest indexed term
+        self._unknown_idf = max(self._idf.values(), default=1.0)
+        self._documents = [(faq_id, self._vector(tokens)) for faq_id, tokens in documents]
+
+    @classmethod
+    def load(cls, path: str) -> "FAQIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def search(self, text: str) -> Optional[FAQMatch]:
+        """Best matching answer by cosine similarity, if any term overlaps"""
+        query = self._vector(tokenize(text))
+        if not query:
+            return None
+
+        best_id, best_score = None, 0.0
+        for faq_id, document in self._documents:
+            score = sum(weight * document.get(term, 0.0) for term, weight in query.items())
+            if score > best_score:
+                best_id, best_score = faq_id, score
+        if best_id is None:
+            return None
+        return FAQMatch(best_id, self._answers[best_id], best_score)
+
+    def _vector(self, tokens: List[str]) -> Dict[str, float]:
+        # Terms outside the index vocabulary still count towards the norm, so
+        # a long question that merely mentions a known term scores low
+        counts = collections.Counter(tokens)
+        vector = {
+            term: count * self._idf.get(term, self._unknown_idf)
+            for term, count in counts.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+
+class FAQRouter:
+    """Answers confident FAQ matches locally and tracks latency per route"""
+
+    def __init__(self, index: FAQIndex, threshold: float = 0.6) -> None:
+        self.index = index
+        self.threshold = threshold
+        self._latencies: Dict[str, Deque[float]] = collections.defaultdict(
+            lambda: collections.deque(maxlen=1024)
+        )
+        self.routed: Dict[str, int] = collections.Counter()
+
+    @classmethod
+    def from_env(cls) -> Optional["FAQRouter"]:
+        """Router over FAQ_PATH, or None when FAQ answers are disabled"""
+        if os.getenv("FAQ_ANSWERS", "true") != "true":
+            return None
+        path = os.getenv("FAQ_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq.json"))
+        return cls(FAQIndex.load(path), threshold=float(os.getenv("FAQ_THRESHOLD", "0.6")))
+
+    def answer(self, text: str) -> Optional[FAQMatch]:
+        """A match confident enough to skip the LLM, else None"""
+        match = self.index.search(text)
+        if match is None or match.score < self.threshold:
+            return None
+        logger.info(f"Answering from FAQ {match.faq_id} (score {match.score:.2f})")
+        return match
+
+    def record(self, route: str, seconds: float) -> None:
+        """Record time to first response token for a route ("faq" or "llm")"""
+        self.routed[route] += 1
+        self._latencies[route].append(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        routes = {}
+        for route, latencies in self._latencies.items():
+            ordered = sorted(latencies)
+            routes[route] = {
+                "count": self.routed[route],
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                "p99_ms": round(ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)] * 1000, 1),
+            }
+        return routes
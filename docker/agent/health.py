@@ -0,0 +1,139 @@
+"""
+Worker health and readiness endpoint.
+
+LiveKit's own health check on the worker's HTTP port only says whether the
+worker connected and its inference process is alive. Orchestration needs to
+know more to route around a worker that is up but struggling. The
+HealthServer serves two routes on HEALTH_PORT from the worker process:
+
+- /healthz: liveness. 503 when the inference process died or the worker
+  could not connect to LiveKit.
+- /readyz: readiness, with a JSON report of active rooms, admission
+  pressures, the worst job event loop lag percentiles, slow callbacks,
+  pending uploads and where the models are loaded. 503 with the reasons
+  when the worker is not registered, no process has the VAD loaded yet, or
+  some admission limit is reached (which includes loop lag).
+
+Job processes publish their loop lag, slow callbacks and pending uploads
+(loop_monitor.py) and their model load state (models.py) through the
+Prometheus multiprocess directory; the report aggregates them like the
+admission load function does.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from livekit.agents import AgentServer
+
+from admission import AdmissionController, read_job_metrics
+
+logger = logging.getLogger("dialogLens-health")
+
+
+class HealthServer:
+    """Serves /healthz and /readyz for one worker"""
+
+    def __init__(self, agent_type: str, admission: AdmissionController, port: int = 8082, host: str = "0.0.0.0") -> None:
+        self.agent_type = agent_type
+        self.admission = admission
+        self.port = port
+        self.host = host
+        self._server: Optional[AgentServer] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, agent_type: str, admission: AdmissionController) -> Optional["HealthServer"]:
+        """The server on HEALTH_PORT, or None when HEALTH_PORT is empty"""
+        port = os.getenv("HEALTH_PORT", "8082")
+        if not port:
+            return None
+        return cls(agent_type, admission, port=int(port))
+
+    def attach(self, server: AgentServer) -> None:
+        """Start serving once the worker is running"""
+        def start() -> None:
+            self._task = asyncio.create_task(self._start(server))
+        server.on("worker_started", start)
+
+    def liveness_problem(self) -> Optional[str]:
+        inference = self._server._inference_executor
+        if inference is not None and not inference.is_alive():
+            return "inference process not running"
+        if self._server._connection_failed:
+            return "failed to connect to LiveKit"
+        return None
+
+    def report(self) -> Dict[str, Any]:
+        """Readiness and the signals behind it (reads metric files; run in an executor)"""
+        metrics = read_job_metrics()
+        pressures = self.admission.pressures
+        inference = self._server._inference_executor
+        vad_processes = int(_sum(metrics, "dialoglens_models_loaded", model="vad"))
+
+        reasons: List[str] = []
+        problem = self.liveness_problem()
+        if problem:
+            reasons.append(problem)
+        if self._server.id == "unregistered":
+            reasons.append("not registered with LiveKit")
+        if not vad_processes:
+            reasons.append("VAD not loaded in any process yet")
+        reasons.extend(f"{signal} at its admission limit" for signal, value in pressures.items() if value >= 1.0)
+
+        return {
+            "ready": not reasons,
+            "reasons": reasons,
+            "agent_type": self.agent_type,
+            "active_rooms": len(self._server.active_jobs),
+            "load": round(min(max(pressures.values(), default=0.0), 1.0), 2),
+            "pressures": {signal: round(value, 2) for signal, value in pressures.items()},
+            "loop_lag_ms": {
+                quantile: round(_max(metrics, "dialoglens_event_loop_lag_quantile_seconds", quantile=quantile) * 1000, 1)
+                for quantile in ("p50", "p95", "p99", "max")
+            },
+            "slow_callbacks": int(_sum(metrics, "dialoglens_slow_callbacks")),
+            "pending_uploads": int(_sum(metrics, "dialoglens_pending_uploads")),
+            "models": {
+                "vad": {
+                    "processes": vad_processes,
+                    "load_ms": round(_max(metrics, "dialoglens_model_load_seconds", model="vad") * 1000),
+                },
+                "turn_detector": {"inference_process": inference is not None and inference.is_alive()},
+            },
+        }
+
+    async def _start(self, server: AgentServer) -> None:
+        self._server = server
+        app = web.Application()
+        app.add_routes([web.get("/healthz", self._healthz), web.get("/readyz", self._readyz)])
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Health endpoint listening on {self.host}:{self.port}")
+
+    async def _healthz(self, request: web.Request) -> web.Response:
+        problem = self.liveness_problem()
+        return web.json_response({"status": problem or "ok"}, status=503 if problem else 200)
+
+    async def _readyz(self, request: web.Request) -> web.Response:
+        report = await asyncio.get_running_loop().run_in_executor(None, self.report)
+        return web.json_response(report, status=200 if report["ready"] else 503)
+
+
+def _samples(metrics: Dict[str, List[Any]], name: str, labels: Dict[str, str]) -> List[float]:
+    return [
+        sample.value
+        for sample in metrics.get(name, [])
+        if not sample.name.endswith("_created") and all(sample.labels.get(key) == value for key, value in labels.items())
+    ]
+
+
+def _sum(metrics: Dict[str, List[Any]], name: str, **labels: str) -> float:
+    return sum(_samples(metrics, name, labels))
+
+
+def _max(metrics: Dict[str, List[Any]], name: str, **labels: str) -> float:
+    return max(_samples(metrics, name, labels), default=0.0)
@@ -0,0 +1,440 @@
+"""
+Cross-session micro-batching of Silero VAD and turn detector inference.
+
+Every VAD stream runs the Silero ONNX model once per 32ms window, and every
+end-of-turn check runs the turn detector once, each as its own tiny ONNX
+call. Session overhead dominates calls that small: one VAD window costs
+about as much as four in a single batched call. With INFERENCE_BATCHING=true
+a MicroBatcher per model and process collects the calls that arrive within
+a short latency bound from all sessions, stacks them into one NumPy batch,
+runs it once and hands each caller its own result.
+
+- VAD: BatchedVAD streams keep their own RNN state and context like the
+  stock model; the batcher stacks them along the batch axis, so results are
+  identical to unbatched inference. A stream awaits its window's result on
+  the event loop instead of holding an executor thread for it. The batcher
+  only waits for as many windows as there are recently active streams, so a
+  lone stream is never delayed. Streams share a process when several rooms
+  run in one worker process (JOB_EXECUTOR_TYPE=thread) or a session has
+  several participants.
+- Turn detector: it already runs in the worker's shared inference process,
+  which serves every job process. BatchedTurnRunner is registered there
+  under its own method next to the stock runner, and the jobs' turn
+  detector handles (BatchedMultilingualModel) call it. It right-pads the
+  token sequences of concurrent requests into one call. The model is
+  causal, so padding after a sequence does not change its scores. Requests
+  are grouped by length to bound padding.
+
+The inference process runs each turn detector request on its thread pool,
+so those callers block on the batch. A batcher that waits out its bound
+with fewer callers than it expected (e.g. when the pool has fewer threads
+than requests) stops waiting for that many, and probes upward again after a
+run of full batches. A failing batch fails its callers and everything queued
+behind it rather than the dispatcher thread. Each batcher reports batch
+sizes, queueing delay and the inference time saved against its measured
+single-call cost.
+"""
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from livekit.agents.inference_runner import _InferenceRunner
+from livekit.plugins import silero
+from livekit.plugins.silero import onnx_model
+from livekit.plugins.silero.vad import VADStream
+from livekit.plugins.turn_detector.base import MAX_HISTORY_TOKENS
+from livekit.plugins.turn_detector.multilingual import MultilingualModel, _EUORunnerMultilingual
+
+from voice_metrics import INFERENCE_BATCH_SIZE, INFERENCE_QUEUE_SECONDS, INFERENCE_SAVED_SECONDS
+
+logger = logging.getLogger("dialogLens-inference-batcher")
+
+# Batch limits per model: (max batch, latency bound in ms)
+BATCH_DEFAULTS = {"vad": (32, 10.0), "turn_detector": (8, 5.0)}
+
+
+class _Request:
+    __slots__ = ("item", "weight", "enqueued", "future")
+
+    def __init__(self, item: Any, weight: float) -> None:
+        self.item = item
+        self.weight = weight
+        self.enqueued = time.perf_counter()
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+
+
+class MicroBatcher:
+    """Runs items submitted from many threads in batches on one dispatcher thread"""
+
+    def __init__(
+        self,
+        model: str,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch: int = 32,
+        max_wait: float = 0.01,
+        expected: Optional[Callable[[], int]] = None,
+        unit_seconds: Optional[float] = None,
+        log_interval: float = 60.0,
+    ) -> None:
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.log_interval = log_interval
+        self._run_batch = run_batch
+        # How many submissions a batch can expect; without it the batch waits out max_wait
+        self._expected = expected
+        self._pending: List[_Request] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        # Callers that can be waiting at once; executor threads may cap it below expected
+        self._reachable = max_batch
+        self._filled = 0
+        # Cost per unit of weight of a single call, refined by single-item batches
+        self._unit_seconds = unit_seconds
+        self._logged_at = time.monotonic()
+        self._size_metric = INFERENCE_BATCH_SIZE.labels(model=model)
+        self._queue_metric = INFERENCE_QUEUE_SECONDS.labels(model=model)
+        self._saved_metric = INFERENCE_SAVED_SECONDS.labels(model=model)
+
+        # Batching counters
+        self.batches = 0
+        self.items = 0
+        self.max_size = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.inference_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, model: str, run_batch: Callable[[List[Any]], List[Any]], **kwargs) -> "MicroBatcher":
+        max_batch, max_wait_ms = BATCH_DEFAULTS[model]
+        prefix = model.upper()
+        return cls(
+            model,
+            run_batch,
+            max_batch=int(os.getenv(f"{prefix}_BATCH_MAX", str(max_batch))),
+            max_wait=float(os.getenv(f"{prefix}_BATCH_WAIT_MS", str(max_wait_ms))) / 1000,
+            **kwargs,
+        )
+
+    def submit(self, item: Any, weight: float = 1.0) -> Any:
+        """Queue an item and block until its batch has run"""
+        return self._enqueue(item, weight).future.result()
+
+    async def submit_async(self, item: Any, weight: float = 1.0) -> Any:
+        """Queue an item and wait for its batch without holding a thread"""
+        return await asyncio.wrap_future(self._enqueue(item, weight).future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_size,
+            "mean_queue_ms": round(self.queue_seconds / self.items * 1000, 2) if self.items else 0.0,
+            "max_queue_ms": round(self.max_queue_seconds * 1000, 2),
+            "inference_seconds": round(self.inference_seconds, 3),
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+    def _enqueue(self, item: Any, weight: float) -> _Request:
+        request = _Request(item, weight)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name=f"{self.model}-batcher", daemon=True)
+                self._thread.start()
+            self._pending.append(request)
+            self._cond.notify()
+        return request
+
+    def _dispatch(self) -> None:
+        while True:
+            batch: List[_Request] = []
+            try:
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                started = time.perf_counter()
+                results = self._run_batch([request.item for request in batch])
+                elapsed = time.perf_counter() - started
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{len(results)} results for a batch of {len(batch)}")
+
+                for request, result in zip(batch, results):
+                    request.future.set_result(result)
+                self._record(batch, started, elapsed)
+            except Exception as e:
+                logger.exception(f"Inference batch for {self.model} failed")
+                self._fail(batch, e)
+
+    def _fail(self, batch: List[_Request], error: Exception) -> None:
+        """Fail the batch and everything queued behind it, so no caller waits forever"""
+        with self._cond:
+            failed = batch + self._pending
+            self._pending = []
+        for request in failed:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def _next_batch(self) -> List[_Request]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            # Wait for the other expected callers, but never past the oldest's latency bound
+            target = min(self._expected(), self._reachable) if self._expected else self._reachable
+            deadline = self._pending[0].enqueued + self.max_wait
+            while len(self._pending) < target:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    # Stop waiting for callers that never came, and probe upward again later
+                    self._reachable = max(len(self._pending), 1)
+                    self._filled = 0
+                    break
+                self._cond.wait(remaining)
+            else:
+                self._filled += 1
+                if self._filled >= 100 and self._reachable < self.max_batch:
+                    self._reachable += 1
+                    self._filled = 0
+
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+        # Callers that were cancelled while queued drop out of the batch
+        return [request for request in batch if request.future.set_running_or_notify_cancel()]
+
+    def _record(self, batch: List[_Request], started: float, elapsed: float) -> None:
+        weight = sum(request.weight for request in batch)
+        if len(batch) == 1:
+            unit = elapsed / weight
+            self._unit_seconds = unit if self._unit_seconds is None else 0.9 * self._unit_seconds + 0.1 * unit
+        elif self._unit_seconds is not None:
+            # What the same items would have cost one call at a time
+            saved = self._unit_seconds * weight - elapsed
+            self.saved_seconds += saved
+            if saved > 0:
+                self._saved_metric.inc(saved)
+
+        self.batches += 1
+        self.items += len(batch)
+        self.max_size = max(self.max_size, len(batch))
+        self.inference_seconds += elapsed
+        self._size_metric.observe(len(batch))
+        for request in batch:
+            waited = started - request.enqueued
+            self.queue_seconds += waited
+            self.max_queue_seconds = max(self.max_queue_seconds, waited)
+            self._queue_metric.observe(waited)
+
+        if time.monotonic() - self._logged_at >= self.log_interval:
+            self._logged_at = time.monotonic()
+            logger.info(f"Inference batching for {self.model}: {self.stats()}")
+
+
+class _BatchedSileroModel(onnx_model.OnnxModel):
+    """One stream's Silero state; inference goes through the process's VAD batcher"""
+
+    def __init__(self, batcher: MicroBatcher, *, onnx_session, sample_rate: int) -> None:
+        super().__init__(onnx_session=onnx_session, sample_rate=sample_rate)
+        self._batcher = batcher
+        self.last_call = 0.0
+
+    def __call__(self, x: np.ndarray) -> float:
+        self.last_call = time.perf_counter()
+        return self._batcher.submit((self, x))
+
+    async def infer(self, x: np.ndarray) -> float:
+        self.last_call = time.perf_counter()
+        return await self._batcher.submit_async((self, x))
+
+
+class _BatchedLoop:
+    """A VAD stream's event loop, with the stream's model calls awaited on the batcher instead of run in the executor"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, model: _BatchedSileroModel) -> None:
+        self._loop = loop
+        self._model = model
+
+    def run_in_executor(self, executor, func, *args) -> "asyncio.Future[Any]":
+        if func is self._model:
+            return asyncio.ensure_future(self._model.infer(*args), loop=self._loop)
+        return self._loop.run_in_executor(executor, func, *args)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loop, name)
+
+
+class _BatchedVADStream(VADStream):
+    """Silero's stream, unchanged except that each window awaits the batcher"""
+
+    def __init__(self, vad: silero.VAD, opts, model: _BatchedSileroModel) -> None:
+        super().__init__(vad, opts, model)
+        # The stream only uses its loop for the model call; see VADStream._main_task
+        self._loop = _BatchedLoop(self._loop, model)
+
+
+class _VADBatch:
+    """Runs one Silero call for the windows of many streams"""
+
+    def __init__(self, onnx_session, sample_rate: int) -> None:
+        self._sess = onnx_session
+        self._sample_rate_nd = np.array(sample_rate, dtype=np.int64)
+        self._models: "weakref.WeakSet[_BatchedSileroModel]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.batcher = MicroBatcher.from_env(
+            "vad", self.run, expected=self.active_streams, unit_seconds=self._single_call_seconds(sample_rate)
+        )
+
+    def _single_call_seconds(self, sample_rate: int) -> float:
+        """Cost of one unbatched window, the baseline for the time saved"""
+        model = onnx_model.OnnxModel(onnx_session=self._sess, sample_rate=sample_rate)
+        window = np.zeros(model.window_size_samples, dtype=np.float32)
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            model(window)
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[2]
+
+    def model(self, sample_rate: int) -> _BatchedSileroModel:
+        model = _BatchedSileroModel(self.batcher, onnx_session=self._sess, sample_rate=sample_rate)
+        with self._lock:
+            self._models.add(model)
+        return model
+
+    def active_streams(self) -> int:
+        """Streams that ran inference within the last two windows"""
+        since = time.perf_counter() - 0.064
+        with self._lock:
+            return max(sum(1 for model in self._models if model.last_call >= since), 1)
+
+    def run(self, windows: List[Any]) -> List[float]:
+        models = [model for model, _ in windows]
+        context = models[0].context_size
+        inputs = np.empty((len(windows), context + models[0].window_size_samples), dtype=np.float32)
+        state = np.empty((2, len(windows), 128), dtype=np.float32)
+        for i, (model, x) in enumerate(windows):
+            inputs[i, :context] = model._context
+            inputs[i, context:] = x
+            state[:, i] = model._rnn_state[:, 0]
+
+        out, new_state = self._sess.run(None, {"input": inputs, "state": state, "sr": self._sample_rate_nd})
+
+        # Scatter each stream's state back, as OnnxModel.__call__ would have left it
+        for i, model in enumerate(models):
+            model._rnn_state = new_state[:, i : i + 1].copy()
+            model._context = inputs[i : i + 1, -context:].copy()
+        return [float(p) for p in out[:, 0]]
+
+
+# One per sample rate and process, shared by every BatchedVAD
+_vad_batches: Dict[int, _VADBatch] = {}
+_vad_batches_lock = threading.Lock()
+
+
+class BatchedVAD(silero.VAD):
+    """Silero VAD whose streams run inference through the process-wide batcher"""
+
+    def stream(self) -> VADStream:
+        sample_rate = self._opts.sample_rate
+        with _vad_batches_lock:
+            if sample_rate not in _vad_batches:
+                _vad_batches[sample_rate] = _VADBatch(self._onnx_session, sample_rate)
+            batch = _vad_batches[sample_rate]
+
+        stream = _BatchedVADStream(self, self._opts, batch.model(sample_rate))
+        self._streams.add(stream)
+        return stream
+
+
+class BatchedTurnRunner(_EUORunnerMultilingual):
+    """Turn detector runner for the shared inference process that batches concurrent requests"""
+
+    INFERENCE_METHOD = "dialoglens_end_of_utterance_multilingual_batched"
+
+    # Longest padded batch relative to the tokens it carries
+    MAX_PADDING = 1.25
+
+    def initialize(self) -> None:
+        super().initialize()
+        self._pad_id = self._tokenizer.pad_token_id or self._tokenizer.eos_token_id or 0
+        self._batcher: Optional[MicroBatcher] = None
+
+        # Right padding needs a score per position; a last-token-only export cannot batch
+        probe = self._session.run(None, {"input_ids": np.array([[self._pad_id] * 3], dtype=np.int64)})[0]
+        if probe.size != 3:
+            logger.warning("Turn detector model scores only the last token; running unbatched")
+            return
+        self._batcher = MicroBatcher.from_env("turn_detector", self._run_batch)
+
+    def run(self, data: bytes) -> Optional[bytes]:
+        if self._batcher is None:
+            return super().run(data)
+
+        chat_ctx = json.loads(data).get("chat_ctx", None)
+        if not chat_ctx:
+            raise ValueError("chat_ctx is required on the inference input data")
+
+        start_time = time.perf_counter()
+        text = self._format_chat_ctx(chat_ctx)
+        input_ids = self._tokenizer(
+            text,
+            add_special_tokens=False,
+            return_tensors="np",
+            max_length=MAX_HISTORY_TOKENS,
+            truncation=True,
+        )["input_ids"][0].astype(np.int64)
+        eou_probability = self._batcher.submit(input_ids, weight=len(input_ids))
+
+        return json.dumps({
+            "eou_probability": eou_probability,
+            "duration": round(time.perf_counter() - start_time, 3),
+            "input": text,
+        }).encode()
+
+    def _run_batch(self, sequences: List[np.ndarray]) -> List[float]:
+        results: List[float] = [0.0] * len(sequences)
+        order = sorted(range(len(sequences)), key=lambda i: len(sequences[i]))
+
+        # Shortest first, so each group pads to a length close to its own
+        group: List[int] = []
+        tokens = 0
+        for i in order:
+            length = len(sequences[i])
+            if group and (len(group) + 1) * length > self.MAX_PADDING * (tokens + length):
+                self._run_group(sequences, group, results)
+                group, tokens = [], 0
+            group.append(i)
+            tokens += length
+        self._run_group(sequences, group, results)
+        return results
+
+    def _run_group(self, sequences: List[np.ndarray], group: List[int], results: List[float]) -> None:
+        length = max(len(sequences[i]) for i in group)
+        input_ids = np.full((len(group), length), self._pad_id, dtype=np.int64)
+        for row, i in enumerate(group):
+            input_ids[row, : len(sequences[i])] = sequences[i]
+
+        scores = self._session.run(None, {"input_ids": input_ids})[0].reshape(len(group), length)
+        for row, i in enumerate(group):
+            results[i] = float(scores[row, len(sequences[i]) - 1])
+
+
+class BatchedMultilingualModel(MultilingualModel):
+    """Turn detector handle whose requests go to the batched runner"""
+
+    def _inference_method(self) -> str:
+        return BatchedTurnRunner.INFERENCE_METHOD
+
+
+def install_turn_runner() -> None:
+    """Register the batched turn detector runner (main thread, before the worker starts)"""
+    if BatchedTurnRunner.INFERENCE_METHOD not in _InferenceRunner.registered_runners:
+        _InferenceRunner.register_runner(BatchedTurnRunner)
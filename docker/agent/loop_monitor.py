@@ -0,0 +1,160 @@
+"""
+Event loop lag sampling and blocked-loop detection for job processes.
+
+Dropped audio usually means a job's event loop was blocked: synchronous JSON
+work, logging, model inference or a stray blocking call in a handler. The
+LoopMonitor measures how late a periodic sleep wakes up and keeps a minute of
+samples, publishing the worst recent lag (which admission control reads) and
+the p50/p95/p99/max of the window through Prometheus multiprocess gauges. It
+also publishes the process's pending uploads each tick.
+
+A lag sample only says the loop was late, not why. A watchdog thread
+therefore pings the loop with call_soon_threadsafe. When a ping has not run
+within SLOW_CALLBACK_MS, the callback holding the loop is still running, and
+the watchdog captures the loop thread's stack at that moment. Once the loop
+answers, the stall is logged with that stack and counted.
+"""
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Deque, Dict, Optional
+
+from upload_dispatcher import pending_uploads
+from voice_metrics import EVENT_LOOP_LAG_QUANTILE_SECONDS, EVENT_LOOP_LAG_SECONDS, PENDING_UPLOADS, SLOW_CALLBACKS
+
+logger = logging.getLogger("dialogLens-loop-monitor")
+
+LAG_QUANTILES = {"p50": 0.50, "p95": 0.95, "p99": 0.99, "max": 1.0}
+
+# Innermost frames kept from a blocked loop's stack
+STACK_DEPTH = 12
+
+
+class LoopMonitor:
+    """Samples one event loop's lag and records the stack of callbacks that block it"""
+
+    def __init__(
+        self,
+        agent_type: str,
+        interval: float = 0.25,
+        window: float = 60.0,
+        slow_threshold: float = 0.1,
+    ) -> None:
+        self.agent_type = agent_type
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self._recent: Deque[float] = collections.deque(maxlen=8)
+        self._window: Deque[float] = collections.deque(maxlen=max(int(window / interval), 1))
+        self._lag_metric = EVENT_LOOP_LAG_SECONDS.labels(agent_type=agent_type)
+        self._quantile_metrics = {
+            name: EVENT_LOOP_LAG_QUANTILE_SECONDS.labels(agent_type=agent_type, quantile=name)
+            for name in LAG_QUANTILES
+        }
+        self._pending_metric = PENDING_UPLOADS.labels(agent_type=agent_type)
+        self._slow_metric = SLOW_CALLBACKS.labels(agent_type=agent_type)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id = 0
+        # Set by the watchdog while a ping is outstanding, cleared when the loop runs it
+        self._pinged_at: Optional[float] = None
+        self._stack: Optional[str] = None
+
+        # Monitor counters
+        self.slow_callbacks = 0
+        self.worst_stall = 0.0
+
+    @classmethod
+    def from_env(cls, agent_type: str, interval: float = 0.25) -> "LoopMonitor":
+        return cls(
+            agent_type,
+            interval=interval,
+            window=float(os.getenv("LOOP_LAG_WINDOW_SECONDS", "60")),
+            slow_threshold=float(os.getenv("SLOW_CALLBACK_MS", "100")) / 1000,
+        )
+
+    def start(self) -> None:
+        """Start sampling the running loop and watching it from a thread"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+        self._lag_metric.set(0)
+        for metric in self._quantile_metrics.values():
+            metric.set(0)
+        self._pending_metric.set(0)
+        logger.info(f"Event loop of {self.agent_type} job: {self.stats()}")
+
+    def lag_quantiles(self) -> Dict[str, float]:
+        """Lag percentiles over the sample window, in seconds"""
+        samples = sorted(self._window)
+        if not samples:
+            return {name: 0.0 for name in LAG_QUANTILES}
+        return {
+            name: samples[min(int(len(samples) * fraction), len(samples) - 1)]
+            for name, fraction in LAG_QUANTILES.items()
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lag_ms": {name: round(value * 1000, 1) for name, value in self.lag_quantiles().items()},
+            "slow_callbacks": self.slow_callbacks,
+            "worst_stall_ms": round(self.worst_stall * 1000, 1),
+        }
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            self._recent.append(lag)
+            self._window.append(lag)
+
+            self._lag_metric.set(max(self._recent))
+            for name, value in self.lag_quantiles().items():
+                self._quantile_metrics[name].set(value)
+            self._pending_metric.set(pending_uploads())
+
+    def _watch(self) -> None:
+        check = self.slow_threshold / 2
+        while not self._stopped.wait(check):
+            pinged_at = self._pinged_at
+            if pinged_at is None:
+                self._pinged_at = time.monotonic()
+                try:
+                    self._loop.call_soon_threadsafe(self._answer)
+                except RuntimeError:
+                    return  # loop closed
+            elif self._stack is None and time.monotonic() - pinged_at >= self.slow_threshold:
+                # The loop is still inside the blocking callback; this is its stack now
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None and self._pinged_at == pinged_at:
+                    self._stack = "".join(traceback.format_stack(frame)[-STACK_DEPTH:])
+
+    def _answer(self) -> None:
+        blocked = time.monotonic() - self._pinged_at
+        stack, self._stack = self._stack, None
+        self._pinged_at = None
+        if stack is None:
+            return
+
+        self.slow_callbacks += 1
+        self.worst_stall = max(self.worst_stall, blocked)
+        self._slow_metric.inc()
+        logger.warning(
+            f"Event loop of {self.agent_type} job blocked for {blocked * 1000:.0f}ms; "
+            f"stack while blocked:\n{stack}"
+        )
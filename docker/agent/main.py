@@ -1,31 +1,36 @@
 import asyncio
+import functools
 import logging
 import os
-from typing import Optional
+import uuid
 import json
 
 from dotenv import load_dotenv
-from livekit import agents, rtc
-from livekit.agents import AgentSession, Agent, RoomInputOptions, JobContext, WorkerOptions, cli
-from livekit.plugins import (
-    deepgram,
-    openai,
-    cartesia,
-    silero,
-    noise_cancellation,
-)
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
-import aiohttp
+from livekit.agents import AgentServer, AgentSession, Agent, RoomInputOptions, JobContext, JobRequest, WorkerOptions, cli
+
+from admission import AdmissionController, report_job_load
+from api_client import acquire_client, release_client
+from conversation_history import ConversationHistory
+from health import HealthServer
+from models import executor_options, install_batching, load_turn_detector, load_vad, prewarm
+from plugins import load_plugins, print_import_profile
+from transcript_pipeline import create_transcript_pipeline, epoch_ms, transcription_owner
+from tts_cache import phrase_cache
+from upload_dispatcher import UploadDispatcher
+from voice_metrics import TurnLatencyTracker, prometheus_options, room_type
 
 load_dotenv()
 
 logger = logging.getLogger("dialogLens-agent")
 
+# Consulted in the worker process before a room is accepted
+admission = AdmissionController.from_env("assistant")
+
 
 class DialogLensAssistant(Agent):
     """AI Assistant for DialogLens customer support"""
     
-    def __init__(self, api_url: str, api_key: str, room_name: str) -> None:
+    def __init__(self, dispatcher: UploadDispatcher, room_name: str) -> None:
         super().__init__(
             instructions="""You are a helpful AI assistant for DialogLens, a conversation 
             transcription and analysis platform. You help users with:
@@ -36,63 +41,98 @@ class DialogLensAssistant(Agent):
             
             Be friendly, professional, and concise in your responses."""
         )
-        self.api_url = api_url
-        self.api_key = api_key
+        self.dispatcher = dispatcher
         self.room_name = room_name
-        self.conversation_history = []
+        # Recent turns only; the API keeps the full conversation
+        self.conversation_history = ConversationHistory.from_env()
+        # Interaction uploads scheduled from session event handlers
+        self._pending: set = set()
         
     async def process_interaction(self, speaker: str, text: str):
-        """Record interaction to API"""
-        interaction = {
+        """Queue interaction for the API"""
+        # Add to local history
+        turn = self.conversation_history.append(
+            speaker, text, epoch_ms()
+        )
+        
+        # Send to API
+        data = {
+            "interactionId": uuid.uuid4().hex,  # Idempotency key for replays
+            "roomId": self.room_name,
             "speaker": speaker,
             "text": text,
-            "timestamp": int(asyncio.get_event_loop().time() * 1000),
+            "timestamp": turn.timestamp,
+            "metadata": {
+                "agentType": "customer-service",
+            }
         }
         
-        # Add to local history
-        self.conversation_history.append(interaction)
+        # Sent in the background so a slow API never delays the voice pipeline
+        await self.dispatcher.submit("/conversations/interaction", data)
+    
+    def queue_interaction(self, speaker: str, text: str) -> None:
+        """Schedule process_interaction from a synchronous event handler"""
+        task = asyncio.create_task(self.process_interaction(speaker, text))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+    
+    def attach_session(self, session: AgentSession) -> None:
+        """Record the session's user and agent turns (callbacks must be synchronous)"""
         
-        # Send to API
-        try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}",
-                }
-                
-                data = {
-                    "roomId": self.room_name,
-                    "speaker": speaker,
-                    "text": text,
-                    "timestamp": interaction["timestamp"],
-                    "metadata": {
-                        "agentType": "customer-service",
-                    }
-                }
-                
-                async with session.post(
-                    f"{self.api_url}/conversations/interaction",
-                    json=data,
-                    headers=headers,
-                ) as response:
-                    if response.status != 200:
-                        logger.error(
-                            f"Failed to record interaction: {response.status}"
-                        )
-        except Exception as e:
-            logger.error(f"Error recording interaction: {e}")
+        @session.on("user_input_transcribed")
+        def on_user_transcribed(event):
+            if event.is_final and event.transcript:
+                self.queue_interaction("user", event.transcript)
+        
+        @session.on("conversation_item_added")
+        def on_conversation_item(event):
+            item = event.item
+            if item.type == "message" and item.role == "assistant" and item.text_content:
+                self.queue_interaction("assistant", item.text_content)
 
 
 async def entrypoint(ctx: JobContext):
     """Main entry point for the agent"""
     logger.info(f"Agent connecting to room {ctx.room.name}")
     
-    # Get configuration
-    api_url = os.getenv("API_URL", "http://localhost:3000/api")
-    api_key = os.getenv("API_KEY", "")
+    # Already loaded for this role by the worker or prewarm (plugins.py)
+    from livekit.plugins import cartesia, deepgram, noise_cancellation, openai
+    
+    # One STT stream per room; loop lag and streams feed the worker's load function
+    report_job_load(ctx, "assistant")
+    
+    # Upload interactions in the background over the worker's pooled API client
+    api = await acquire_client()
+    dispatcher = UploadDispatcher(
+        api,
+        max_queue_size=int(os.getenv("UPLOAD_QUEUE_SIZE", "1000")),
+        policy=os.getenv("UPLOAD_OVERFLOW_POLICY", "spill"),
+    )
+    dispatcher.start()
+    
+    metadata = json.loads(ctx.room.metadata or "{}")
+    
+    # In combined mode this session's STT stream also feeds the transcript path,
+    # so the room does not need a second STT session from the transcription agent
+    pipeline = None
+    if transcription_owner(metadata) == "assistant":
+        pipeline = create_transcript_pipeline(ctx, api)
+        pipeline.start()
+    
+    async def shutdown():
+        # Send queued interactions and segments before the client is released
+        await dispatcher.close()
+        if pipeline is not None:
+            await pipeline.close()
+        await release_client()
+    
+    ctx.add_shutdown_callback(shutdown)
     
     # Create the assistant
-    assistant = DialogLensAssistant(api_url, api_key, ctx.room.name)
+    assistant = DialogLensAssistant(dispatcher, ctx.room.name)
+    
+    voice_id = "79a125e8-cd45-4c13-8a67-188112f4dd22"  # Professional female voice
+    tts_engine = cartesia.TTS(voice_id=voice_id)
     
     # Create session with STT-LLM-TTS pipeline
     session = AgentSession(
@@ -106,28 +146,23 @@ async def entrypoint(ctx: JobContext):
             model="gpt-4o-mini",
             temperature=0.7,
         ),
-        tts=cartesia.TTS(
-            voice_id="79a125e8-cd45-4c13-8a67-188112f4dd22",  # Professional female voice
-        ),
-        vad=silero.VAD.load(),
-        turn_detection=MultilingualModel(),
+        tts=tts_engine,
+        # VAD is loaded once per process by prewarm, not per room join
+        vad=load_vad(ctx.proc),
+        turn_detection=load_turn_detector(),
     )
     
     # Connect to room
     await ctx.connect()
     
-    # Set up event handlers for tracking conversations
-    @session.on("user_speech_finished")
-    async def on_user_speech(event):
-        """Handle when user finishes speaking"""
-        if event.text:
-            await assistant.process_interaction("user", event.text)
+    # Track the conversation's turns
+    assistant.attach_session(session)
     
-    @session.on("agent_speech_started")
-    async def on_agent_speech(event):
-        """Handle when agent starts speaking"""
-        if event.text:
-            await assistant.process_interaction("assistant", event.text)
+    if pipeline is not None:
+        pipeline.attach_session(session)
+    
+    # Per-turn stage latencies, exported on the worker's /metrics endpoint
+    TurnLatencyTracker("assistant", room_type(metadata)).attach(session)
     
     # Start the session with noise cancellation if using LiveKit Cloud
     try:
@@ -146,7 +181,6 @@ async def entrypoint(ctx: JobContext):
         )
     
     # Generate initial greeting based on room metadata
-    metadata = json.loads(ctx.room.metadata or "{}")
     customer_context = metadata.get("customerContext", {})
     
     greeting = "Hello! I'm here to help you with DialogLens. "
@@ -155,11 +189,25 @@ async def entrypoint(ctx: JobContext):
     
     greeting += "How can I assist you today?"
     
-    await session.generate_reply(instructions=greeting)
+    # The fixed greeting is spoken from the phrase cache so the first words play without
+    # a TTS round-trip; a greeting with the customer's name is never cached
+    if customer_name:
+        session.say(greeting)
+    else:
+        session.say(greeting, audio=phrase_cache().stream(tts_engine, greeting, voice_id))
     
     logger.info("Agent started successfully")
 
 
+async def request_handler(request: JobRequest) -> None:
+    """Accept rooms only while this worker has capacity"""
+    if admission.admit(request.room.name):
+        await request.accept()
+    else:
+        # Not terminal, so LiveKit offers the room to another worker
+        await request.reject(terminate=False)
+
+
 async def request_fn(ctx: JobContext):
     """Function called when agent is requested for a room"""
     # Check room metadata to determine if this agent should handle the room
@@ -191,10 +239,32 @@ if __name__ == "__main__":
         logger.info("Model files downloaded successfully")
         sys.exit(0)
     
+    # Report what importing this agent and its plugins costs a new process
+    if len(sys.argv) > 1 and sys.argv[1] == "profile-imports":
+        print_import_profile("main", "assistant")
+        sys.exit(0)
+    
+    # Only this role's plugins, so the forkserver preloads exactly these
+    load_plugins("assistant")
+    
+    # Opt-in: batch VAD and turn detection across sessions (INFERENCE_BATCHING)
+    install_batching()
+    
     # Run the agent
-    cli.run_app(
+    server = AgentServer.from_server_options(
         WorkerOptions(
             entrypoint_fnc=request_fn,
+            request_fnc=request_handler,
+            prewarm_fnc=functools.partial(prewarm, role="assistant"),
+            **admission.worker_options(),
+            **executor_options(),
+            **prometheus_options(),
             worker_type="room",
         )
-    )
\ No newline at end of file
+    )
+    
+    # Liveness and readiness for orchestration (HEALTH_PORT)
+    health = HealthServer.from_env("assistant", admission)
+    if health is not None:
+        health.attach(server)
+    cli.run_app(server)
\ No newline at end of file
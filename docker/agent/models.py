@@ -0,0 +1,105 @@
+"""
+Process-level model prewarming.
+
+Silero VAD is an ONNX model. Loading it inside `entrypoint` puts the load on
+the critical path of every room join, so each agent registers `prewarm` as its
+`prewarm_fnc` to load it once when the worker spawns a process, and jobs pick
+it up from `proc.userdata`.
+
+The multilingual turn detector already runs in the worker's shared inference
+process, which loads its weights once at startup; the per-job object is only a
+handle to that executor and needs the job context, so it is built per job.
+
+Plugins are imported per role (plugins.py); prewarm loads the role's set
+before the VAD.
+
+With INFERENCE_BATCHING=true the VAD is a BatchedVAD and the turn detector
+runner in the inference process is a batched one (inference_batcher.py).
+That module pulls in NumPy and the plugins' ONNX internals, so it is only
+imported when batching is on.
+"""
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from livekit.agents import JobExecutorType, JobProcess
+
+from plugins import load_plugins
+from voice_metrics import MODEL_LOAD_SECONDS, MODELS_LOADED
+
+if TYPE_CHECKING:
+    from livekit.plugins import silero
+    from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+logger = logging.getLogger("dialogLens-models")
+
+# Seconds spent loading each model in this process
+load_times: Dict[str, float] = {}
+
+
+def batching_enabled() -> bool:
+    return os.getenv("INFERENCE_BATCHING", "false") == "true"
+
+
+def install_batching() -> None:
+    """Install the batched turn detector runner when INFERENCE_BATCHING is on (main thread, before the worker starts)"""
+    if not batching_enabled():
+        return
+    import inference_batcher
+
+    inference_batcher.install_turn_runner()
+
+
+def executor_options() -> Dict[str, Any]:
+    """WorkerOptions arguments; thread jobs let rooms share the VAD batcher"""
+    if os.getenv("JOB_EXECUTOR_TYPE", "process") != "thread":
+        return {}
+    return {"job_executor_type": JobExecutorType.THREAD}
+
+
+def prewarm(proc: JobProcess, role: Optional[str] = None) -> None:
+    """Load the role's plugins and shared models once per worker process"""
+    if role is not None:
+        load_plugins(role)
+    load_vad(proc)
+    logger.info(
+        "Models prewarmed in "
+        + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in load_times.items())
+    )
+
+
+def load_vad(proc: JobProcess) -> "silero.VAD":
+    """Get the process's Silero VAD, loading it if prewarm did not run"""
+    from livekit.plugins import silero
+
+    if "vad" not in proc.userdata:
+        start = time.perf_counter()
+        if batching_enabled():
+            from inference_batcher import BatchedVAD
+
+            # Streams of every job in this process share one batched model call
+            proc.userdata["vad"] = BatchedVAD.load()
+        else:
+            proc.userdata["vad"] = silero.VAD.load()
+        load_times["vad"] = time.perf_counter() - start
+        # Read by the worker's readiness endpoint (health.py)
+        MODEL_LOAD_SECONDS.labels(model="vad").set(load_times["vad"])
+        MODELS_LOADED.labels(model="vad").set(1)
+    return proc.userdata["vad"]
+
+
+def load_turn_detector() -> "MultilingualModel":
+    """Build the job's turn detector handle on the shared inference executor"""
+    from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+    start = time.perf_counter()
+    if batching_enabled():
+        from inference_batcher import BatchedMultilingualModel
+
+        # Its requests go to the batched runner that install_batching registered
+        model = BatchedMultilingualModel()
+    else:
+        model = MultilingualModel()
+    load_times["turn_detector"] = time.perf_counter() - start
+    return model
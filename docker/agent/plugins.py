@@ -0,0 +1,116 @@
+"""
+Role-based plugin loading and import profiling.
+
+Importing every LiveKit plugin at module load makes each worker, each job
+process and even `download-files` pay for plugins the role never uses (the
+transcription agent needs no LLM or TTS). The agent modules import no plugins
+at the top; each role loads its own set with load_plugins():
+
+- in the worker process before the worker starts. Under the forkserver start
+  method (the Linux default) the worker preloads every registered plugin into
+  the forkserver, so job processes inherit exactly this set copy-on-write.
+- in prewarm, so that under `spawn` the imports happen while a process warms
+  up rather than inside the first job.
+
+The entrypoints then import the plugins locally, which is a dictionary lookup
+once they are loaded. `python <agent>.py profile-imports` reports the import
+cost of the agent module plus its plugins in a fresh interpreter.
+"""
+import collections
+import importlib
+import logging
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger("dialogLens-plugins")
+
+VOICE_PLUGINS = ("deepgram", "openai", "cartesia", "noise_cancellation", "silero", "turn_detector")
+
+ROLE_PLUGINS: Dict[str, Tuple[str, ...]] = {
+    "assistant": VOICE_PLUGINS,
+    "customer-service": VOICE_PLUGINS,
+    "transcription": ("deepgram", "noise_cancellation", "silero", "turn_detector"),
+}
+
+# The turn detector registers its inference runner from this submodule
+PLUGIN_MODULES = {"turn_detector": "livekit.plugins.turn_detector.multilingual"}
+
+# Seconds spent importing each plugin in this process
+import_times: Dict[str, float] = {}
+
+
+def load_plugins(role: str) -> None:
+    """Import the role's plugins (must run on the main thread, where plugins register)"""
+    for name in ROLE_PLUGINS[role]:
+        module = PLUGIN_MODULES.get(name, f"livekit.plugins.{name}")
+        if module in sys.modules:
+            continue
+        start = time.perf_counter()
+        importlib.import_module(module)
+        import_times[name] = time.perf_counter() - start
+    if import_times:
+        logger.info(
+            f"Plugins for {role} imported in "
+            + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in import_times.items())
+        )
+
+
+def profile_imports(module: str, role: str) -> Tuple[float, List[Tuple[str, float, float]]]:
+    """
+    Import cost of an agent module and its role's plugins in a fresh interpreter.
+
+    Returns the total seconds and (package, self seconds, cumulative seconds)
+    rows from `python -X importtime`, grouped by package, costliest first.
+    Cumulative time is that of the package's costliest single import.
+    """
+    code = f"import {module}; import plugins; plugins.load_plugins({role!r})"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    self_us: Dict[str, int] = collections.Counter()
+    cumulative_us: Dict[str, int] = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue  # column header
+        name = fields[2].strip()
+        depth = (len(fields[2]) - len(fields[2].lstrip()) - 1) // 2
+        package = _package(name)
+        self_us[package] += int(fields[0])
+        # The outermost import of a package includes all of its submodules
+        cumulative_us[package] = max(cumulative_us.get(package, 0), int(fields[1]))
+        if depth == 0:
+            total_us += int(fields[1])
+
+    rows = [
+        (package, self_us[package] / 1e6, cumulative_us[package] / 1e6)
+        for package in self_us
+    ]
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return total_us / 1e6, rows
+
+
+def print_import_profile(module: str, role: str, limit: int = 25) -> None:
+    total, rows = profile_imports(module, role)
+    print(f"{module} ({role}): {total * 1000:.0f}ms to import, including {', '.join(ROLE_PLUGINS[role])}")
+    print(f"{'package':<44}{'self ms':>10}{'cumulative ms':>16}")
+    for package, self_seconds, cumulative in rows[:limit]:
+        print(f"{package:<44}{self_seconds * 1000:>10.0f}{cumulative * 1000:>16.0f}")
+
+
+def _package(name: str) -> str:
+    # livekit.plugins.openai and livekit.agents are reported separately;
+    # everything else by its top-level package
+    parts = name.split(".")
+    if parts[0] == "livekit" and len(parts) > 1:
+        return ".".join(parts[:3] if parts[1] == "plugins" else parts[:2])
+    return parts[0]
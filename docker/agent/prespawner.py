@@ -0,0 +1,201 @@
+"""
+Adaptive sizing of the worker's warm process pool.
+
+A job that finds no warm process waits for a new one to spawn and load its
+models (a cold start). Too few warm processes and call bursts hit cold
+starts; too many and quiet periods hold memory for nothing. The
+AdaptivePrespawner tracks the job arrival rate (an exponentially decayed
+rate) and how long a process takes to spawn, and keeps enough processes
+warm to cover the jobs expected to arrive while one more spawns, times a
+headroom factor, between a configured minimum and maximum. Warm processes
+beyond the target are closed once they have been surplus for the idle TTL.
+
+livekit-agents has no public API to resize the pool of a running worker, so
+this uses the worker's process pool directly.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+
+import psutil
+from livekit.agents import AgentServer
+
+from voice_metrics import IDLE_PROCESS_MEMORY_BYTES, IDLE_PROCESS_TARGET, JOB_STARTS
+
+logger = logging.getLogger("dialogLens-prespawner")
+
+
+class AdaptivePrespawner:
+    """Resizes the warm process pool from job arrival rate and spawn time"""
+
+    def __init__(
+        self,
+        agent_type: str,
+        min_idle: int = 1,
+        max_idle: int = 6,
+        idle_ttl: float = 60.0,
+        rate_half_life: float = 60.0,
+        headroom: float = 2.0,
+        interval: float = 1.0,
+    ) -> None:
+        self.agent_type = agent_type
+        self.min_idle = min_idle
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+        self.headroom = headroom
+        self.interval = interval
+        self._tau = rate_half_life / math.log(2)
+        self._rate = 0.0  # jobs per second, as of _rate_at
+        self._rate_at = time.monotonic()
+        self.spawn_seconds = 2.0  # until a spawn has been observed
+        self.target = min_idle
+        self._created_at: Dict[Any, float] = {}
+        self._ready_at: Dict[Any, float] = {}
+        self._surplus_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._server: Optional[AgentServer] = None
+        self._pool = None
+
+        # Pool counters
+        self.warm_starts = 0
+        self.cold_starts = 0
+        self.closed_idle = 0
+        self.idle_memory_bytes = 0
+
+    @classmethod
+    def from_env(cls, agent_type: str) -> "AdaptivePrespawner":
+        return cls(
+            agent_type,
+            min_idle=int(os.getenv("IDLE_PROCESSES_MIN", "1")),
+            max_idle=int(os.getenv("IDLE_PROCESSES_MAX", "6")),
+            idle_ttl=float(os.getenv("IDLE_PROCESS_TTL", "60")),
+            rate_half_life=float(os.getenv("JOB_RATE_HALF_LIFE", "60")),
+            headroom=float(os.getenv("PRESPAWN_HEADROOM", "2.0")),
+        )
+
+    def worker_options(self) -> Dict[str, Any]:
+        """WorkerOptions arguments; the pool never grows past max_idle"""
+        return {"num_idle_processes": self.max_idle}
+
+    def attach(self, server: AgentServer) -> None:
+        """Start managing the server's pool once the worker is running"""
+        server.on("worker_started", lambda: self._start(server))
+
+    def arrival_rate(self, now: Optional[float] = None) -> float:
+        """Decayed job arrival rate in jobs per second"""
+        now = time.monotonic() if now is None else now
+        return self._rate * math.exp(-(now - self._rate_at) / self._tau)
+
+    def desired_idle(self, now: Optional[float] = None) -> int:
+        """Warm processes needed to absorb arrivals during one spawn"""
+        expected = self.arrival_rate(now) * self.spawn_seconds * self.headroom
+        return max(self.min_idle, min(self.max_idle, math.ceil(expected)))
+
+    def record_arrival(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._rate = self.arrival_rate(now) + 1 / self._tau
+        self._rate_at = now
+
+    def record_spawn(self, seconds: float) -> None:
+        # Smoothed so one slow spawn (e.g. a cold page cache) does not dominate
+        self.spawn_seconds = 0.7 * self.spawn_seconds + 0.3 * seconds
+
+    def stats(self) -> Dict[str, Any]:
+        starts = self.warm_starts + self.cold_starts
+        return {
+            "target": self.target,
+            "arrival_rate_per_min": round(self.arrival_rate() * 60, 2),
+            "spawn_seconds": round(self.spawn_seconds, 2),
+            "warm_starts": self.warm_starts,
+            "cold_starts": self.cold_starts,
+            "cold_start_rate": round(self.cold_starts / starts, 3) if starts else 0.0,
+            "closed_idle": self.closed_idle,
+            "idle_memory_mb": round(self.idle_memory_bytes / (1024 * 1024), 1),
+        }
+
+    def _start(self, server: AgentServer) -> None:
+        self._server = server
+        self._pool = server._proc_pool
+        self._pool.on("process_created", self._on_created)
+        self._pool.on("process_ready", self._on_ready)
+        self._pool.on("process_job_launched", self._on_launched)
+        self._pool.on("process_closed", self._on_closed)
+        self._task = asyncio.create_task(self._run())
+
+    def _on_created(self, proc) -> None:
+        self._created_at[proc] = time.monotonic()
+
+    def _on_ready(self, proc) -> None:
+        self._ready_at[proc] = time.time()
+        created_at = self._created_at.pop(proc, None)
+        if created_at is not None:
+            self.record_spawn(time.monotonic() - created_at)
+
+    def _on_launched(self, proc) -> None:
+        self.record_arrival()
+        # Cold when the process only became ready after the job was accepted
+        ready_at = self._ready_at.pop(proc, 0.0)
+        accepted_at = proc.running_job.accepted_at if proc.running_job else 0.0
+        start = "cold" if accepted_at and ready_at > accepted_at else "warm"
+        if start == "cold":
+            self.cold_starts += 1
+            logger.info(f"Cold start: job waited {ready_at - accepted_at:.1f}s for a process ({self.stats()})")
+        else:
+            self.warm_starts += 1
+        JOB_STARTS.labels(agent_type=self.agent_type, start=start).inc()
+
+    def _on_closed(self, proc) -> None:
+        self._created_at.pop(proc, None)
+        self._ready_at.pop(proc, None)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self._resize()
+            except Exception as e:
+                logger.warning(f"Warm pool resize failed: {e}")
+
+    def _resize(self) -> None:
+        target = self.desired_idle()
+        if target != self.target:
+            logger.info(f"Warm pool target {self.target} -> {target} ({self.stats()})")
+            self.target = target
+        # The worker's load task reads this each tick and caps it by load
+        # headroom; lowering the pool's target here just shrinks it sooner
+        self._server._num_idle_processes = target
+        self._pool.set_target_idle_processes(min(target, self._pool.target_idle_processes))
+        IDLE_PROCESS_TARGET.labels(agent_type=self.agent_type).set(target)
+
+        idle = [proc for proc in self._pool.processes if proc in self._ready_at and proc.running_job is None]
+        self.idle_memory_bytes = sum(_rss(proc) for proc in idle)
+        IDLE_PROCESS_MEMORY_BYTES.labels(agent_type=self.agent_type).set(self.idle_memory_bytes)
+
+        # Let surplus processes idle out rather than closing them on a brief lull
+        queue = self._pool._warmed_proc_queue
+        if queue.qsize() <= target:
+            self._surplus_since = None
+            return
+        now = time.monotonic()
+        if self._surplus_since is None:
+            self._surplus_since = now
+        elif now - self._surplus_since >= self.idle_ttl:
+            proc = queue.get_nowait()
+            self._ready_at.pop(proc, None)
+            asyncio.create_task(proc.aclose())
+            self.closed_idle += 1
+            self._surplus_since = now
+            logger.info(f"Closed an idle process ({self.stats()})")
+
+
+def _rss(proc) -> int:
+    pid = getattr(proc, "pid", None)
+    if pid is None:
+        return 0
+    try:
+        return psutil.Process(pid).memory_info().rss
+    except psutil.Error:
+        return 0
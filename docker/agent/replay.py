@@ -0,0 +1,385 @@
+"""
+Faster-than-realtime replay of recorded audio.
+
+Re-processes egress recordings (or anything ffmpeg can read) through the
+transcription path without replaying rooms, e.g. to backfill transcripts
+after an outage. Run from docker/agent:
+
+    python transcription_agent.py replay recordings/<room>/<participant>/*.ogg
+    python transcription_agent.py replay call.wav --room ROOM --participant ID --stt local
+
+ffmpeg decodes each file in chunks to 16kHz mono PCM for Silero VAD. Every
+speech region goes to the STT backend's recognize(), and the text into a
+TranscriptPipeline, the same batched segment upload the live agent uses.
+Nothing paces the audio to the clock, so throughput is bounded by VAD and
+STT. Files are cut into shards of --shard-seconds, which a process pool
+replays in parallel. A speech region that crosses a shard boundary becomes
+two segments.
+
+Room, participant and recording start come from the egress layout
+recordings/<room>/<participant>/<start epoch ms>.<ext> unless given as
+options. Segments are stamped with the recording start plus their offset,
+and their ids derive from file and offset, so the API drops segments a
+previous replay of the same files already stored.
+
+STT backends are registered in STT_BACKENDS: "deepgram" (the live
+transcription settings) and "local", an offline stand-in that transcribes
+each speech region as its duration, for exercising and measuring the
+pipeline without network access.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from livekit import rtc
+from livekit.agents import stt, utils, vad
+from livekit.agents.types import NOT_GIVEN, APIConnectOptions, NotGivenOr
+
+from api_client import acquire_client, release_client
+from caption_stabilizer import CaptionStabilizer
+from transcript_pipeline import TranscriptPipeline, create_segment_uploader
+
+logger = logging.getLogger("dialogLens-replay")
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 0.5
+# Decoded audio may run this far ahead of VAD before decoding pauses
+MAX_AHEAD_SECONDS = 30.0
+# Appended to each shard so speech still open at its end is closed by VAD
+TRAILING_SILENCE_SECONDS = 2.0
+
+# Egress track recordings (src/lib/livekit/client.ts createS3Upload)
+_EGRESS_PATH = re.compile(r"recordings/([^/]+)/([^/]+)/(\d+)\.\w+$")
+
+STT_BACKENDS: Dict[str, Callable[[], stt.STT]] = {}
+
+
+def stt_backend(name: str):
+    def register(factory: Callable[[], stt.STT]) -> Callable[[], stt.STT]:
+        STT_BACKENDS[name] = factory
+        return factory
+    return register
+
+
+@stt_backend("deepgram")
+def _deepgram_stt() -> stt.STT:
+    from transcription_agent import create_stt
+
+    return create_stt()
+
+
+class LocalSTT(stt.STT):
+    """Offline stand-in that transcribes speech as its duration"""
+
+    def __init__(self) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=False, interim_results=False))
+
+    async def _recognize_impl(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions,
+    ) -> stt.SpeechEvent:
+        duration = rtc.combine_audio_frames(buffer).duration
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            alternatives=[stt.SpeechData(language="en", text=f"[speech {duration:.1f}s]", confidence=1.0)],
+        )
+
+
+@stt_backend("local")
+def _local_stt() -> stt.STT:
+    return LocalSTT()
+
+
+@dataclass
+class Shard:
+    path: str
+    room: str
+    participant_id: str
+    participant_name: str
+    started_at_ms: int  # recording start, 0 when unknown
+    offset: float  # seconds into the file
+    duration: Optional[float]  # None reads to the end of the file
+
+
+@dataclass
+class ShardResult:
+    path: str
+    offset: float
+    audio_seconds: float = 0.0
+    speech_seconds: float = 0.0
+    stt_seconds: float = 0.0
+    segments: int = 0
+    elapsed: float = 0.0
+
+
+def build_shards(
+    paths: List[str],
+    shard_seconds: float,
+    room: Optional[str] = None,
+    participant_id: Optional[str] = None,
+    participant_name: Optional[str] = None,
+    started_at_ms: Optional[int] = None,
+) -> List[Shard]:
+    """Cut recordings into shards, taking missing options from egress paths"""
+    shards = []
+    for path in paths:
+        match = _EGRESS_PATH.search(os.path.abspath(path).replace(os.sep, "/"))
+        file_room = room or (match.group(1) if match else None)
+        file_participant = participant_id or (match.group(2) if match else None)
+        if not file_room or not file_participant:
+            raise ValueError(f"{path}: not an egress recording path; pass --room and --participant")
+        if started_at_ms is not None:
+            file_started_at = started_at_ms
+        else:
+            file_started_at = int(match.group(3)) if match else 0
+
+        duration = probe_duration(path)
+        offsets = [0.0] if duration is None else [
+            n * shard_seconds for n in range(max(1, int(-(-duration // shard_seconds))))
+        ]
+        for offset in offsets:
+            shards.append(Shard(
+                path=path,
+                room=file_room,
+                participant_id=file_participant,
+                participant_name=participant_name or file_participant,
+                started_at_ms=file_started_at,
+                offset=offset,
+                duration=None if duration is None else min(shard_seconds, duration - offset),
+            ))
+    return shards
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Duration of a recording in seconds, None if the container does not say"""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+async def decode(shard: Shard):
+    """Yield a shard's audio as 16-bit mono PCM chunks of CHUNK_SECONDS"""
+    args = ["ffmpeg", "-nostdin", "-loglevel", "error", "-ss", f"{shard.offset:.3f}"]
+    if shard.duration is not None:
+        args += ["-t", f"{shard.duration:.3f}"]
+    args += ["-i", shard.path, "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"]
+
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    chunk_bytes = int(SAMPLE_RATE * CHUNK_SECONDS) * 2
+    try:
+        while True:
+            try:
+                yield await process.stdout.readexactly(chunk_bytes)
+            except asyncio.IncompleteReadError as e:
+                if len(e.partial) >= 2:
+                    yield e.partial[:len(e.partial) // 2 * 2]
+                break
+        stderr = await process.stderr.read()
+        if await process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed on {shard.path}: {stderr.decode().strip()}")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+async def replay_shard(
+    shard: Shard,
+    vad_model: vad.VAD,
+    recognizer: stt.STT,
+    api,
+    stt_concurrency: int = 4,
+) -> ShardResult:
+    """Transcribe one shard and upload its segments through a TranscriptPipeline"""
+    started = time.perf_counter()
+    result = ShardResult(shard.path, shard.offset)
+
+    # Block rather than spill: a replay can wait for the API, a live room cannot
+    pipeline = TranscriptPipeline(
+        create_segment_uploader(api, shard.room, overflow_policy="block"),
+        CaptionStabilizer(),
+    )
+    pipeline.start()
+
+    stream = vad_model.stream()
+    in_flight = asyncio.Semaphore(stt_concurrency)
+    progressed = asyncio.Event()
+    vad_position = 0.0
+    tasks: List[asyncio.Task] = []
+
+    async def transcribe(frames: List[rtc.AudioFrame], start: float) -> None:
+        try:
+            recognize_started = time.perf_counter()
+            event = await recognizer.recognize(frames)
+            result.stt_seconds += time.perf_counter() - recognize_started
+        finally:
+            in_flight.release()
+
+        if not event.alternatives:
+            return
+        speech = event.alternatives[0]
+        position = shard.offset + start
+        await pipeline.on_transcription(
+            shard.participant_id,
+            shard.participant_name,
+            speech.text,
+            True,
+            speech.confidence,
+            timestamp=shard.started_at_ms + int(position * 1000),
+            segment_id=uuid.uuid5(uuid.NAMESPACE_URL, f"{os.path.abspath(shard.path)}#{position:.3f}").hex,
+        )
+        result.segments += 1
+
+    async def consume() -> None:
+        nonlocal vad_position
+        async for event in stream:
+            vad_position = event.timestamp
+            progressed.set()
+            if event.type != vad.VADEventType.END_OF_SPEECH:
+                continue
+            result.speech_seconds += event.speech_duration
+            start = max(event.timestamp - event.silence_duration - event.speech_duration, 0.0)
+            # Waiting here stalls VAD progress, which pauses decoding (backpressure)
+            await in_flight.acquire()
+            tasks.append(asyncio.create_task(transcribe(event.frames, start)))
+
+    consumer = asyncio.create_task(consume())
+    try:
+        async for data in decode(shard):
+            stream.push_frame(rtc.AudioFrame(data, SAMPLE_RATE, 1, len(data) // 2))
+            result.audio_seconds += len(data) / 2 / SAMPLE_RATE
+            while result.audio_seconds - vad_position > MAX_AHEAD_SECONDS and not consumer.done():
+                progressed.clear()
+                await progressed.wait()
+
+        silence = bytes(int(SAMPLE_RATE * TRAILING_SILENCE_SECONDS) * 2)
+        stream.push_frame(rtc.AudioFrame(silence, SAMPLE_RATE, 1, len(silence) // 2))
+        stream.end_input()
+        await consumer
+        await asyncio.gather(*tasks)
+    finally:
+        consumer.cancel()
+        await stream.aclose()
+        await pipeline.close()
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+# Per worker process, set by _init_worker
+_vad: Optional[vad.VAD] = None
+_stt_name = "deepgram"
+
+
+def _init_worker(stt_name: str) -> None:
+    global _vad, _stt_name
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    # Plugins register on the main thread, which is where the initializer runs
+    from livekit.plugins import silero
+
+    _vad = silero.VAD.load()
+    _stt_name = stt_name
+
+
+def _run_shard(shard: Shard, stt_concurrency: int) -> ShardResult:
+    async def run() -> ShardResult:
+        # Plugins outside a job need their own HTTP session context
+        async with utils.http_context.open():
+            api = await acquire_client()
+            try:
+                return await replay_shard(shard, _vad, STT_BACKENDS[_stt_name](), api, stt_concurrency)
+            finally:
+                await release_client()
+
+    return asyncio.run(run())
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="transcription_agent.py replay",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("files", nargs="+", help="Recordings to transcribe")
+    parser.add_argument("--room", help="LiveKit room name (default: from the egress path)")
+    parser.add_argument("--participant", help="Participant identity (default: from the egress path)")
+    parser.add_argument("--participant-name", help="Display name (default: the identity)")
+    parser.add_argument("--started-at", type=int, help="Recording start, epoch ms (default: from the egress path, else 0)")
+    parser.add_argument("--stt", choices=sorted(STT_BACKENDS), default=os.getenv("REPLAY_STT", "deepgram"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--shard-seconds", type=float, default=300, help="Audio per shard")
+    parser.add_argument("--stt-concurrency", type=int, default=4, help="Recognize calls in flight per shard")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    shards = build_shards(
+        args.files,
+        args.shard_seconds,
+        room=args.room,
+        participant_id=args.participant,
+        participant_name=args.participant_name,
+        started_at_ms=args.started_at,
+    )
+    logger.info(f"Replaying {len(args.files)} files as {len(shards)} shards on {args.workers} processes ({args.stt} STT)")
+
+    results: List[ShardResult] = []
+    failed = 0
+    started = time.perf_counter()
+    # spawn: fresh interpreters, not forks of a process with ONNX and asyncio state
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.stt,),
+    ) as pool:
+        futures = {pool.submit(_run_shard, shard, args.stt_concurrency): shard for shard in shards}
+        for future in concurrent.futures.as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"Replay of {shard.path} at {shard.offset:.0f}s failed: {e}")
+                continue
+            results.append(result)
+            logger.info(
+                f"{result.path} at {result.offset:.0f}s: {result.audio_seconds:.0f}s of audio, "
+                f"{result.segments} segments, {result.audio_seconds / result.elapsed:.1f}x realtime"
+            )
+    elapsed = time.perf_counter() - started
+
+    audio = sum(result.audio_seconds for result in results)
+    busy = sum(result.elapsed for result in results)
+    print(
+        f"Replayed {audio / 60:.1f} min of audio ({sum(r.speech_seconds for r in results) / 60:.1f} min speech) "
+        f"into {sum(r.segments for r in results)} segments in {elapsed:.1f}s: "
+        f"{audio / elapsed:.1f}x realtime overall, {audio / busy if busy else 0:.1f}x per process, "
+        f"STT {sum(r.stt_seconds for r in results):.1f}s, {failed} of {len(shards)} shards failed"
+    )
+    return 1 if failed else 0
@@ -0,0 +1,117 @@
+"""
+Batched transcript segment uploads.
+
+Segments are buffered in a bounded queue and flushed to the segment transport
+(bulk ingest route or Redis Stream) when either the batch size or the flush
+interval is reached, so a busy room costs one request per batch instead of
+one per STT event. Adding a segment never waits on the network; a full queue
+is handled by the configured overflow policy.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from transport import SegmentTransport
+from upload_dispatcher import UploadQueue
+
+logger = logging.getLogger("dialogLens-segment-uploader")
+
+
+class SegmentUploader:
+    """Coalesces transcript segments for a room into bulk uploads"""
+
+    def __init__(
+        self,
+        transport: SegmentTransport,
+        room_name: str,
+        max_batch_size: int = 50,
+        flush_interval: float = 0.25,
+        max_queue_size: int = 1000,
+        overflow_policy: str = "spill",
+    ) -> None:
+        self.transport = transport
+        self.room_name = room_name
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self._queue = UploadQueue(max_queue_size, overflow_policy, spill=self._spill, name="segments")
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Upload counters
+        self.segments_sent = 0
+        self.segments_failed = 0
+        self.batches_sent = 0
+
+    def start(self) -> None:
+        """Start the background flush loop"""
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, segment: Dict[str, Any], interim: bool = False) -> None:
+        """Queue a segment for the next batch"""
+        await self._queue.put(segment, interim)
+
+    async def close(self) -> None:
+        """Upload whatever is still queued and stop the flush loop"""
+        self._closing = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        await self.transport.close()
+        logger.info(f"Segment uploader closed: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of upload and queue counters"""
+        return {
+            "segments_sent": self.segments_sent,
+            "segments_failed": self.segments_failed,
+            "batches_sent": self.batches_sent,
+            "queue": self._queue.stats(),
+            **self.transport.stats(),
+        }
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            entries = await self._collect()
+            if not entries:
+                continue
+
+            await self._flush([entry.item for entry in entries])
+            for entry in entries:
+                self._queue.record_sent(entry)
+
+    async def _collect(self) -> list:
+        """Collect segments until the batch is full or the interval passes"""
+        entries = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(entries) < self.max_batch_size:
+            if self._closing:
+                # Drain without waiting on shutdown
+                while len(entries) < self.max_batch_size and not self._queue.empty():
+                    entries.append(self._queue.get_nowait())
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            entry = await self._queue.get(timeout=remaining)
+            if entry is None:
+                break
+            entries.append(entry)
+
+        return entries
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        if await self.transport.send_segments(self.room_name, batch):
+            self.segments_sent += len(batch)
+            self.batches_sent += 1
+            logger.debug(f"Sent batch of {len(batch)} segments")
+        else:
+            self.segments_failed += len(batch)
+
+    async def _spill(self, segment: Dict[str, Any]) -> bool:
+        return await self.transport.spill_segments(self.room_name, [segment])
@@ -0,0 +1,227 @@
+"""
+Speculative LLM responses from interim transcripts.
+
+Normally the LLM starts only after the final transcript and the turn
+detector's end-of-turn decision. SpeculativeResponder starts it earlier: once
+an interim hypothesis has been stable for a short interval (or as soon as a
+final arrives), it opens an LLM stream for that text and buffers the chunks
+without speaking them. A changed hypothesis cancels and restarts the
+speculation. When the turn is committed, the buffered response is used only
+if the committed text matches what was speculated on; otherwise it is
+discarded and the agent falls back to a normal LLM call.
+"""
+import asyncio
+import collections
+import logging
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from livekit.agents import llm
+
+logger = logging.getLogger("dialogLens-speculative-llm")
+
+# build_context(user_text) -> chat context to send for that user turn
+ContextBuilder = Callable[[str], llm.ChatContext]
+
+SPECULATION_MODES = ("off", "telephony", "all")
+
+
+def normalize(text: str) -> str:
+    """Compare transcripts ignoring case, punctuation and spacing"""
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+class _Speculation:
+    __slots__ = ("text", "started_at", "first_chunk_at", "chunks", "done", "error", "updated", "task")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: Optional[float] = None
+        self.chunks: List[llm.ChatChunk] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.updated = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+def speculation_enabled(is_telephony: bool) -> bool:
+    """Whether SPECULATIVE_LLM turns speculation on for this room"""
+    mode = os.getenv("SPECULATIVE_LLM", "off")
+    if mode not in SPECULATION_MODES:
+        raise ValueError(f"Unknown SPECULATIVE_LLM mode: {mode}")
+    return mode == "all" or (mode == "telephony" and is_telephony)
+
+
+class SpeculativeResponder:
+    """Runs the LLM ahead of end-of-turn and hands the result to the committed turn"""
+
+    def __init__(
+        self,
+        model: llm.LLM,
+        build_context: ContextBuilder,
+        stable_interval: float = 0.3,
+        min_words: int = 3,
+    ) -> None:
+        self.model = model
+        self.build_context = build_context
+        self.stable_interval = stable_interval
+        self.min_words = min_words
+        self._finals: List[str] = []
+        self._current: Optional[_Speculation] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._saved: Deque[float] = collections.deque(maxlen=1024)
+
+        # Speculation counters
+        self.started = 0
+        self.restarts = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, model: llm.LLM, build_context: ContextBuilder) -> "SpeculativeResponder":
+        return cls(
+            model,
+            build_context,
+            stable_interval=float(os.getenv("SPECULATION_STABLE_MS", "300")) / 1000,
+            min_words=int(os.getenv("SPECULATION_MIN_WORDS", "3")),
+        )
+
+    def on_transcript(self, text: str, is_final: bool) -> None:
+        """Feed an STT result for the user's current turn"""
+        if not text.strip():
+            return
+        if is_final:
+            self._finals.append(text.strip())
+            candidate = " ".join(self._finals)
+        else:
+            candidate = " ".join(self._finals + [text.strip()])
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._current is not None and normalize(self._current.text) == normalize(candidate):
+            return
+        if len(normalize(candidate).split()) < self.min_words:
+            return
+
+        if is_final:
+            # Finals are stable; start now, ahead of the end-of-turn delay
+            self._start(candidate)
+        else:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.stable_interval, self._start, candidate
+            )
+
+    def take(self, user_text: str) -> Optional[AsyncIterator[llm.ChatChunk]]:
+        """Claim the speculative response for a committed turn, if it matches"""
+        committed_at = time.perf_counter()
+        speculation = self._current
+        self._reset_turn()
+        if speculation is None:
+            return None
+
+        if speculation.error is not None or normalize(speculation.text) != normalize(user_text):
+            self.misses += 1
+            logger.debug(f"Speculation missed: {speculation.text!r} != {user_text!r}")
+            self._cancel(speculation)
+            return None
+
+        self.hits += 1
+        return self._replay(speculation, committed_at)
+
+    def discard(self) -> None:
+        """Drop any speculation for the current turn (answered another way)"""
+        speculation = self._current
+        self._reset_turn()
+        if speculation is not None:
+            self._cancel(speculation)
+
+    def close(self) -> None:
+        self.discard()
+        logger.info(f"Speculative responder closed: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        committed = self.hits + self.misses
+        saved = sorted(self._saved)
+        return {
+            "started": self.started,
+            "restarts": self.restarts,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / committed, 3) if committed else 0.0,
+            "saved_p50_ms": round(saved[len(saved) // 2] * 1000, 1) if saved else 0.0,
+            "saved_avg_ms": round(sum(saved) / len(saved) * 1000, 1) if saved else 0.0,
+        }
+
+    def _start(self, text: str) -> None:
+        self._timer = None
+        if self._current is not None:
+            self.restarts += 1
+            self._cancel(self._current)
+
+        speculation = _Speculation(text)
+        speculation.task = asyncio.create_task(self._generate(speculation))
+        self._current = speculation
+        self.started += 1
+
+    async def _generate(self, speculation: _Speculation) -> None:
+        try:
+            chat_ctx = self.build_context(speculation.text)
+            async with self.model.chat(chat_ctx=chat_ctx) as stream:
+                async for chunk in stream:
+                    if speculation.first_chunk_at is None:
+                        speculation.first_chunk_at = time.perf_counter()
+                    speculation.chunks.append(chunk)
+                    speculation.updated.set()
+        except Exception as e:
+            # Reported to the turn that claims this speculation, if any
+            speculation.error = e
+            logger.debug(f"Speculative generation failed: {e}")
+        finally:
+            speculation.done = True
+            speculation.updated.set()
+
+    async def _replay(self, speculation: _Speculation, committed_at: float) -> AsyncIterator[llm.ChatChunk]:
+        index = 0
+        try:
+            while True:
+                while index < len(speculation.chunks):
+                    if index == 0:
+                        self._record_saved(speculation, committed_at)
+                    yield speculation.chunks[index]
+                    index += 1
+                if speculation.done:
+                    break
+                speculation.updated.clear()
+                await speculation.updated.wait()
+
+            # Surface a failed speculation so the caller can fall back
+            if speculation.error is not None:
+                raise speculation.error
+        finally:
+            if not speculation.done:
+                self._cancel(speculation)
+
+    def _record_saved(self, speculation: _Speculation, committed_at: float) -> None:
+        # A normal call would have started at commit; the first token is
+        # earlier by however long the speculation had been running, capped at
+        # its time to first token
+        ttft = speculation.first_chunk_at - speculation.started_at
+        saved = min(ttft, committed_at - speculation.started_at)
+        self._saved.append(saved)
+        logger.info(f"Speculation hit saved {saved * 1000:.0f}ms")
+
+    def _reset_turn(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._finals = []
+        self._current = None
+
+    @staticmethod
+    def _cancel(speculation: _Speculation) -> None:
+        if speculation.task is not None and not speculation.task.done():
+            speculation.task.cancel()
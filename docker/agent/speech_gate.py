@@ -0,0 +1,133 @@
+"""
+VAD-gated audio forwarding to STT.
+
+The transcription session streams every participant's audio to Deepgram,
+silence included. In large meetings most participants are silent most of
+the time, and that silence still costs bandwidth, STT minutes and socket
+CPU. With STT_VAD_GATE=true the SpeechGate sits between the session's audio
+input and its STT stream. It forwards frames while the session's own Silero
+VAD reports the participant speaking, plus a hangover after speech ends, and
+holds them back otherwise. VAD runs on its own copy of the audio, so it
+keeps listening while the gate is closed.
+
+The last STT_GATE_PRE_ROLL_MS of held-back audio is kept and sent ahead of
+the first speech frame, which covers the VAD's detection delay so word
+onsets are not clipped. Deepgram's stream stays open through gaps on its
+keepalive messages. Forwarded and suppressed seconds are counted per
+participant and exported by agent type.
+"""
+import collections
+import logging
+import os
+from typing import AsyncIterable, AsyncIterator, Deque, Dict, Optional
+
+from livekit import rtc
+
+from voice_metrics import STT_AUDIO_SECONDS
+
+logger = logging.getLogger("dialogLens-speech-gate")
+
+
+class SpeechGate:
+    """Forwards a participant's audio to STT only around speech"""
+
+    def __init__(self, agent_type: str, pre_roll: float = 0.5, hangover: float = 1.0) -> None:
+        self.agent_type = agent_type
+        self.pre_roll = pre_roll
+        self.hangover = hangover
+        self.participant: Optional[str] = None
+        self._speaking = False
+        # Audio clock (seconds of input seen); the gate closes at _closes_at
+        self._position = 0.0
+        self._closes_at = 0.0
+        self._buffer: Deque[rtc.AudioFrame] = collections.deque()
+        self._buffered = 0.0
+        # Labelled once; the gate counts every frame
+        self._forwarded_metric = STT_AUDIO_SECONDS.labels(agent_type=agent_type, state="forwarded")
+        self._suppressed_metric = STT_AUDIO_SECONDS.labels(agent_type=agent_type, state="suppressed")
+
+        # Gate counters
+        self.forwarded_seconds = 0.0
+        self.suppressed_seconds = 0.0
+        self.openings = 0
+
+    @classmethod
+    def from_env(cls, agent_type: str) -> Optional["SpeechGate"]:
+        """The gate if STT_VAD_GATE is enabled, else None"""
+        if os.getenv("STT_VAD_GATE", "false") != "true":
+            return None
+        return cls(
+            agent_type,
+            pre_roll=float(os.getenv("STT_GATE_PRE_ROLL_MS", "500")) / 1000,
+            hangover=float(os.getenv("STT_GATE_HANGOVER_MS", "1000")) / 1000,
+        )
+
+    @property
+    def is_open(self) -> bool:
+        return self._speaking or self._position < self._closes_at
+
+    def set_speaking(self, speaking: bool) -> None:
+        """Follow the VAD: open on speech, close once the hangover has passed"""
+        if speaking and not self.is_open:
+            self.openings += 1
+        if not speaking and self._speaking:
+            self._closes_at = self._position + self.hangover
+        self._speaking = speaking
+
+    async def filter(self, audio: AsyncIterable[rtc.AudioFrame]) -> AsyncIterator[rtc.AudioFrame]:
+        """Yield the frames STT should receive"""
+        async for frame in audio:
+            duration = frame.samples_per_channel / frame.sample_rate
+            self._position += duration
+
+            if not self.is_open:
+                self._hold(frame, duration)
+                continue
+
+            # Pre-roll first, so STT hears the start of the word the VAD caught late
+            while self._buffer:
+                held = self._buffer.popleft()
+                self._forward(held.samples_per_channel / held.sample_rate)
+                yield held
+            self._buffered = 0.0
+
+            self._forward(duration)
+            yield frame
+
+        # Held audio never sent before the input ended
+        if self._buffered:
+            self._suppress(self._buffered)
+            self._buffer.clear()
+            self._buffered = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        total = self.forwarded_seconds + self.suppressed_seconds
+        return {
+            "forwarded_seconds": round(self.forwarded_seconds, 1),
+            "suppressed_seconds": round(self.suppressed_seconds, 1),
+            "suppressed_ratio": round(self.suppressed_seconds / total, 3) if total else 0.0,
+            "openings": self.openings,
+        }
+
+    def log_stats(self) -> None:
+        logger.info(f"Speech gate for {self.participant or 'unlinked participant'}: {self.stats()}")
+
+    def _hold(self, frame: rtc.AudioFrame, duration: float) -> None:
+        self._buffer.append(frame)
+        self._buffered += duration
+        # Keep only the newest pre_roll seconds; older audio is dropped for good
+        while self._buffer:
+            oldest = self._buffer[0].samples_per_channel / self._buffer[0].sample_rate
+            if self._buffered - oldest < self.pre_roll:
+                break
+            self._buffer.popleft()
+            self._buffered -= oldest
+            self._suppress(oldest)
+
+    def _forward(self, seconds: float) -> None:
+        self.forwarded_seconds += seconds
+        self._forwarded_metric.inc(seconds)
+
+    def _suppress(self, seconds: float) -> None:
+        self.suppressed_seconds += seconds
+        self._suppressed_metric.inc(seconds)
@@ -149,6 +149,35 @@ async def test_backend_api():
         return False
 
 
+async def test_segment_transport():
+    """Test the Redis Streams segment transport when it is enabled"""
+    if os.getenv("UPLOAD_TRANSPORT", "http") != "redis":
+        logger.info("Segment transport: HTTP (set UPLOAD_TRANSPORT=redis to test Redis Streams)")
+        return True
+    
+    import redis.asyncio as redis
+    
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+    stream = os.getenv("SEGMENT_STREAM", "dialoglens:transcript-segments")
+    probe = f"{stream}:healthcheck"
+    
+    client = redis.from_url(redis_url)
+    try:
+        # Pipelined XADD round-trip on a scratch stream
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.xadd(probe, {"data": "{}"})
+            pipe.xlen(probe)
+            pipe.delete(probe)
+            _, length, _ = await pipe.execute()
+        logger.info(f"Redis Streams transport: Connected to {redis_url} (probe length {length})")
+        return True
+    except Exception as e:
+        logger.error(f"Redis Streams transport failed: {e}")
+        return False
+    finally:
+        await client.aclose()
+
+
 async def main():
     """Run all tests"""
     logger.info("=== DialogLens Agent Test Suite ===")
@@ -158,6 +187,7 @@ async def main():
         ("Model Downloads", test_model_downloads()),
         ("API Providers", test_api_providers()),
         ("Backend API", test_backend_api()),
+        ("Segment Transport", test_segment_transport()),
     ]
     
     results = []
@@ -0,0 +1,182 @@
+"""
+Transcript persistence path shared by the transcription agent and the
+combined agent.
+
+Each pipeline owns a room's caption stabilizer and segment uploader. The
+dedicated transcription agent feeds it from one STT session per participant; in combined
+mode the conversation agent feeds it from the STT stream that already drives
+the LLM, so a room with both features runs a single audio ingest,
+VAD and Deepgram stream per participant. Combined mode is limited to
+single-participant rooms, since the conversation session hears only the
+participant it is linked to. The replay CLI (replay.py) feeds it
+from recorded audio.
+
+Segment and interaction timestamps are Unix epoch milliseconds (epoch_ms()),
+the clock replay stamps recordings with and the API stores as dates.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional, Set
+
+from livekit import agents
+
+from api_client import APIClient
+from caption_stabilizer import CaptionStabilizer
+from segment_uploader import SegmentUploader
+from transport import create_transport
+
+logger = logging.getLogger("dialogLens-transcript-pipeline")
+
+# One human and the agent: the most a single conversation session can transcribe
+COMBINED_MAX_PARTICIPANTS = 2
+
+
+def epoch_ms() -> int:
+    """Wall clock time in Unix epoch milliseconds"""
+    return int(time.time() * 1000)
+
+
+def combined_transcription_enabled() -> bool:
+    """Whether rooms needing an agent are transcribed by that agent's session"""
+    return os.getenv("COMBINED_TRANSCRIPTION", "false") == "true"
+
+
+def transcription_owner(metadata: Dict[str, Any]) -> Optional[str]:
+    """
+    The one agent role that transcribes a room, or None if it is not transcribed.
+
+    Keyed on the flags room.service.ts sets. In combined mode a customer
+    room is transcribed by the customer-service agent and any other room by
+    the assistant (main.py), which joins every room; otherwise always by the
+    transcription agent. A conversation session only hears the participant
+    it is linked to, so combined mode applies to single-participant rooms
+    (maxParticipants of COMBINED_MAX_PARTICIPANTS or fewer, counting the
+    agent); larger rooms stay with the transcription agent, which runs a
+    session per participant.
+    """
+    if not metadata.get("requiresTranscription", True):
+        return None
+    if not combined_transcription_enabled():
+        return "transcription"
+    if metadata.get("maxParticipants", 100) > COMBINED_MAX_PARTICIPANTS:
+        return "transcription"
+    if metadata.get("requiresCustomerAgent", False):
+        return "customer-service"
+    return "assistant"
+
+
+class TranscriptPipeline:
+    """Turns STT results into live captions and persisted segments for a room"""
+
+    def __init__(self, uploader: SegmentUploader, stabilizer: CaptionStabilizer) -> None:
+        self.uploader = uploader
+        self.stabilizer = stabilizer
+        self._pending: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        self.uploader.start()
+
+    def attach_session(self, session: agents.AgentSession) -> None:
+        """Feed a conversation session's STT results into this pipeline"""
+
+        @session.on("user_input_transcribed")
+        def on_user_transcribed(event):
+            participant = session.room_io.linked_participant
+            if participant is None:
+                return
+            task = asyncio.create_task(self.on_transcription(
+                participant.identity,
+                participant.name or participant.identity,
+                event.transcript,
+                event.is_final,
+            ))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def on_transcription(
+        self,
+        participant_id: str,
+        participant_name: str,
+        text: str,
+        is_final: bool,
+        confidence: Optional[float] = None,
+        timestamp: Optional[int] = None,
+        segment_id: Optional[str] = None,
+    ) -> None:
+        """
+        Publish a caption and queue final text for upload.
+
+        Live segments are stamped with the current time and a random id;
+        replayed ones pass their position in the recording and a stable id.
+        """
+        if not text.strip():
+            return
+
+        # Interim hypotheses only feed the live caption stream
+        if not await self.stabilizer.update(participant_id, text, is_final):
+            return
+
+        segment_data: Dict[str, Any] = {
+            "segmentId": segment_id or uuid.uuid4().hex,  # Idempotency key for replays
+            "participantId": participant_id,
+            "participantName": participant_name,
+            "text": text,
+            "isFinal": is_final,
+            "timestamp": epoch_ms() if timestamp is None else timestamp,
+        }
+        if confidence is not None:
+            segment_data["confidence"] = confidence
+
+        # Batched and sent in the background; never waits on the API
+        await self.uploader.add(segment_data)
+
+    def remove_participant(self, participant_id: str) -> None:
+        self.stabilizer.remove(participant_id)
+
+    async def close(self) -> None:
+        """Flush captions and queued segments"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        self.stabilizer.close()
+        await self.uploader.close()
+
+
+def create_segment_uploader(
+    api: APIClient, room_name: str, overflow_policy: Optional[str] = None
+) -> SegmentUploader:
+    """Batch a room's segments over the configured transport (HTTP or Redis Streams)"""
+    return SegmentUploader(
+        create_transport(api),
+        room_name,
+        max_batch_size=int(os.getenv("SEGMENT_BATCH_SIZE", "50")),
+        flush_interval=float(os.getenv("SEGMENT_FLUSH_MS", "250")) / 1000,
+        max_queue_size=int(os.getenv("SEGMENT_QUEUE_SIZE", "1000")),
+        overflow_policy=overflow_policy or os.getenv("UPLOAD_OVERFLOW_POLICY", "spill"),
+    )
+
+
+def create_transcript_pipeline(ctx: agents.JobContext, api: APIClient) -> TranscriptPipeline:
+    """Build a room's transcript pipeline from the environment"""
+    uploader = create_segment_uploader(api, ctx.room.name)
+
+    # Forward throttled interim text as live captions over the data channel
+    async def publish_caption(participant_id: str, text: str, is_final: bool) -> int:
+        payload = json.dumps({
+            "participantId": participant_id,
+            "text": text,
+            "isFinal": is_final,
+        }).encode()
+        await ctx.room.local_participant.publish_data(
+            payload, reliable=is_final, topic="live-captions"
+        )
+        return len(payload)
+
+    stabilizer = CaptionStabilizer(
+        publish=publish_caption if os.getenv("LIVE_CAPTIONS", "true") == "true" else None,
+        min_interval=float(os.getenv("INTERIM_CAPTION_INTERVAL_MS", "200")) / 1000,
+    )
+    return TranscriptPipeline(uploader, stabilizer)
@@ -1,160 +1,235 @@
 import asyncio
+import functools
 import logging
-import os
-from typing import Optional
+from typing import Dict, Optional, Set
 import json
 
 from dotenv import load_dotenv
 from livekit import agents, rtc
-from livekit.agents import AgentSession, Agent, RoomInputOptions
-from livekit.plugins import (
-    deepgram,
-    silero,
-    noise_cancellation,
+from livekit.agents import AgentSession, Agent, RoomInputOptions, RoomOutputOptions
+
+from admission import AdmissionController, report_job_load
+from api_client import acquire_client, release_client
+from health import HealthServer
+from models import executor_options, install_batching, load_turn_detector, load_vad, prewarm
+from plugins import load_plugins, print_import_profile
+from speech_gate import SpeechGate
+from transcript_pipeline import (
+    TranscriptPipeline,
+    create_transcript_pipeline,
+    transcription_owner,
 )
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
-import aiohttp
+from voice_metrics import STT_STREAMS, prometheus_options
 
 load_dotenv()
 
 logger = logging.getLogger("dialogLens-transcription-agent")
 
+# Consulted in the worker process before a room is accepted
+admission = AdmissionController.from_env("transcription")
+
 
 class TranscriptionAgent(Agent):
-    """Agent that transcribes conversations and sends them to the API"""
+    """Agent that transcribes one participant's audio for the room's pipeline"""
     
-    def __init__(self, api_url: str, api_key: str, room_name: str) -> None:
+    def __init__(self, speech_gate: Optional[SpeechGate] = None) -> None:
         super().__init__(instructions="You are a transcription agent.")
-        self.api_url = api_url
-        self.api_key = api_key
-        self.room_name = room_name
-        self.participants = {}
+        self.speech_gate = speech_gate
         
-    async def on_participant_connected(self, participant: rtc.RemoteParticipant):
+    async def stt_node(self, audio, model_settings):
+        """Stream audio to STT, holding back silence when the speech gate is on"""
+        if self.speech_gate is not None:
+            audio = self.speech_gate.filter(audio)
+        async for event in Agent.default.stt_node(self, audio, model_settings):
+            yield event
+
+
+class RoomTranscriber:
+    """
+    One STT session per remote participant, all feeding the room's pipeline.
+
+    An AgentSession listens to a single linked participant, so a room-wide
+    session would transcribe whoever joined first and drop everyone else.
+    Each participant gets a session pinned to their identity instead, started
+    when they join and closed when they leave.
+    """
+    
+    def __init__(self, ctx: agents.JobContext, pipeline: TranscriptPipeline) -> None:
+        self.ctx = ctx
+        self.pipeline = pipeline
+        self.sessions: Dict[str, AgentSession] = {}
+        self.speech_gates: Dict[str, SpeechGate] = {}
+        self._streams = STT_STREAMS.labels(agent_type="transcription")
+        self._tasks: Set[asyncio.Task] = set()
+        
+    def on_participant_connected(self, participant: rtc.RemoteParticipant):
         """Handle when a participant joins"""
         logger.info(f"Participant {participant.identity} connected")
-        self.participants[participant.sid] = participant
+        self._spawn(self.start_session(participant))
         
-    async def on_participant_disconnected(self, participant: rtc.RemoteParticipant):
+    def on_participant_disconnected(self, participant: rtc.RemoteParticipant):
         """Handle when a participant leaves"""
         logger.info(f"Participant {participant.identity} disconnected")
-        self.participants.pop(participant.sid, None)
+        self.pipeline.remove_participant(participant.identity)
+        self._spawn(self.close_session(participant.identity))
         
-    async def on_transcription(self, participant_id: str, text: str, is_final: bool, confidence: float):
-        """Process transcription and send to API"""
-        if not text.strip():
-            return
-            
-        participant = self.participants.get(participant_id)
-        if not participant:
+    async def start_session(self, participant: rtc.RemoteParticipant) -> None:
+        """Start transcribing a participant, unless a session already does"""
+        if participant.identity in self.sessions:
             return
-            
-        segment_data = {
-            "roomId": self.room_name,
-            "participantId": participant.identity,
-            "participantName": participant.name or participant.identity,
-            "text": text,
-            "isFinal": is_final,
-            "confidence": confidence,
-            "timestamp": int(asyncio.get_event_loop().time() * 1000),
-        }
         
-        # Send to API
+        # Already loaded for this role by the worker or prewarm (plugins.py)
+        from livekit.plugins import noise_cancellation
+        
+        # Create session with STT only (no LLM or TTS needed for transcription)
+        session = AgentSession(
+            stt=create_stt(),
+            # VAD is loaded once per process by prewarm, not per room join
+            vad=load_vad(self.ctx.proc),
+            turn_detection=load_turn_detector(),
+        )
+        self.sessions[participant.identity] = session
+        self._streams.inc()
+        
+        # Forward the session's transcripts to captions and segment uploads
+        self.pipeline.attach_session(session)
+        
+        # Opt-in: only audio around speech is streamed to Deepgram (STT_VAD_GATE)
+        speech_gate = SpeechGate.from_env("transcription")
+        if speech_gate is not None:
+            speech_gate.participant = participant.identity
+            self.speech_gates[participant.identity] = speech_gate
+            # The session's VAD keeps running on the full audio and drives the gate
+            session.on("user_state_changed", lambda event: speech_gate.set_speaking(event.new_state == "speaking"))
+        
+        agent = TranscriptionAgent(speech_gate)
+        # Transcription only: no audio track is published back to the room
+        output_options = RoomOutputOptions(transcription_enabled=True, audio_enabled=False)
+        
+        # Start the session with noise cancellation if using LiveKit Cloud
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}",
-                }
-                async with session.post(
-                    f"{self.api_url}/transcripts/segment",
-                    json=segment_data,
-                    headers=headers,
-                ) as response:
-                    if response.status != 200:
-                        logger.error(
-                            f"Failed to send segment: {response.status} - {await response.text()}"
-                        )
-                    else:
-                        logger.debug(f"Sent segment: {text[:50]}...")
+            await session.start(
+                room=self.ctx.room,
+                agent=agent,
+                room_input_options=RoomInputOptions(
+                    participant_identity=participant.identity,
+                    noise_cancellation=noise_cancellation.BVC(),
+                ),
+                room_output_options=output_options,
+            )
         except Exception as e:
-            logger.error(f"Error sending segment to API: {e}")
+            logger.warning(f"Starting without noise cancellation for {participant.identity}: {e}")
+            await session.start(
+                room=self.ctx.room,
+                agent=agent,
+                room_input_options=RoomInputOptions(participant_identity=participant.identity),
+                room_output_options=output_options,
+            )
+        
+    async def close_session(self, identity: str) -> None:
+        """Stop transcribing a participant who left"""
+        session = self.sessions.pop(identity, None)
+        if session is None:
+            return
+        self._streams.dec()
+        speech_gate = self.speech_gates.pop(identity, None)
+        if speech_gate is not None:
+            speech_gate.log_stats()
+        try:
+            await session.aclose()
+        except Exception as e:
+            logger.warning(f"Closing the session for {identity} failed: {e}")
+        
+    async def close(self) -> None:
+        """Close every participant's session"""
+        for task in list(self._tasks):
+            task.cancel()
+        for identity in list(self.sessions):
+            await self.close_session(identity)
+        
+    def _spawn(self, coro) -> None:
+        # Room callbacks are synchronous; keep a reference until the task is done
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Transcription session task failed: {task.exception()}")
+
+
+def create_stt():
+    """Deepgram STT for transcription, shared by live rooms and replay.py"""
+    from livekit.plugins import deepgram
+    
+    return deepgram.STT(
+        model="nova-2",
+        language="en",
+        punctuate=True,
+        profanity_filter=False,
+        enable_diarization=True,
+        smart_format=True,
+    )
 
 
 async def entrypoint(ctx: agents.JobContext):
     """Main entry point for the transcription agent"""
     logger.info(f"Transcription agent connecting to room {ctx.room.name}")
     
-    # Get configuration
-    api_url = os.getenv("API_URL", "http://localhost:3000/api")
-    api_key = os.getenv("API_KEY", "")
-    
-    # Create the transcription agent
-    agent = TranscriptionAgent(api_url, api_key, ctx.room.name)
-    
-    # Create session with STT only (no LLM or TTS needed for transcription)
-    session = AgentSession(
-        stt=deepgram.STT(
-            model="nova-2",
-            language="en",
-            punctuate=True,
-            profanity_filter=False,
-            diarize=True,
-            smart_format=True,
-        ),
-        vad=silero.VAD.load(),
-        turn_detection=MultilingualModel(),
-    )
+    # STT streams are counted per participant session; loop lag feeds the worker's load function
+    report_job_load(ctx, "transcription", stt_streams=0)
+    
+    # Captions and batched segment uploads over the configured transport
+    api = await acquire_client()
+    pipeline = create_transcript_pipeline(ctx, api)
+    pipeline.start()
+    
+    transcriber = RoomTranscriber(ctx, pipeline)
+    
+    async def shutdown():
+        # Stop the STT sessions, then flush queued segments before the client is released
+        await transcriber.close()
+        await pipeline.close()
+        await release_client()
+    
+    ctx.add_shutdown_callback(shutdown)
     
     # Connect to room
     await ctx.connect()
     
-    # Set up participant event handlers
-    ctx.room.on("participant_connected", agent.on_participant_connected)
-    ctx.room.on("participant_disconnected", agent.on_participant_disconnected)
+    # Set up participant event handlers (room callbacks must be synchronous)
+    ctx.room.on("participant_connected", transcriber.on_participant_connected)
+    ctx.room.on("participant_disconnected", transcriber.on_participant_disconnected)
     
-    # Add existing participants
+    # Transcribe participants already in the room
     for participant in ctx.room.remote_participants.values():
-        await agent.on_participant_connected(participant)
-    
-    # Start the session with noise cancellation if using LiveKit Cloud
-    try:
-        await session.start(
-            room=ctx.room,
-            agent=agent,
-            room_input_options=RoomInputOptions(
-                noise_cancellation=noise_cancellation.BVC(),
-            ),
-        )
-    except Exception as e:
-        logger.warning(f"Starting without noise cancellation: {e}")
-        await session.start(
-            room=ctx.room,
-            agent=agent,
-        )
-    
-    # Set up transcription forwarding
-    @session.on("stt_transcription")
-    async def on_transcription(event):
-        """Handle STT transcription events"""
-        await agent.on_transcription(
-            participant_id=event.participant_sid,
-            text=event.text,
-            is_final=event.is_final,
-            confidence=event.confidence,
-        )
+        transcriber.on_participant_connected(participant)
     
     logger.info("Transcription agent started successfully")
 
 
+async def request_handler(request: agents.JobRequest) -> None:
+    """Accept rooms only while this worker has capacity"""
+    if admission.admit(request.room.name):
+        await request.accept()
+    else:
+        # Not terminal, so LiveKit offers the room to another worker
+        await request.reject(terminate=False)
+
+
 async def request_fn(ctx: agents.JobContext):
     """Function called when agent is requested for a room"""
     # Check room metadata to determine if this agent should handle the room
     metadata = json.loads(ctx.room.metadata or "{}")
     
-    if metadata.get("requiresTranscription", True):  # Default to True
+    owner = transcription_owner(metadata)
+    if owner == "transcription":
         logger.info(f"Accepting transcription job for room {ctx.room.name}")
         await entrypoint(ctx)
+    elif owner is not None:
+        # The combined agent transcribes from its own STT stream
+        logger.info(f"Room {ctx.room.name} is transcribed by the {owner} agent")
     else:
         logger.info(f"Room {ctx.room.name} does not require transcription")
 
@@ -166,10 +241,38 @@ if __name__ == "__main__":
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
     
+    # Report what importing this agent and its plugins costs a new process
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "profile-imports":
+        print_import_profile("transcription_agent", "transcription")
+        sys.exit(0)
+    
+    # Transcribe recorded audio faster than realtime (backfills after outages)
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        import replay
+        sys.exit(replay.main(sys.argv[2:]))
+    
+    # Only this role's plugins, so the forkserver preloads exactly these
+    load_plugins("transcription")
+    
+    # Opt-in: batch VAD and turn detection across sessions (INFERENCE_BATCHING)
+    install_batching()
+    
     # Run the agent
-    agents.cli.run_app(
+    server = agents.AgentServer.from_server_options(
         agents.WorkerOptions(
             entrypoint_fnc=request_fn,
+            request_fnc=request_handler,
+            prewarm_fnc=functools.partial(prewarm, role="transcription"),
+            **admission.worker_options(),
+            **executor_options(),
+            **prometheus_options(),
             worker_type="transcription",
         )
-    )
\ No newline at end of file
+    )
+    
+    # Liveness and readiness for orchestration (HEALTH_PORT)
+    health = HealthServer.from_env("transcription", admission)
+    if health is not None:
+        health.attach(server)
+    agents.cli.run_app(server)
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Pluggable transports for transcript segment ingestion.
+
+The HTTP transport posts batches to the Next.js bulk ingest route. The Redis
+transport appends segments to a Redis Stream with pipelined XADDs, consumed
+by the SegmentStreamProcessor on the Node side, which takes the Next.js
+request path off the real-time hot path. Select one with UPLOAD_TRANSPORT.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Union
+
+import redis.asyncio as redis
+
+from api_client import APIClient
+
+logger = logging.getLogger("dialogLens-transport")
+
+
+class HTTPTransport:
+    """Sends segment batches to the bulk ingest API route"""
+
+    name = "http"
+
+    def __init__(self, api: APIClient) -> None:
+        self.api = api
+
+    async def send_segments(self, room_name: str, segments: List[Dict[str, Any]]) -> bool:
+        # Failed batches are spooled by the client and replayed later
+        return await self.api.send(
+            "/transcripts/segment/batch",
+            {"roomId": room_name, "segments": segments},
+        )
+
+    async def spill_segments(self, room_name: str, segments: List[Dict[str, Any]]) -> bool:
+        """Write segments straight to the upload spool for later replay"""
+        if self.api.spool is None:
+            return False
+        await self.api.spool.append(
+            "/transcripts/segment/batch",
+            {"roomId": room_name, "segments": segments},
+        )
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"transport": self.name}
+
+
+class RedisStreamTransport:
+    """Appends segments to a Redis Stream, falling back to HTTP on errors"""
+
+    name = "redis"
+
+    def __init__(
+        self,
+        redis_url: str,
+        fallback: HTTPTransport,
+        stream: str = "dialoglens:transcript-segments",
+        maxlen: int = 100000,
+    ) -> None:
+        self.stream = stream
+        self.maxlen = maxlen
+        self.fallback = fallback
+        self._redis = redis.from_url(redis_url)
+
+        # Transport counters
+        self.entries_added = 0
+        self.pipelines_sent = 0
+        self.fallbacks = 0
+
+    async def send_segments(self, room_name: str, segments: List[Dict[str, Any]]) -> bool:
+        try:
+            # One round-trip per batch
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for segment in segments:
+                    pipe.xadd(
+                        self.stream,
+                        {"data": json.dumps({"roomId": room_name, **segment})},
+                        maxlen=self.maxlen,
+                        approximate=True,
+                    )
+                await pipe.execute()
+        except Exception as e:
+            self.fallbacks += 1
+            logger.warning(f"Redis stream unavailable, sending batch over HTTP: {e}")
+            return await self.fallback.send_segments(room_name, segments)
+
+        self.entries_added += len(segments)
+        self.pipelines_sent += 1
+        return True
+
+    async def spill_segments(self, room_name: str, segments: List[Dict[str, Any]]) -> bool:
+        return await self.fallback.spill_segments(room_name, segments)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "transport": self.name,
+            "entries_added": self.entries_added,
+            "pipelines_sent": self.pipelines_sent,
+            "fallbacks": self.fallbacks,
+        }
+
+
+SegmentTransport = Union[HTTPTransport, RedisStreamTransport]
+
+
+def create_transport(api: APIClient) -> SegmentTransport:
+    """Build the segment transport selected by UPLOAD_TRANSPORT"""
+    http = HTTPTransport(api)
+    if os.getenv("UPLOAD_TRANSPORT", "http") != "redis":
+        return http
+
+    return RedisStreamTransport(
+        redis_url=os.getenv("REDIS_URL", "redis://localhost:6379"),
+        fallback=http,
+        stream=os.getenv("SEGMENT_STREAM", "dialoglens:transcript-segments"),
+        maxlen=int(os.getenv("SEGMENT_STREAM_MAXLEN", "100000")),
+    )
@@ -0,0 +1,295 @@
+"""
+Content-addressed cache for synthesized phrases.
+
+Greetings and other templated lines are the same few strings on every call,
+so synthesizing them again costs a TTS round-trip before the caller hears
+anything. Audio is keyed by text, voice, language and speed, held in an LRU
+memory tier shared by every job in the worker process and persisted as WAV
+files under /app/.cache so a restarted worker starts warm.
+
+Only fixed phrases belong here: a greeting with the customer's name or
+details would otherwise be written to disk. Files on disk expire ttl seconds
+after they were written, and the least recently used ones are removed when
+the directory grows past max_disk_bytes (a hit refreshes the file's access
+time, its write time stays in mtime).
+"""
+import asyncio
+import collections
+import contextlib
+import hashlib
+import io
+import logging
+import os
+import time
+import wave
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+from livekit import rtc
+from livekit.agents import tts
+
+logger = logging.getLogger("dialogLens-tts-cache")
+
+# Frame size used when replaying cached audio, so playback stays interruptible
+FRAME_MS = 20
+
+
+class _Clip:
+    __slots__ = ("pcm", "sample_rate", "num_channels")
+
+    def __init__(self, pcm: bytes, sample_rate: int, num_channels: int) -> None:
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+
+
+class PhraseCache:
+    """Two-tier (memory LRU + disk) cache of synthesized phrases"""
+
+    def __init__(
+        self,
+        directory: Optional[str],
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 7 * 24 * 3600,
+    ) -> None:
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._clips: "collections.OrderedDict[str, _Clip]" = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Background disk writes, kept so they are not collected before they finish
+        self._writes: Set[asyncio.Task] = set()
+
+        # Cache counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def key(text: str, voice_id: str, language: str, speed: float) -> str:
+        raw = "\x1f".join((voice_id, language, f"{speed:g}", text))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def stream(
+        self,
+        engine: tts.TTS,
+        text: str,
+        voice_id: str,
+        language: str = "en",
+        speed: float = 1.0,
+    ) -> AsyncIterator[rtc.AudioFrame]:
+        """Yield the phrase's audio, synthesizing and caching it on a miss"""
+        key = self.key(text, voice_id, language, speed)
+        clip, owner = await self._lookup(key)
+        if clip is None:
+            # Play frames as they are synthesized and cache the phrase once complete;
+            # closing it at once when playback stops also closes the TTS stream
+            async with contextlib.aclosing(self._synthesize(engine, text, key, owner)) as frames:
+                async for frame in frames:
+                    yield frame
+            return
+
+        step = clip.sample_rate * FRAME_MS // 1000 * clip.num_channels * 2
+        for offset in range(0, len(clip.pcm), step):
+            chunk = clip.pcm[offset:offset + step]
+            yield rtc.AudioFrame(
+                chunk,
+                clip.sample_rate,
+                clip.num_channels,
+                len(chunk) // (2 * clip.num_channels),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "entries": len(self._clips),
+            "memory_bytes": self._memory_bytes,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    async def _lookup(self, key: str) -> Tuple[Optional[_Clip], bool]:
+        """Find a cached clip; on a miss, report whether this caller owns the synthesis"""
+        clip = self._clips.get(key)
+        if clip is not None:
+            self._clips.move_to_end(key)
+            self.memory_hits += 1
+            self._log("memory hit", key)
+            return clip, False
+
+        # Rooms starting together wait for the lookup or synthesis already running
+        if key in self._inflight:
+            try:
+                clip = await asyncio.shield(self._inflight[key])
+            except Exception:
+                return None, False
+            self.memory_hits += 1
+            self._log("memory hit (in flight)", key)
+            return clip, False
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            clip = await asyncio.to_thread(self._read, key)
+        except BaseException:
+            del self._inflight[key]
+            future.set_exception(RuntimeError(f"Lookup of {key[:12]} was cancelled"))
+            future.exception()
+            raise
+        if clip is None:
+            return None, True
+
+        del self._inflight[key]
+        self._remember(key, clip)
+        future.set_result(clip)
+        self.disk_hits += 1
+        self._log("disk hit", key)
+        return clip, False
+
+    async def _synthesize(
+        self, engine: tts.TTS, text: str, key: str, owner: bool
+    ) -> AsyncIterator[rtc.AudioFrame]:
+        self.misses += 1
+        self._log("miss", key)
+
+        pcm = bytearray()
+        frame = None
+        complete = False
+        try:
+            # Closing the stream stops the plugin's synthesis task and connection when playback is cut short
+            async with engine.synthesize(text) as stream:
+                async for event in stream:
+                    frame = event.frame
+                    pcm += frame.data
+                    yield frame
+            complete = frame is not None
+        finally:
+            if owner:
+                future = self._inflight.pop(key)
+                if complete:
+                    clip = _Clip(bytes(pcm), frame.sample_rate, frame.num_channels)
+                    self._remember(key, clip)
+                    future.set_result(clip)
+                    # Persist in the background; playback is already done
+                    task = asyncio.create_task(asyncio.to_thread(self._write, key, clip))
+                    self._writes.add(task)
+                    task.add_done_callback(self._write_done)
+                else:
+                    # Interrupted or failed: waiters synthesize for themselves
+                    future.set_exception(RuntimeError(f"Synthesis of {key[:12]} did not complete"))
+                    future.exception()
+
+    def _write_done(self, task: asyncio.Task) -> None:
+        self._writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error persisting cached phrase: {task.exception()!r}")
+
+    def _log(self, outcome: str, key: str) -> None:
+        logger.info(f"Phrase cache {outcome} for {key[:12]} (hit rate {self.stats()['hit_rate']})")
+
+    def _remember(self, key: str, clip: _Clip) -> None:
+        self._clips[key] = clip
+        self._memory_bytes += len(clip.pcm)
+        while self._memory_bytes > self.max_memory_bytes and len(self._clips) > 1:
+            _, evicted = self._clips.popitem(last=False)
+            self._memory_bytes -= len(evicted.pcm)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.wav")
+
+    def _read(self, key: str) -> Optional[_Clip]:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            written = os.stat(path).st_mtime
+            if time.time() - written > self.ttl:
+                self._remove(path)
+                return None
+            with wave.open(path, "rb") as wav:
+                clip = _Clip(wav.readframes(wav.getnframes()), wav.getframerate(), wav.getnchannels())
+            # Mark it recently used for eviction, keeping the write time for the TTL
+            os.utime(path, (time.time(), written))
+            return clip
+        except FileNotFoundError:
+            return None
+        except (OSError, wave.Error, EOFError) as e:
+            logger.warning(f"Ignoring unreadable cached phrase {key}: {e}")
+            return None
+
+    def _write(self, key: str, clip: _Clip) -> None:
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav:
+                wav.setnchannels(clip.num_channels)
+                wav.setsampwidth(2)
+                wav.setframerate(clip.sample_rate)
+                wav.writeframes(clip.pcm)
+            # Write then rename so concurrent workers never read a partial file
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not persist cached phrase {key}: {e}")
+            return
+        self._prune()
+
+    def _prune(self) -> None:
+        """Remove expired files, then the least recently used while over max_disk_bytes"""
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".wav"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                if now - info.st_mtime > self.ttl:
+                    self._remove(path)
+                else:
+                    files.append((info.st_atime, info.st_size, path))
+
+        used = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if used <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            used -= size
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            return  # another worker removed it first
+        self.disk_evictions += 1
+
+
+_cache: Optional[PhraseCache] = None
+
+
+def phrase_cache() -> PhraseCache:
+    """Process-wide phrase cache, configured from the environment"""
+    global _cache
+    if _cache is None:
+        directory = os.getenv("TTS_CACHE_DIR", "/app/.cache/tts")
+        _cache = PhraseCache(
+            directory=directory or None,
+            max_memory_bytes=int(float(os.getenv("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024),
+            max_disk_bytes=int(float(os.getenv("TTS_CACHE_DISK_MB", "256")) * 1024 * 1024),
+            ttl=float(os.getenv("TTS_CACHE_TTL_HOURS", "168")) * 3600,
+        )
+    return _cache
@@ -0,0 +1,223 @@
+"""
+Background upload dispatch with backpressure.
+
+Event handlers hand uploads to a bounded queue and return immediately; a
+background task sends them over the shared API client. When the queue is
+full the overflow policy decides what happens:
+
+- ``block``: the producer waits for room (the only policy that can delay a handler)
+- ``drop-oldest-interim``: evict the oldest interim item, else drop the new one
+- ``spill``: write the new item to the upload spool for later replay
+
+Queue depth and every overflow, by policy and outcome, are exported so
+backpressure is visible while it happens.
+"""
+import asyncio
+import collections
+import logging
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from api_client import APIClient
+from voice_metrics import UPLOAD_LATENCY_SECONDS, UPLOAD_OVERFLOWS, UPLOAD_QUEUE_DEPTH
+
+logger = logging.getLogger("dialogLens-upload-dispatcher")
+
+OVERFLOW_POLICIES = ("block", "drop-oldest-interim", "spill")
+
+# spill(item) -> True when the item was written somewhere durable
+SpillHandler = Callable[[Any], Awaitable[bool]]
+
+# Every queue alive in this process, for the loop monitor's pending uploads
+_live_queues: "weakref.WeakSet[UploadQueue]" = weakref.WeakSet()
+
+
+def pending_uploads() -> int:
+    """Items waiting in all of this process's upload queues"""
+    return sum(queue.qsize() for queue in list(_live_queues))
+
+
+class _Entry:
+    __slots__ = ("item", "interim", "enqueued_at")
+
+    def __init__(self, item: Any, interim: bool) -> None:
+        self.item = item
+        self.interim = interim
+        self.enqueued_at = time.monotonic()
+
+
+class UploadQueue:
+    """Bounded FIFO with an overflow policy and latency tracking"""
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        policy: str = "spill",
+        spill: Optional[SpillHandler] = None,
+        name: str = "uploads",
+    ) -> None:
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.name = name
+        self._latency_metric = UPLOAD_LATENCY_SECONDS.labels(queue=name)
+        self._depth_metric = UPLOAD_QUEUE_DEPTH.labels(queue=name)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spill = spill
+        self._entries: Deque[_Entry] = collections.deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._latencies: Deque[float] = collections.deque(maxlen=1024)
+        _live_queues.add(self)
+
+        # Queue counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.peak_depth = 0
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def empty(self) -> bool:
+        return not self._entries
+
+    async def put(self, item: Any, interim: bool = False) -> None:
+        """Queue an item, applying the overflow policy when full"""
+        if len(self._entries) >= self.maxsize:
+            if self.policy == "block":
+                self._overflow("blocked")
+                while len(self._entries) >= self.maxsize:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+            elif self.policy == "drop-oldest-interim":
+                if not self._evict_interim():
+                    self.dropped += 1
+                    self._overflow("dropped")
+                    return
+                self._overflow("evicted")
+            else:
+                if self.spill is not None and await self.spill(item):
+                    self.spilled += 1
+                    self._overflow("spilled")
+                else:
+                    self.dropped += 1
+                    self._overflow("dropped")
+                return
+
+        self._entries.append(_Entry(item, interim))
+        self._depth_metric.inc()
+        self.enqueued += 1
+        self.peak_depth = max(self.peak_depth, len(self._entries))
+        self._not_empty.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[_Entry]:
+        """Wait for the next entry, returning None on timeout"""
+        while not self._entries:
+            self._not_empty.clear()
+            try:
+                await asyncio.wait_for(self._not_empty.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.get_nowait()
+
+    def get_nowait(self) -> _Entry:
+        entry = self._entries.popleft()
+        self._depth_metric.dec()
+        self._not_full.set()
+        return entry
+
+    def record_sent(self, entry: _Entry) -> None:
+        """Record enqueue-to-send latency for an entry"""
+        latency = time.monotonic() - entry.enqueued_at
+        self._latencies.append(latency)
+        self._latency_metric.observe(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of depth, drops and enqueue-to-send latency"""
+        latencies = sorted(self._latencies)
+        return {
+            "depth": len(self._entries),
+            "peak_depth": self.peak_depth,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "latency_p50_ms": _percentile_ms(latencies, 0.50),
+            "latency_p99_ms": _percentile_ms(latencies, 0.99),
+        }
+
+    def _evict_interim(self) -> bool:
+        for entry in self._entries:
+            if entry.interim:
+                self._entries.remove(entry)
+                self._depth_metric.dec()
+                self.dropped += 1
+                return True
+        return False
+
+    def _overflow(self, outcome: str) -> None:
+        UPLOAD_OVERFLOWS.labels(queue=self.name, policy=self.policy, outcome=outcome).inc()
+
+
+class UploadDispatcher:
+    """Sends single API payloads in the background, in submission order"""
+
+    def __init__(
+        self,
+        api: APIClient,
+        max_queue_size: int = 1000,
+        policy: str = "spill",
+    ) -> None:
+        self.api = api
+        self.queue = UploadQueue(max_queue_size, policy, spill=self._spill, name="interactions")
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def start(self) -> None:
+        """Start the background send loop"""
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, path: str, payload: Dict[str, Any], interim: bool = False) -> None:
+        """Queue a payload for upload without waiting for the API"""
+        await self.queue.put((path, payload), interim)
+
+    async def close(self) -> None:
+        """Send whatever is still queued and stop the send loop"""
+        self._closing = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+        logger.info(f"Upload dispatcher closed: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return self.queue.stats()
+
+    async def _run(self) -> None:
+        while not (self._closing and self.queue.empty()):
+            entry = await self.queue.get(timeout=0.25)
+            if entry is None:
+                continue
+            path, payload = entry.item
+            try:
+                await self.api.send(path, payload)
+            except Exception as e:
+                logger.error(f"Error uploading to {path}: {e}")
+            self.queue.record_sent(entry)
+
+    async def _spill(self, item: Any) -> bool:
+        if self.api.spool is None:
+            return False
+        path, payload = item
+        await self.api.spool.append(path, payload)
+        return True
+
+
+def _percentile_ms(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    index = min(int(len(values) * fraction), len(values) - 1)
+    return round(values[index] * 1000, 1)
@@ -0,0 +1,129 @@
+"""
+Upload policy shared by every agent: per-request deadlines, jittered
+exponential backoff for retryable failures, and a circuit breaker that fails
+fast while the API is unhealthy so pending uploads go to the spool instead of
+piling up as coroutines.
+"""
+import logging
+import os
+import random
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger("dialogLens-upload-policy")
+
+
+class UploadPolicy:
+    """Timeouts and retry schedule for API uploads"""
+
+    def __init__(
+        self,
+        request_timeout: float = 5.0,
+        deadline: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+    ) -> None:
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @classmethod
+    def from_env(cls) -> "UploadPolicy":
+        return cls(
+            request_timeout=float(os.getenv("API_TIMEOUT", "5")),
+            deadline=float(os.getenv("API_DEADLINE", "10")),
+            max_retries=int(os.getenv("API_RETRIES", "3")),
+            backoff_base=float(os.getenv("API_RETRY_BASE_MS", "200")) / 1000,
+            backoff_max=float(os.getenv("API_RETRY_MAX_MS", "2000")) / 1000,
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def is_retryable(status: int) -> bool:
+        """Connection errors (status 0) and 5xx responses are worth retrying"""
+        return status == 0 or status >= 500
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker around the API"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 15.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        # Transition counters
+        self.times_opened = 0
+        self.times_closed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        return cls(
+            failure_threshold=int(os.getenv("API_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("API_BREAKER_RESET", "15")),
+        )
+
+    def allow(self) -> bool:
+        """Whether a request may be attempted right now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self._transition(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            # Let a single probe through
+            if self._probe_in_flight:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+            self.times_closed += 1
+
+    def release_probe(self) -> None:
+        """Free the half-open probe slot when the probe ended without an outcome"""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self._opened_at = time.monotonic()
+            self._transition(self.OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "times_opened": self.times_opened,
+            "times_closed": self.times_closed,
+            "rejected": self.rejected,
+        }
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        log = logger.warning if state == self.OPEN else logger.info
+        log(f"API circuit breaker {self.state} -> {state}")
+        self.state = state
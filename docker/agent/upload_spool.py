@@ -0,0 +1,261 @@
+"""
+Durable local spool for uploads that could not reach the API.
+
+Payloads are appended to a SQLite write-ahead log shared by every process on
+the worker (under /app/.cache by default, which survives restarts through the
+agent-models volume). Appends are committed and fsynced in small batches and
+replayed oldest-first once the API recovers.
+
+Every process on the worker replays the same spool, so a replay pass claims
+its rows first: inside one BEGIN IMMEDIATE transaction it selects rows whose
+lease has expired and sets their lease_until, which keeps other processes
+off them until the pass deletes or releases them. A record can still be
+sent twice if its process dies after the API stored it but before the row is
+deleted, or if a send outlives the lease. Payloads carry an idempotency key,
+so the API ignores such a repeat.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("dialogLens-upload-spool")
+
+# send(path, payload) -> True when the API accepted the record
+ReplaySender = Callable[[str, Dict[str, Any]], Awaitable[bool]]
+
+
+class UploadSpool:
+    """Append-only on-disk queue of pending API uploads"""
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        sync_batch_size: int = 64,
+        sync_interval: float = 0.05,
+        lease_seconds: float = 60.0,
+    ) -> None:
+        self.path = os.path.join(directory, "spool.db")
+        self.max_bytes = max_bytes
+        self.sync_batch_size = sync_batch_size
+        self.sync_interval = sync_interval
+        self.lease_seconds = lease_seconds
+        self._db: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, str, float]] = []
+        self._sync_handle: Optional[asyncio.TimerHandle] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.depth = 0
+        self.bytes_used = 0
+
+        # Spool counters
+        self.records_spooled = 0
+        self.records_replayed = 0
+        self.records_dropped = 0
+        self.replay_rate = 0.0  # records/second during the last replay pass
+
+    def open(self) -> bool:
+        """Open the spool database, returning False if it is unavailable"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " path TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " lease_until REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in db.execute("PRAGMA table_info(records)")]
+            if "lease_until" not in columns:
+                # Spools written before replay claimed rows
+                db.execute("ALTER TABLE records ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+            db.commit()
+            self._db = db
+            self.depth = self._count()
+            self.bytes_used = self._used_bytes()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Upload spool disabled, cannot open {self.path}: {e}")
+            return False
+
+        if self.depth:
+            logger.info(f"Upload spool has {self.depth} records waiting for replay")
+        return True
+
+    async def append(self, path: str, payload: Dict[str, Any]) -> None:
+        """Spool a payload; it is durable once its batch is synced"""
+        if self._db is None:
+            self.records_dropped += 1
+            return
+
+        self._pending.append((path, json.dumps(payload), time.time()))
+        self.depth += 1
+        self.records_spooled += 1
+
+        if len(self._pending) >= self.sync_batch_size:
+            await self.sync()
+        elif self._sync_handle is None:
+            loop = asyncio.get_running_loop()
+            self._sync_handle = loop.call_later(self.sync_interval, self._sync_later)
+
+    async def sync(self) -> None:
+        """Commit buffered appends to disk in one transaction"""
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        if not self._pending or self._db is None:
+            return
+
+        batch, self._pending = self._pending, []
+        async with self._lock:
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except BaseException:
+                # Not committed: keep the batch, ahead of anything appended meanwhile, for the next sync
+                self._pending = batch + self._pending
+                raise
+            # The batch is on disk now; a failure here must not queue it again
+            try:
+                await asyncio.to_thread(self._enforce_limit)
+            except sqlite3.Error as e:
+                logger.error(f"Error enforcing the upload spool size limit: {e}")
+
+    def _sync_later(self) -> None:
+        self._sync_task = asyncio.create_task(self.sync())
+        self._sync_task.add_done_callback(_log_sync_error)
+
+    async def replay(self, send: ReplaySender, batch_size: int = 100) -> int:
+        """Send claimed records oldest-first, stopping at the first failure"""
+        if self._db is None:
+            return 0
+
+        await self.sync()
+        replayed = 0
+        started = time.monotonic()
+
+        while True:
+            async with self._lock:
+                rows = await asyncio.to_thread(self._claim, batch_size)
+            if not rows:
+                break
+
+            sent_ids = []
+            try:
+                for row_id, path, payload in rows:
+                    if not await send(path, json.loads(payload)):
+                        break
+                    sent_ids.append(row_id)
+            finally:
+                # Unsent rows go back to the spool for any process to claim
+                unsent_ids = [row[0] for row in rows[len(sent_ids):]]
+                async with self._lock:
+                    await asyncio.to_thread(self._settle, sent_ids, unsent_ids)
+
+            replayed += len(sent_ids)
+            if unsent_ids:
+                break
+
+        async with self._lock:
+            self.depth = await asyncio.to_thread(self._count) + len(self._pending)
+
+        if replayed:
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.replay_rate = replayed / elapsed
+            self.records_replayed += replayed
+            logger.info(
+                f"Replayed {replayed} spooled records ({self.replay_rate:.0f}/s), "
+                f"{self.depth} remaining"
+            )
+        return replayed
+
+    async def close(self) -> None:
+        """Sync outstanding appends and close the database"""
+        await self.sync()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            logger.info(f"Upload spool closed: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of spool depth and throughput"""
+        return {
+            "depth": self.depth,
+            "bytes": self.bytes_used,
+            "records_spooled": self.records_spooled,
+            "records_replayed": self.records_replayed,
+            "records_dropped": self.records_dropped,
+            "replay_rate": round(self.replay_rate, 1),
+        }
+
+    def _write(self, batch: List[Tuple[str, str, float]]) -> None:
+        self._db.executemany(
+            "INSERT INTO records (path, payload, created_at) VALUES (?, ?, ?)", batch
+        )
+        self._db.commit()
+
+    def _claim(self, limit: int) -> List[Tuple[int, str, str]]:
+        """Lease the oldest unclaimed rows to this process"""
+        now = time.time()
+        # Takes the write lock up front, so no other process claims between the read and the update
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute(
+                "SELECT id, path, payload FROM records WHERE lease_until < ? ORDER BY id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE records SET lease_until = ? WHERE id = ?",
+                [(now + self.lease_seconds, row[0]) for row in rows],
+            )
+            self._db.commit()
+        except sqlite3.Error:
+            self._db.rollback()
+            raise
+        return rows
+
+    def _settle(self, sent_ids: List[int], unsent_ids: List[int]) -> None:
+        """Delete replayed rows and release the lease on the rest"""
+        self._db.executemany("DELETE FROM records WHERE id = ?", [(i,) for i in sent_ids])
+        self._db.executemany("UPDATE records SET lease_until = 0 WHERE id = ?", [(i,) for i in unsent_ids])
+        self._db.commit()
+        self.bytes_used = self._used_bytes()
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def _used_bytes(self) -> int:
+        page_size = self._db.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self._db.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = self._db.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def _enforce_limit(self) -> None:
+        """Drop the oldest records while the spool is over its size limit"""
+        self.bytes_used = self._used_bytes()
+        while self.bytes_used > self.max_bytes:
+            count = self._count()
+            if count == 0:
+                break
+            drop = max(count // 10, 1)
+            self._db.execute(
+                "DELETE FROM records WHERE id IN "
+                "(SELECT id FROM records ORDER BY id LIMIT ?)",
+                (drop,),
+            )
+            self._db.commit()
+            self.records_dropped += drop
+            self.depth = max(self.depth - drop, 0)
+            self.bytes_used = self._used_bytes()
+            logger.warning(f"Upload spool over {self.max_bytes} bytes, dropped {drop} oldest records")
+
+
+def _log_sync_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Error syncing upload spool, records kept for the next sync: {task.exception()}")
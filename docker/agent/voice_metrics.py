@@ -0,0 +1,231 @@
+"""
+Voice pipeline latency metrics.
+
+TurnLatencyTracker follows each user turn through an AgentSession, from VAD
+end-of-speech to the first agent audio frame, and records every stage in a
+Prometheus histogram labelled by agent type and room type (telephony or web,
+from the room metadata's isTelephony, so the label has two values). Upload queues record their
+depth, overflows and enqueue-to-send latency here too, the caption stabilizer its forwarded and
+suppressed interims, and job processes publish the load
+signals that admission control reads (admission.py). The metrics are served
+from the worker's /metrics endpoint, which aggregates all job processes
+through prometheus_client's multiprocess mode.
+"""
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import prometheus_client
+from livekit.agents import AgentSession, metrics
+
+logger = logging.getLogger("dialogLens-metrics")
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+TURN_STAGE_SECONDS = prometheus_client.Histogram(
+    "dialoglens_turn_stage_seconds",
+    "Voice turn stage latency. stt_final, end_of_turn and first_audio are measured "
+    "from VAD end of speech; llm_first_token and tts_first_byte are the stage's own "
+    "time to first output",
+    ["agent_type", "room_type", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+UPLOAD_LATENCY_SECONDS = prometheus_client.Histogram(
+    "dialoglens_upload_latency_seconds",
+    "Time from queueing an upload to sending it to the API or stream",
+    ["queue"],
+    buckets=LATENCY_BUCKETS,
+)
+
+UPLOAD_QUEUE_DEPTH = prometheus_client.Gauge(
+    "dialoglens_upload_queue_depth",
+    "Uploads waiting in the job processes' queues",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+
+UPLOAD_OVERFLOWS = prometheus_client.Counter(
+    "dialoglens_upload_overflows",
+    "Uploads that found their queue full, by overflow policy and what happened to them",
+    ["queue", "policy", "outcome"],
+)
+
+CAPTION_INTERIMS = prometheus_client.Counter(
+    "dialoglens_caption_interims",
+    "Interim hypotheses forwarded as live caption updates or suppressed by the caption stabilizer",
+    ["outcome"],
+)
+
+# Reported by job processes and aggregated by the worker's load function
+STT_STREAMS = prometheus_client.Gauge(
+    "dialoglens_stt_streams",
+    "Open STT streams across the worker's job processes",
+    ["agent_type"],
+    multiprocess_mode="livesum",
+)
+
+EVENT_LOOP_LAG_SECONDS = prometheus_client.Gauge(
+    "dialoglens_event_loop_lag_seconds",
+    "Worst recent event loop lag of any job process",
+    ["agent_type"],
+    multiprocess_mode="livemax",
+)
+
+# Published by job processes' loop monitors (loop_monitor.py) for the health endpoint
+EVENT_LOOP_LAG_QUANTILE_SECONDS = prometheus_client.Gauge(
+    "dialoglens_event_loop_lag_quantile_seconds",
+    "Event loop lag percentiles over the last minute, worst of any job process",
+    ["agent_type", "quantile"],
+    multiprocess_mode="livemax",
+)
+
+SLOW_CALLBACKS = prometheus_client.Counter(
+    "dialoglens_slow_callbacks",
+    "Callbacks that blocked a job's event loop longer than SLOW_CALLBACK_MS",
+    ["agent_type"],
+)
+
+PENDING_UPLOADS = prometheus_client.Gauge(
+    "dialoglens_pending_uploads",
+    "Segments and interactions queued for upload across the worker's job processes",
+    ["agent_type"],
+    multiprocess_mode="livesum",
+)
+
+# Set by each process once its models are loaded (models.py)
+MODELS_LOADED = prometheus_client.Gauge(
+    "dialoglens_models_loaded",
+    "Processes with the model loaded",
+    ["model"],
+    multiprocess_mode="livesum",
+)
+
+MODEL_LOAD_SECONDS = prometheus_client.Gauge(
+    "dialoglens_model_load_seconds",
+    "Time the slowest live process took to load the model",
+    ["model"],
+    multiprocess_mode="livemax",
+)
+
+ADMISSION_DECISIONS = prometheus_client.Counter(
+    "dialoglens_admission_decisions",
+    "Job requests accepted or rejected by load-aware admission, by limiting signal",
+    ["agent_type", "decision", "reason"],
+)
+
+# Warm pool sizing, recorded in the worker process (prespawner.py)
+JOB_STARTS = prometheus_client.Counter(
+    "dialoglens_job_starts",
+    "Jobs launched on an already warm process or one spawned after the job was accepted",
+    ["agent_type", "start"],
+)
+
+IDLE_PROCESS_TARGET = prometheus_client.Gauge(
+    "dialoglens_idle_process_target",
+    "Warm idle processes the worker currently aims to keep",
+    ["agent_type"],
+    multiprocess_mode="livemax",
+)
+
+IDLE_PROCESS_MEMORY_BYTES = prometheus_client.Gauge(
+    "dialoglens_idle_process_memory_bytes",
+    "Resident memory held by warm idle processes",
+    ["agent_type"],
+    multiprocess_mode="livesum",
+)
+
+STT_AUDIO_SECONDS = prometheus_client.Counter(
+    "dialoglens_stt_audio_seconds",
+    "Participant audio forwarded to STT or suppressed as silence by the speech gate",
+    ["agent_type", "state"],
+)
+
+
+# Cross-session inference batching (inference_batcher.py)
+INFERENCE_BATCH_SIZE = prometheus_client.Histogram(
+    "dialoglens_inference_batch_size",
+    "Inference calls run together in one batched model call",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+INFERENCE_QUEUE_SECONDS = prometheus_client.Histogram(
+    "dialoglens_inference_queue_seconds",
+    "Time an inference call waited for its batch to run",
+    ["model"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+INFERENCE_SAVED_SECONDS = prometheus_client.Counter(
+    "dialoglens_inference_saved_seconds",
+    "Inference time saved by batching, against the measured cost of single calls",
+    ["model"],
+)
+
+
+def room_type(metadata: Dict[str, Any]) -> str:
+    """Bounded room_type label for a room's metadata"""
+    return "telephony" if metadata.get("isTelephony", False) else "web"
+
+
+def prometheus_options() -> Dict[str, Any]:
+    """WorkerOptions arguments that serve /metrics for the worker and its jobs"""
+    port = os.getenv("PROMETHEUS_PORT", "8081")
+    if not port:
+        return {}
+    return {
+        "prometheus_port": int(port),
+        "prometheus_multiproc_dir": os.getenv("PROMETHEUS_MULTIPROC_DIR", "/tmp/dialoglens-metrics"),
+    }
+
+
+class TurnLatencyTracker:
+    """Timestamps each user turn's pipeline stages for one session"""
+
+    def __init__(self, agent_type: str, room_type: str = "web") -> None:
+        self.agent_type = agent_type
+        self.room_type = room_type
+        self._end_of_speech: Optional[float] = None
+        self._stages: Dict[str, float] = {}
+        self.turns = 0
+
+    def attach(self, session: AgentSession) -> None:
+        session.on("user_state_changed", self._on_user_state)
+        session.on("metrics_collected", self._on_metrics)
+        session.on("agent_state_changed", self._on_agent_state)
+
+    def _on_user_state(self, event) -> None:
+        if event.old_state == "speaking" and event.new_state == "listening":
+            # VAD end of speech opens a new turn
+            self._end_of_speech = event.created_at
+            self._stages = {}
+
+    def _on_metrics(self, event) -> None:
+        if self._end_of_speech is None:
+            return
+        report = event.metrics
+        if isinstance(report, metrics.EOUMetrics):
+            self._stages["stt_final"] = report.transcription_delay
+            self._stages["end_of_turn"] = report.end_of_utterance_delay
+        elif isinstance(report, metrics.LLMMetrics):
+            self._stages.setdefault("llm_first_token", report.ttft)
+        elif isinstance(report, metrics.TTSMetrics):
+            self._stages.setdefault("tts_first_byte", report.ttfb)
+
+    def _on_agent_state(self, event) -> None:
+        if event.new_state != "speaking" or self._end_of_speech is None:
+            return
+        self._stages["first_audio"] = event.created_at - self._end_of_speech
+        self._end_of_speech = None
+        self.turns += 1
+
+        for stage, seconds in self._stages.items():
+            if seconds >= 0:
+                TURN_STAGE_SECONDS.labels(
+                    agent_type=self.agent_type, room_type=self.room_type, stage=stage
+                ).observe(seconds)
+        logger.info(
+            f"Turn {self.turns} latency: "
+            + ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in self._stages.items())
+        )
@@ -0,0 +1,261 @@
+"""
+Compact wire format for agent uploads.
+
+In JSON every interaction repeats the room's customer context and every
+segment repeats its room and participant name, plus verbose key names. With
+UPLOAD_WIRE_FORMAT=compact the APIClient registers each room's static
+context once (POST /agent/sessions) and gets a short session handle back.
+Later uploads carry only the handle and what changes per upload, msgpack
+encoded:
+
+- interaction: {"h": handle, "i": interactionId, "s": speaker, "x": text, "t": timestamp}
+- segment batch: {"h": handle, "t": base timestamp, "s": [[segmentId (16 raw
+  bytes), participant index, text, isFinal, confidence, timestamp - base], ...]}
+
+Bodies of at least WIRE_COMPRESS_MIN_BYTES (large segment batches) are also
+gzipped. Smaller ones are not, because gzip costs more CPU than the JSON
+encoding it replaces.
+
+Callers and the upload spool keep working with full JSON payloads; encoding
+happens per request in APIClient.post. The session is registered again when
+a room's context changes or a new participant appears, and when the API
+answers 410 because it no longer knows the handle. An API without the
+sessions route turns compact mode off for the process.
+"""
+import asyncio
+import collections
+import gzip
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import msgpack
+
+logger = logging.getLogger("dialogLens-wire-format")
+
+CONTENT_TYPE = "application/msgpack"
+SESSIONS_PATH = "/agent/sessions"
+INTERACTION_PATH = "/conversations/interaction"
+SEGMENT_BATCH_PATH = "/transcripts/segment/batch"
+
+# POSTs a JSON payload and returns the status code and body
+PostJSON = Callable[[str, Dict[str, Any]], Awaitable[Tuple[int, str]]]
+
+
+class _Session:
+    __slots__ = ("handle", "context", "participants", "index")
+
+    def __init__(self) -> None:
+        self.handle: Optional[str] = None
+        self.context: Optional[Dict[str, Any]] = None
+        # [identity, name] pairs; segments refer to them by position
+        self.participants: List[List[str]] = []
+        self.index: Dict[str, int] = {}
+
+
+class WireCodec:
+    """Encodes upload payloads against per-room session handles"""
+
+    def __init__(self, compress_min_bytes: int = 8192, max_sessions: int = 256) -> None:
+        self.compress_min_bytes = compress_min_bytes
+        self.max_sessions = max_sessions
+        self.enabled = True
+        self._sessions: "collections.OrderedDict[str, _Session]" = collections.OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # packb builds a Packer, and its 256KB buffer, on every call
+        self._packer = msgpack.Packer()
+
+        # Codec counters
+        self.handshakes = 0
+        self.handshake_failures = 0
+        self.compact_requests = 0
+        self.compressed_requests = 0
+        self.bytes_sent = 0
+        self.expired_handles = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["WireCodec"]:
+        """The codec selected by UPLOAD_WIRE_FORMAT, or None for plain JSON"""
+        if os.getenv("UPLOAD_WIRE_FORMAT", "json") != "compact":
+            return None
+        return cls(compress_min_bytes=int(os.getenv("WIRE_COMPRESS_MIN_BYTES", "8192")))
+
+    def handles(self, path: str) -> bool:
+        return self.enabled and path in (INTERACTION_PATH, SEGMENT_BATCH_PATH)
+
+    async def encode(
+        self, path: str, data: Dict[str, Any], post_json: PostJSON
+    ) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """
+        Compact body and headers for a payload, or None to send it as JSON.
+
+        Registers the room's session first when it has no handle yet or the
+        payload brings context the API has not seen.
+        """
+        room = data["roomId"]
+        if path == INTERACTION_PATH:
+            context = data.get("metadata") or {}
+            identities: List[Tuple[str, str]] = []
+        else:
+            context = None
+            identities = [
+                (segment["participantId"], segment.get("participantName") or "")
+                for segment in data["segments"]
+            ]
+
+        session = await self._session(room, context, identities, post_json)
+        if session is None:
+            return None
+
+        if path == INTERACTION_PATH:
+            message: Dict[str, Any] = {
+                "h": session.handle,
+                "i": data.get("interactionId"),
+                "s": data["speaker"],
+                "x": data["text"],
+                "t": data["timestamp"],
+            }
+        else:
+            base = min(segment["timestamp"] for segment in data["segments"])
+            message = {
+                "h": session.handle,
+                "t": base,
+                "s": [
+                    [
+                        _segment_key(segment.get("segmentId")),
+                        session.index[segment["participantId"]],
+                        segment["text"],
+                        segment.get("isFinal", True),
+                        segment.get("confidence"),
+                        segment["timestamp"] - base,
+                    ]
+                    for segment in data["segments"]
+                ],
+            }
+
+        body = self._packer.pack(message)
+        headers = {"Content-Type": CONTENT_TYPE}
+        if len(body) >= self.compress_min_bytes:
+            # Level 1: most of the size win for a fraction of the CPU of level 6
+            body = gzip.compress(body, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+            self.compressed_requests += 1
+
+        self.compact_requests += 1
+        self.bytes_sent += len(body)
+        return body, headers
+
+    def forget(self, room: str) -> None:
+        """Drop a room's handle after the API reported it unknown (410)"""
+        if self._sessions.pop(room, None) is not None:
+            self.expired_handles += 1
+            logger.info(f"Session handle for room {room} expired, registering again")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sessions": len(self._sessions),
+            "handshakes": self.handshakes,
+            "handshake_failures": self.handshake_failures,
+            "compact_requests": self.compact_requests,
+            "compressed_requests": self.compressed_requests,
+            "bytes_sent": self.bytes_sent,
+            "expired_handles": self.expired_handles,
+        }
+
+    async def _session(
+        self,
+        room: str,
+        context: Optional[Dict[str, Any]],
+        identities: List[Tuple[str, str]],
+        post_json: PostJSON,
+    ) -> Optional[_Session]:
+        session = self._sessions.get(room)
+        if session is not None and not _is_stale(session, context, identities):
+            self._sessions.move_to_end(room)
+            return session
+
+        # One registration per room at a time; the others wait and reuse it
+        lock = self._locks.setdefault(room, asyncio.Lock())
+        async with lock:
+            session = self._sessions.get(room) or _Session()
+            if session.handle is not None and not _is_stale(session, context, identities):
+                return session
+
+            participants = list(session.participants)
+            index = dict(session.index)
+            for identity, name in identities:
+                if identity not in index:
+                    index[identity] = len(participants)
+                    participants.append([identity, name])
+
+            payload: Dict[str, Any] = {
+                "roomId": room,
+                "context": session.context if context is None else context,
+                "participants": participants,
+            }
+            if session.handle is not None:
+                payload["handle"] = session.handle
+
+            handle = await self._register(payload, post_json)
+            if handle is None:
+                return None
+
+            session.handle = handle
+            session.context = payload["context"]
+            session.participants = participants
+            session.index = index
+            self._sessions[room] = session
+            self._sessions.move_to_end(room)
+            if len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._locks.pop(evicted, None)
+            return session
+
+    async def _register(self, payload: Dict[str, Any], post_json: PostJSON) -> Optional[str]:
+        self.handshakes += 1
+        try:
+            status, body = await post_json(SESSIONS_PATH, payload)
+        except Exception as e:
+            status, body = 0, str(e) or type(e).__name__
+
+        if status == 200:
+            try:
+                return _handle(body)
+            except ValueError:
+                status = -1
+
+        self.handshake_failures += 1
+        if status == 404:
+            # The API predates session handles; stay on JSON
+            self.enabled = False
+            logger.warning("API has no agent session route, sending uploads as JSON")
+        else:
+            logger.warning(f"Agent session handshake failed, sending as JSON: {status} {body}")
+        return None
+
+
+def _is_stale(
+    session: _Session, context: Optional[Dict[str, Any]], identities: List[Tuple[str, str]]
+) -> bool:
+    if context is not None and context != session.context:
+        return True
+    return any(identity not in session.index for identity, _ in identities)
+
+
+def _segment_key(segment_id: Optional[str]) -> Any:
+    # uuid4().hex ids go as 16 raw bytes instead of 32 characters
+    if segment_id and len(segment_id) == 32:
+        try:
+            return bytes.fromhex(segment_id)
+        except ValueError:
+            pass
+    return segment_id
+
+
+def _handle(body: str) -> str:
+    handle = json.loads(body).get("handle")
+    if not isinstance(handle, str) or not handle:
+        raise ValueError("no handle in response")
+    return handle
@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "Segment" ADD COLUMN "idempotencyKey" TEXT;
+
+-- CreateIndex
+CREATE UNIQUE INDEX "Segment_idempotencyKey_key" ON "Segment"("idempotencyKey");
@@ -0,0 +1,15 @@
+-- CreateTable
+CREATE TABLE "Interaction" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "conversationId" TEXT NOT NULL,
+    "interactionId" TEXT,
+    "speaker" TEXT NOT NULL,
+    "text" TEXT NOT NULL,
+    "timestamp" REAL NOT NULL,
+    "metadata" TEXT,
+    "createdAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT "Interaction_conversationId_fkey" FOREIGN KEY ("conversationId") REFERENCES "Conversation" ("id") ON DELETE RESTRICT ON UPDATE CASCADE
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "Interaction_interactionId_key" ON "Interaction"("interactionId");
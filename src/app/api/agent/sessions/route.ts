@@ -0,0 +1,41 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { z } from 'zod'
+import { AgentSessionService } from '@/lib/livekit/agent-session.service'
+
+const agentSessionSchema = z.object({
+  handle: z.string().min(1).optional(),
+  roomId: z.string().min(1),
+  context: z.record(z.unknown()).nullable().default(null),
+  participants: z.array(z.tuple([z.string().min(1), z.string()])).max(1000).default([]),
+})
+
+// POST /api/agent/sessions - Register a room's static upload context for compact agent uploads
+export async function POST(req: NextRequest) {
+  try {
+    // Verify API key
+    const authHeader = req.headers.get('authorization')
+    if (!authHeader?.startsWith('Bearer ')) {
+      return NextResponse.json({ error: 'Unauthorized' }, { status: 401 })
+    }
+
+    const body = await req.json()
+    const { handle, ...session } = agentSessionSchema.parse(body)
+
+    return NextResponse.json({
+      handle: await AgentSessionService.register(session, handle),
+    })
+  } catch (error) {
+    if (error instanceof z.ZodError) {
+      return NextResponse.json(
+        { error: 'Invalid request', details: error.errors },
+        { status: 400 }
+      )
+    }
+
+    console.error('Error registering agent session:', error)
+    return NextResponse.json(
+      { error: 'Failed to register agent session' },
+      { status: 500 }
+    )
+  }
+}
@@ -1,5 +1,22 @@
 import { NextRequest, NextResponse } from 'next/server'
+import { z } from 'zod'
+import { Prisma } from '@prisma/client'
 import { prisma } from '@/lib/prisma'
+import {
+  expandInteraction,
+  isCompactRequest,
+  readCompactBody,
+  UnknownAgentSessionError,
+} from '@/lib/livekit/wire-format'
+
+const interactionSchema = z.object({
+  interactionId: z.string().min(1).optional(), // Idempotency key, replays with the same id are skipped
+  roomId: z.string().min(1),
+  speaker: z.string().min(1),
+  text: z.string(),
+  timestamp: z.number(),
+  metadata: z.record(z.unknown()).optional(),
+})
 
 export async function POST(req: NextRequest) {
   try {
@@ -9,8 +26,11 @@ export async function POST(req: NextRequest) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 })
     }
 
-    const body = await req.json()
-    const { roomId, speaker, text, timestamp, metadata } = body
+    // Agents in compact mode send msgpack referring to a registered session
+    const body = isCompactRequest(req)
+      ? await expandInteraction(await readCompactBody(req))
+      : await req.json()
+    const { interactionId, roomId, speaker, text, timestamp, metadata } = interactionSchema.parse(body)
 
     // Find the room
     const room = await prisma.room.findUnique({
@@ -34,28 +54,29 @@ export async function POST(req: NextRequest) {
       return NextResponse.json({ error: 'Active conversation not found' }, { status: 404 })
     }
 
-    // Store interaction in conversation metadata
-    const currentMetadata = JSON.parse(conversation.metadata || '{}')
-    const interactions = currentMetadata.interactions || []
-    
-    interactions.push({
-      speaker,
-      text,
-      timestamp,
-      metadata,
-    })
-
-    // Update conversation with new interaction
-    await prisma.conversation.update({
-      where: { id: conversation.id },
-      data: {
-        metadata: JSON.stringify({
-          ...currentMetadata,
-          interactions,
-          lastInteractionAt: timestamp,
-        }),
-      },
-    })
+    // Agents replay spooled interactions after outages; the unique
+    // interactionId makes a replay of a stored one a no-op
+    try {
+      await prisma.interaction.create({
+        data: {
+          conversationId: conversation.id,
+          interactionId,
+          speaker,
+          text,
+          timestamp,
+          metadata: metadata ? JSON.stringify(metadata) : undefined,
+        },
+      })
+    } catch (error) {
+      if (error instanceof Prisma.PrismaClientKnownRequestError && error.code === 'P2002') {
+        return NextResponse.json({
+          success: true,
+          conversationId: conversation.id,
+          duplicate: true,
+        })
+      }
+      throw error
+    }
 
     // If this is a customer service interaction, create a notification
     if (metadata?.agentType === 'customer-service') {
@@ -79,6 +100,15 @@ export async function POST(req: NextRequest) {
       conversationId: conversation.id,
     })
   } catch (error) {
+    if (error instanceof UnknownAgentSessionError) {
+      return NextResponse.json({ error: error.message }, { status: 410 })
+    }
+    if (error instanceof z.ZodError) {
+      return NextResponse.json(
+        { error: 'Invalid request', details: error.errors },
+        { status: 400 }
+      )
+    }
     console.error('Error recording interaction:', error)
     return NextResponse.json(
       { error: 'Failed to record interaction' },
@@ -0,0 +1,72 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { z } from 'zod'
+import { SegmentIngestService } from '@/lib/transcription/ingest.service'
+import {
+  expandSegmentBatch,
+  isCompactRequest,
+  readCompactBody,
+  UnknownAgentSessionError,
+} from '@/lib/livekit/wire-format'
+
+const segmentBatchSchema = z.object({
+  roomId: z.string().min(1),
+  segments: z
+    .array(
+      z.object({
+        segmentId: z.string().min(1).optional(),
+        participantId: z.string().min(1),
+        participantName: z.string().optional(),
+        text: z.string(),
+        isFinal: z.boolean().default(true),
+        confidence: z.number().optional(),
+        timestamp: z.number(),
+      })
+    )
+    .min(1)
+    .max(500),
+})
+
+// POST /api/transcripts/segment/batch - Store a batch of live transcript segments
+export async function POST(req: NextRequest) {
+  try {
+    // Verify API key or user auth
+    const authHeader = req.headers.get('authorization')
+    if (!authHeader?.startsWith('Bearer ')) {
+      return NextResponse.json({ error: 'Unauthorized' }, { status: 401 })
+    }
+
+    // Agents in compact mode send msgpack referring to a registered session
+    const body = isCompactRequest(req)
+      ? await expandSegmentBatch(await readCompactBody(req))
+      : await req.json()
+    const { roomId, segments } = segmentBatchSchema.parse(body)
+
+    const result = await SegmentIngestService.ingestBatch(roomId, segments)
+    if (!result) {
+      return NextResponse.json({ error: 'Room not found' }, { status: 404 })
+    }
+
+    return NextResponse.json({
+      success: true,
+      conversationId: result.conversationId,
+      inserted: result.inserted,
+      duplicates: result.duplicates,
+    })
+  } catch (error) {
+    if (error instanceof UnknownAgentSessionError) {
+      return NextResponse.json({ error: error.message }, { status: 410 })
+    }
+    if (error instanceof z.ZodError) {
+      return NextResponse.json(
+        { error: 'Invalid request', details: error.errors },
+        { status: 400 }
+      )
+    }
+
+    console.error('Error processing transcript segment batch:', error)
+    return NextResponse.json(
+      { error: 'Failed to process segments' },
+      { status: 500 }
+    )
+  }
+}
\ No newline at end of file
@@ -1,5 +1,5 @@
 import { NextRequest, NextResponse } from 'next/server'
-import { prisma } from '@/lib/prisma'
+import { SegmentIngestService } from '@/lib/transcription/ingest.service'
 
 export async function POST(req: NextRequest) {
   try {
@@ -12,6 +12,7 @@ export async function POST(req: NextRequest) {
     const body = await req.json()
     const {
       roomId,
+      segmentId,
       participantId,
       participantName,
       text,
@@ -20,80 +21,20 @@ export async function POST(req: NextRequest) {
       timestamp,
     } = body
 
-    // Find the room
-    const room = await prisma.room.findUnique({
-      where: { liveKitRoomId: roomId },
-      include: { conversations: { orderBy: { startedAt: 'desc' }, take: 1 } },
-    })
+    // A single segment is a batch of one
+    const result = await SegmentIngestService.ingestBatch(roomId, [
+      { segmentId, participantId, participantName, text, isFinal, confidence, timestamp },
+    ])
 
-    if (!room) {
+    if (!result) {
       return NextResponse.json({ error: 'Room not found' }, { status: 404 })
     }
 
-    // Get or create active conversation
-    let conversation = room.conversations[0]
-    if (!conversation || conversation.endedAt) {
-      conversation = await prisma.conversation.create({
-        data: {
-          roomId: room.id,
-          organizationId: room.organizationId,
-          participantCount: 1,
-          metadata: JSON.stringify({ 
-            transcriptionInProgress: true,
-            liveTranscription: true 
-          }),
-        },
-      })
-    }
-
-    // Find or create participant
-    let participant = await prisma.participant.findFirst({
-      where: {
-        conversationId: conversation.id,
-        liveKitIdentity: participantId,
-      },
-    })
-
-    if (!participant) {
-      participant = await prisma.participant.create({
-        data: {
-          conversationId: conversation.id,
-          liveKitIdentity: participantId,
-          name: participantName,
-          joinedAt: new Date(timestamp),
-        },
-      })
-
-      // Update participant count
-      await prisma.conversation.update({
-        where: { id: conversation.id },
-        data: { participantCount: { increment: 1 } },
-      })
-    }
-
-    // Create transcript segment
-    const segment = await prisma.segment.create({
-      data: {
-        conversationId: conversation.id,
-        participantId: participant.id,
-        text,
-        startTime: timestamp / 1000, // Convert to seconds
-        endTime: (timestamp + 1000) / 1000, // Approximate 1 second duration
-        confidence,
-        metadata: JSON.stringify({ 
-          isFinal,
-          realTime: true,
-          source: 'agent' 
-        }),
-      },
-    })
-
     return NextResponse.json({
       success: true,
       segment: {
-        id: segment.id,
-        conversationId: conversation.id,
-        participantId: participant.id,
+        conversationId: result.conversationId,
+        duplicate: result.duplicates > 0,
       },
     })
   } catch (error) {
@@ -103,4 +44,4 @@ export async function POST(req: NextRequest) {
       { status: 500 }
     )
   }
-}
\ No newline at end of file
+}
@@ -191,6 +191,7 @@ describe('Agent Integration', () => {
         requiresTranscription: true,
         requiresCustomerAgent: true,
         customerContext: { name: 'Test User' },
+        maxParticipants: 100,
       })
     })
   })
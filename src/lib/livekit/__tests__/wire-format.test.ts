@@ -0,0 +1,142 @@
+import { describe, it, expect, vi, beforeEach } from 'vitest'
+import { gzipSync } from 'zlib'
+import { pack } from 'msgpackr'
+import { AgentSessionService } from '../agent-session.service'
+import {
+  expandInteraction,
+  expandSegmentBatch,
+  isCompactRequest,
+  readCompactBody,
+  UnknownAgentSessionError,
+} from '../wire-format'
+import { redis } from '@/lib/queue/config'
+
+vi.mock('@/lib/queue/config', () => {
+  const store = new Map<string, string>()
+  return {
+    redis: {
+      store,
+      get: vi.fn(async (key: string) => store.get(key) ?? null),
+      set: vi.fn(async (key: string, value: string) => {
+        store.set(key, value)
+        return 'OK'
+      }),
+    },
+  }
+})
+
+function compactRequest(body: Buffer, headers: Record<string, string>) {
+  return {
+    headers: { get: (name: string) => headers[name.toLowerCase()] ?? null },
+    arrayBuffer: async () => body,
+  } as unknown as Request
+}
+
+describe('Agent wire format', () => {
+  const session = {
+    roomId: 'livekit-room',
+    context: { agentType: 'customer-service', customerContext: { name: 'Sam' } },
+    participants: [['alice', 'Alice'], ['bob', '']] as [string, string][],
+  }
+
+  beforeEach(() => {
+    vi.clearAllMocks()
+    ;(redis as any).store.clear()
+  })
+
+  it('should keep a handle when its room registers again', async () => {
+    const handle = await AgentSessionService.register(session)
+    const again = await AgentSessionService.register(
+      { ...session, participants: [...session.participants, ['carol', 'Carol']] },
+      handle
+    )
+
+    expect(again).toBe(handle)
+    expect((await AgentSessionService.get(handle))?.participants).toHaveLength(3)
+    expect(redis.set).toHaveBeenLastCalledWith(
+      `dialoglens:agent-session:${handle}`,
+      expect.any(String),
+      'EX',
+      86400
+    )
+  })
+
+  it('should issue a new handle for an unknown or foreign handle', async () => {
+    const handle = await AgentSessionService.register(session)
+
+    expect(await AgentSessionService.register(session, 'expired')).not.toBe('expired')
+    expect(await AgentSessionService.register({ ...session, roomId: 'other-room' }, handle)).not.toBe(handle)
+  })
+
+  it('should expand an interaction with the session context', async () => {
+    const handle = await AgentSessionService.register(session)
+
+    const interaction = await expandInteraction({ h: handle, i: 'abc', s: 'user', x: 'Hello', t: 1000 })
+
+    expect(interaction).toEqual({
+      interactionId: 'abc',
+      roomId: 'livekit-room',
+      speaker: 'user',
+      text: 'Hello',
+      timestamp: 1000,
+      metadata: session.context,
+    })
+  })
+
+  it('should expand a gzipped segment batch into the JSON batch shape', async () => {
+    const handle = await AgentSessionService.register(session)
+    const segmentId = '0123456789abcdef0123456789abcdef'
+    const body = gzipSync(
+      pack({
+        h: handle,
+        t: 5000,
+        s: [
+          [Buffer.from(segmentId, 'hex'), 0, 'Hello', true, 0.9, 0],
+          [null, 1, 'Hi', false, null, 700],
+        ],
+      })
+    )
+    const req = compactRequest(body, {
+      'content-type': 'application/msgpack',
+      'content-encoding': 'gzip',
+    })
+
+    expect(isCompactRequest(req)).toBe(true)
+    const batch = await expandSegmentBatch(await readCompactBody(req))
+
+    expect(batch).toEqual({
+      roomId: 'livekit-room',
+      segments: [
+        {
+          segmentId,
+          participantId: 'alice',
+          participantName: 'Alice',
+          text: 'Hello',
+          isFinal: true,
+          confidence: 0.9,
+          timestamp: 5000,
+        },
+        {
+          segmentId: undefined,
+          participantId: 'bob',
+          participantName: undefined,
+          text: 'Hi',
+          isFinal: false,
+          confidence: undefined,
+          timestamp: 5700,
+        },
+      ],
+    })
+  })
+
+  it('should reject unknown handles and participant indexes', async () => {
+    await expect(expandInteraction({ h: 'missing', s: 'user', x: 'Hello', t: 1 })).rejects.toBeInstanceOf(
+      UnknownAgentSessionError
+    )
+
+    const handle = await AgentSessionService.register(session)
+    await expect(
+      expandSegmentBatch({ h: handle, t: 0, s: [[null, 5, 'Hello', true, null, 0]] })
+    ).rejects.toBeInstanceOf(UnknownAgentSessionError)
+  })
+})
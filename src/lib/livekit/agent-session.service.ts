@@ -0,0 +1,38 @@
+import { randomBytes } from 'crypto'
+import { redis } from '@/lib/queue/config'
+
+const SESSION_PREFIX = 'dialoglens:agent-session:'
+const SESSION_TTL_SECONDS = Number(process.env.AGENT_SESSION_TTL_SECONDS || 86400)
+
+export interface AgentSession {
+  roomId: string
+  // Interaction metadata shared by every upload from the room (agentType, customerContext)
+  context: Record<string, unknown> | null
+  // [identity, name] pairs; compact segments refer to them by position
+  participants: [string, string][]
+}
+
+export class AgentSessionService {
+  /**
+   * Register a room's static upload context and return its session handle.
+   *
+   * Agents register again with their handle when the context changes or a
+   * participant joins; the handle is kept and the session replaced. A handle
+   * that expired or belongs to another room gets a new one.
+   */
+  static async register(session: AgentSession, handle?: string): Promise<string> {
+    if (handle) {
+      const existing = await this.get(handle)
+      if (existing?.roomId !== session.roomId) handle = undefined
+    }
+    handle ??= randomBytes(9).toString('base64url')
+
+    await redis.set(SESSION_PREFIX + handle, JSON.stringify(session), 'EX', SESSION_TTL_SECONDS)
+    return handle
+  }
+
+  static async get(handle: string): Promise<AgentSession | null> {
+    const raw = await redis.get(SESSION_PREFIX + handle)
+    return raw ? (JSON.parse(raw) as AgentSession) : null
+  }
+}
@@ -37,6 +37,8 @@ export class LiveKitRoomService {
     // Generate unique room ID
     const liveKitRoomId = `room-${Date.now()}-${Math.random().toString(36).substring(2, 9)}`
     
+    const maxParticipants = options.maxParticipants || 100
+    
     // Create LiveKit room
     const roomMetadata = {
       ...metadata,
@@ -48,12 +50,14 @@ export class LiveKitRoomService {
       // Agent dispatch info for agents to check
       requiresTranscription: enableTranscriptionAgent,
       requiresCustomerAgent: enableCustomerAgent,
+      // Agents only transcribe from their own session in single-participant rooms
+      maxParticipants,
     }
 
     const createRequest = {
       name: liveKitRoomId,
       emptyTimeout: options.emptyTimeout || 300, // 5 minutes default
-      maxParticipants: options.maxParticipants || 100,
+      maxParticipants,
       metadata: JSON.stringify(roomMetadata),
     } as any
     
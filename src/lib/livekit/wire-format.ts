@@ -0,0 +1,99 @@
+import { gunzipSync } from 'zlib'
+import { unpack } from 'msgpackr'
+import { z } from 'zod'
+import { AgentSessionService } from './agent-session.service'
+
+/**
+ * Compact upload format sent by agents running with UPLOAD_WIRE_FORMAT=compact
+ * (docker/agent/wire_format.py). Bodies are msgpack, gzipped for large
+ * batches, and refer to a session registered at /api/agent/sessions for the
+ * room id, interaction metadata and participant names. The helpers here
+ * expand them back into the JSON payloads the routes already accept.
+ */
+
+export const COMPACT_CONTENT_TYPE = 'application/msgpack'
+
+// Routes answer 410 so the agent registers its session again
+export class UnknownAgentSessionError extends Error {
+  constructor(handle: string) {
+    super(`Unknown agent session: ${handle}`)
+    this.name = 'UnknownAgentSessionError'
+  }
+}
+
+const binary = z.custom<Uint8Array>(value => value instanceof Uint8Array)
+
+const compactInteractionSchema = z.object({
+  h: z.string().min(1),
+  i: z.string().nullable().optional(),
+  s: z.string(),
+  x: z.string(),
+  t: z.number(),
+})
+
+const compactSegmentBatchSchema = z.object({
+  h: z.string().min(1),
+  t: z.number(),
+  s: z.array(
+    z.tuple([
+      z.union([binary, z.string(), z.null()]), // segmentId, 16 raw bytes for uuid hex ids
+      z.number().int().nonnegative(), // participant index in the session
+      z.string(), // text
+      z.boolean(), // isFinal
+      z.number().nullable(), // confidence
+      z.number(), // timestamp offset from t
+    ])
+  ),
+})
+
+export function isCompactRequest(req: Request): boolean {
+  return req.headers.get('content-type')?.startsWith(COMPACT_CONTENT_TYPE) ?? false
+}
+
+export async function readCompactBody(req: Request): Promise<unknown> {
+  let body = Buffer.from(await req.arrayBuffer())
+  if (req.headers.get('content-encoding') === 'gzip') {
+    body = gunzipSync(body)
+  }
+  return unpack(body)
+}
+
+export async function expandInteraction(message: unknown) {
+  const { h, i, s, x, t } = compactInteractionSchema.parse(message)
+  const session = await AgentSessionService.get(h)
+  if (!session) throw new UnknownAgentSessionError(h)
+
+  return {
+    interactionId: i ?? undefined,
+    roomId: session.roomId,
+    speaker: s,
+    text: x,
+    timestamp: t,
+    metadata: session.context ?? undefined,
+  }
+}
+
+export async function expandSegmentBatch(message: unknown) {
+  const { h, t, s } = compactSegmentBatchSchema.parse(message)
+  const session = await AgentSessionService.get(h)
+  if (!session) throw new UnknownAgentSessionError(h)
+
+  return {
+    roomId: session.roomId,
+    segments: s.map(([segmentId, index, text, isFinal, confidence, offset]) => {
+      const participant = session.participants[index]
+      // Indexes only grow with re-registration, so a miss is a stale session
+      if (!participant) throw new UnknownAgentSessionError(h)
+
+      return {
+        segmentId: segmentId instanceof Uint8Array ? Buffer.from(segmentId).toString('hex') : segmentId ?? undefined,
+        participantId: participant[0],
+        participantName: participant[1] || undefined,
+        text,
+        isFinal,
+        confidence: confidence ?? undefined,
+        timestamp: t + offset,
+      }
+    }),
+  }
+}
@@ -3,8 +3,10 @@ import { Job } from 'bullmq'
 import { TranscriptionProcessor } from '../processors/transcription.processor'
 import { EgressProcessor } from '../processors/egress.processor'
 import { NotificationProcessor } from '../processors/notification.processor'
+import { SegmentStreamProcessor } from '../processors/segment-stream.processor'
 import { prisma } from '@/lib/prisma'
 import { EgressService } from '@/lib/livekit/egress.service'
+import { SegmentIngestService } from '@/lib/transcription/ingest.service'
 
 vi.mock('@/lib/prisma', () => ({
   prisma: {
@@ -46,6 +48,12 @@ vi.mock('@/lib/transcription/storage.service', () => ({
   },
 }))
 
+vi.mock('@/lib/transcription/ingest.service', () => ({
+  SegmentIngestService: {
+    ingestBatch: vi.fn(),
+  },
+}))
+
 vi.mock('@/lib/livekit/egress.service', () => ({
   EgressService: {
     startRecording: vi.fn(),
@@ -242,4 +250,94 @@ describe('Processors', () => {
       await expect(processor['process'](mockJob)).rejects.toThrow('Conversation conv-123 not found')
     })
   })
+
+  describe('SegmentStreamProcessor', () => {
+    let processor: SegmentStreamProcessor
+    let ack: ReturnType<typeof vi.fn>
+    let deadLetter: ReturnType<typeof vi.fn>
+    let deliveries: ReturnType<typeof vi.fn>
+
+    const entry = (id: string, data: Record<string, unknown>): [string, string[]] => [
+      id,
+      ['data', JSON.stringify(data)],
+    ]
+
+    beforeEach(() => {
+      processor = new SegmentStreamProcessor()
+      ack = vi.fn().mockResolvedValue(undefined)
+      deadLetter = vi.fn().mockResolvedValue(undefined)
+      deliveries = vi.fn().mockResolvedValue(new Map())
+      processor['ack'] = ack
+      processor['deadLetter'] = deadLetter
+      processor['deliveries'] = deliveries
+    })
+
+    afterEach(async () => {
+      await processor.close()
+    })
+
+    it('should ingest stream entries in one batch per room', async () => {
+      vi.mocked(SegmentIngestService.ingestBatch)
+        .mockResolvedValueOnce({ conversationId: 'conv-1', inserted: 2, duplicates: 0 })
+        .mockResolvedValueOnce({ conversationId: 'conv-2', inserted: 1, duplicates: 0 })
+
+      const result = await processor['process']([
+        entry('1-0', { roomId: 'room-a', participantId: 'alice', text: 'Hello', isFinal: true, timestamp: 1000 }),
+        entry('2-0', { roomId: 'room-b', participantId: 'bob', text: 'Hi', isFinal: true, timestamp: 1500 }),
+        entry('3-0', { roomId: 'room-a', participantId: 'alice', text: 'Again', isFinal: true, timestamp: 2000 }),
+      ])
+
+      expect(SegmentIngestService.ingestBatch).toHaveBeenCalledTimes(2)
+      expect(SegmentIngestService.ingestBatch).toHaveBeenCalledWith('room-a', [
+        { participantId: 'alice', text: 'Hello', isFinal: true, timestamp: 1000 },
+        { participantId: 'alice', text: 'Again', isFinal: true, timestamp: 2000 },
+      ])
+      expect(ack).toHaveBeenCalledWith(['1-0', '3-0'])
+      expect(ack).toHaveBeenCalledWith(['2-0'])
+      expect(result).toEqual({ inserted: 3, failed: 0 })
+    })
+
+    it('should dead-letter invalid entries and acknowledge unknown rooms', async () => {
+      vi.mocked(SegmentIngestService.ingestBatch).mockResolvedValueOnce(null)
+      const invalid = entry('3-0', { roomId: 'room-a', text: 'No speaker', isFinal: true, timestamp: 1000 })
+
+      await processor['process']([
+        ['1-0', ['data', 'not json']],
+        entry('2-0', { roomId: 'missing', participantId: 'alice', text: 'Hello', isFinal: true, timestamp: 1000 }),
+        invalid,
+      ])
+
+      expect(deadLetter).toHaveBeenCalledWith([['1-0', ['data', 'not json']], invalid], 'malformed entry')
+      expect(SegmentIngestService.ingestBatch).toHaveBeenCalledTimes(1)
+      expect(ack).toHaveBeenCalledWith(['2-0'])
+    })
+
+    it('should leave entries pending when the write fails without blocking other rooms', async () => {
+      vi.mocked(SegmentIngestService.ingestBatch)
+        .mockRejectedValueOnce(new Error('DB down'))
+        .mockResolvedValueOnce({ conversationId: 'conv-2', inserted: 1, duplicates: 0 })
+      deliveries.mockResolvedValueOnce(new Map([['1-0', 1]]))
+
+      const result = await processor['process']([
+        entry('1-0', { roomId: 'room-a', participantId: 'alice', text: 'Hello', isFinal: true, timestamp: 1000 }),
+        entry('2-0', { roomId: 'room-b', participantId: 'bob', text: 'Hi', isFinal: true, timestamp: 1500 }),
+      ])
+
+      expect(result).toEqual({ inserted: 1, failed: 1 })
+      expect(ack).toHaveBeenCalledTimes(1)
+      expect(ack).toHaveBeenCalledWith(['2-0'])
+      expect(deadLetter).not.toHaveBeenCalled()
+    })
+
+    it('should dead-letter an entry that keeps failing', async () => {
+      vi.mocked(SegmentIngestService.ingestBatch).mockRejectedValueOnce(new Error('DB down'))
+      deliveries.mockResolvedValueOnce(new Map([['1-0', 5]]))
+      const failing = entry('1-0', { roomId: 'room-a', participantId: 'alice', text: 'Hello', isFinal: true, timestamp: 1000 })
+
+      await processor['process']([failing])
+
+      expect(deliveries).toHaveBeenCalledWith(['1-0'])
+      expect(deadLetter).toHaveBeenCalledWith([failing], 'DB down')
+    })
+  })
 })
\ No newline at end of file
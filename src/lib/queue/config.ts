@@ -30,4 +30,13 @@ export const QUEUE_NAMES = {
   NOTIFICATION: 'notification',
 } as const
 
-export type QueueName = typeof QUEUE_NAMES[keyof typeof QUEUE_NAMES]
\ No newline at end of file
+export type QueueName = typeof QUEUE_NAMES[keyof typeof QUEUE_NAMES]
+
+// Redis Streams written directly by the LiveKit agents
+export const STREAM_NAMES = {
+  TRANSCRIPT_SEGMENTS: process.env.SEGMENT_STREAM || 'dialoglens:transcript-segments',
+  // Entries that were malformed or kept failing, with the error that retired them
+  TRANSCRIPT_SEGMENTS_DEAD: process.env.SEGMENT_DEAD_LETTER_STREAM || 'dialoglens:transcript-segments:dead',
+} as const
+
+export const SEGMENT_STREAM_GROUP = 'segment-ingest'
\ No newline at end of file
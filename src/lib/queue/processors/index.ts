@@ -1,3 +1,4 @@
 export { TranscriptionProcessor } from './transcription.processor'
 export { EgressProcessor } from './egress.processor'
-export { NotificationProcessor } from './notification.processor'
\ No newline at end of file
+export { NotificationProcessor } from './notification.processor'
+export { SegmentStreamProcessor } from './segment-stream.processor'
\ No newline at end of file
@@ -0,0 +1,212 @@
+import { hostname } from 'os'
+import type Redis from 'ioredis'
+import { z } from 'zod'
+import { redis, STREAM_NAMES, SEGMENT_STREAM_GROUP } from '../config'
+import type { SegmentStreamEntry } from '../types'
+import { SegmentIngestService } from '@/lib/transcription/ingest.service'
+import type { LiveSegmentInput } from '@/lib/transcription/types'
+
+type StreamEntry = [id: string, fields: string[]]
+
+const BATCH_SIZE = 500
+const BLOCK_MS = 1000
+// Pending entries idle this long were failed or abandoned by a consumer; claim them again
+const CLAIM_IDLE_MS = 30_000
+const RECLAIM_INTERVAL_MS = 15_000
+// Deliveries after which a failing entry moves to the dead-letter stream
+const MAX_DELIVERIES = 5
+const DEAD_LETTER_MAXLEN = 10_000
+
+const segmentStreamEntrySchema: z.ZodType<SegmentStreamEntry, z.ZodTypeDef, unknown> = z.object({
+  roomId: z.string().min(1),
+  segmentId: z.string().min(1).optional(),
+  participantId: z.string().min(1),
+  participantName: z.string().optional(),
+  text: z.string(),
+  isFinal: z.boolean().default(true),
+  confidence: z.number().optional(),
+  timestamp: z.number(),
+})
+
+export class SegmentStreamProcessor {
+  private connection: Redis
+  private consumer: string
+  private running = true
+  private groupReady = false
+  private loop: Promise<void>
+
+  constructor() {
+    // Blocking reads need their own connection
+    this.connection = redis.duplicate()
+    // Stable across restarts, so a restarted worker owns the entries it left pending
+    this.consumer = process.env.SEGMENT_STREAM_CONSUMER || `${SEGMENT_STREAM_GROUP}-${hostname()}`
+    this.loop = this.run()
+  }
+
+  private async run() {
+    let nextReclaim = 0
+
+    while (this.running) {
+      try {
+        await this.ensureGroup()
+
+        // On start and then periodically, retry what failed here or was left by a crashed consumer
+        if (Date.now() >= nextReclaim) {
+          await this.reclaim()
+          nextReclaim = Date.now() + RECLAIM_INTERVAL_MS
+        }
+
+        const result = (await this.connection.xreadgroup(
+          'GROUP', SEGMENT_STREAM_GROUP, this.consumer,
+          'COUNT', BATCH_SIZE,
+          'BLOCK', BLOCK_MS,
+          'STREAMS', STREAM_NAMES.TRANSCRIPT_SEGMENTS, '>'
+        )) as [string, StreamEntry[]][] | null
+
+        const entries = result?.[0]?.[1] ?? []
+        if (entries.length > 0) {
+          await this.process(entries)
+        }
+      } catch (error) {
+        if (!this.running) break
+        // Unacknowledged entries stay pending until reclaim picks them up
+        console.error('Segment stream processing failed:', error)
+        await new Promise(resolve => setTimeout(resolve, BLOCK_MS))
+      }
+    }
+  }
+
+  private async reclaim() {
+    let start = '0-0'
+    do {
+      const [next, entries] = (await this.connection.xautoclaim(
+        STREAM_NAMES.TRANSCRIPT_SEGMENTS, SEGMENT_STREAM_GROUP, this.consumer,
+        CLAIM_IDLE_MS, start, 'COUNT', BATCH_SIZE
+      )) as [string, (StreamEntry | null)[]]
+
+      // Redis 6.2 reports entries trimmed from the stream as nil
+      const claimed = entries.filter((entry): entry is StreamEntry => entry !== null)
+      if (claimed.length > 0) {
+        await this.process(claimed)
+      }
+      start = next
+    } while (start !== '0-0' && this.running)
+  }
+
+  private async ensureGroup() {
+    if (this.groupReady) return
+    try {
+      await this.connection.xgroup(
+        'CREATE', STREAM_NAMES.TRANSCRIPT_SEGMENTS, SEGMENT_STREAM_GROUP, '0', 'MKSTREAM'
+      )
+    } catch (error) {
+      if (!(error instanceof Error) || !error.message.includes('BUSYGROUP')) throw error
+    }
+    this.groupReady = true
+  }
+
+  private async process(entries: StreamEntry[]) {
+    // Group entries by room so each room is written in one transaction
+    const rooms = new Map<string, { entries: StreamEntry[]; segments: LiveSegmentInput[] }>()
+    const malformed: StreamEntry[] = []
+
+    for (const entry of entries) {
+      const parsed = segmentStreamEntrySchema.safeParse(parseData(entry[1]))
+      if (!parsed.success) {
+        malformed.push(entry)
+        continue
+      }
+      const { roomId, ...segment } = parsed.data
+      const room = rooms.get(roomId) ?? { entries: [], segments: [] }
+      room.entries.push(entry)
+      room.segments.push(segment)
+      rooms.set(roomId, room)
+    }
+
+    if (malformed.length > 0) {
+      console.error(`Dead-lettering ${malformed.length} malformed segment stream entries`)
+      await this.deadLetter(malformed, 'malformed entry')
+    }
+
+    let inserted = 0
+    let failed = 0
+    for (const [roomId, room] of rooms) {
+      const ids = room.entries.map(([id]) => id)
+      try {
+        const result = await SegmentIngestService.ingestBatch(roomId, room.segments)
+        if (!result) {
+          console.warn(`Dropping ${ids.length} stream segments for unknown room ${roomId}`)
+        } else {
+          inserted += result.inserted
+        }
+        await this.ack(ids)
+      } catch (error) {
+        // Left pending for reclaim; one room's failure never holds up the others
+        console.error(`Segment stream ingest failed for room ${roomId}:`, error)
+        failed += ids.length
+        await this.retireExhausted(room.entries, error)
+      }
+    }
+
+    return { inserted, failed }
+  }
+
+  private async retireExhausted(entries: StreamEntry[], error: unknown) {
+    const counts = await this.deliveries(entries.map(([id]) => id))
+    const exhausted = entries.filter(([id]) => (counts.get(id) ?? 0) >= MAX_DELIVERIES)
+    if (exhausted.length === 0) return
+
+    console.error(`Dead-lettering ${exhausted.length} segment stream entries after ${MAX_DELIVERIES} deliveries`)
+    await this.deadLetter(exhausted, error instanceof Error ? error.message : String(error))
+  }
+
+  private async deliveries(ids: string[]): Promise<Map<string, number>> {
+    const pipeline = this.connection.pipeline()
+    for (const id of ids) {
+      pipeline.xpending(STREAM_NAMES.TRANSCRIPT_SEGMENTS, SEGMENT_STREAM_GROUP, id, id, 1)
+    }
+    const counts = new Map<string, number>()
+    for (const [error, result] of (await pipeline.exec()) ?? []) {
+      if (error) throw error
+      // [[id, consumer, idle ms, delivery count]]
+      for (const [id, , , count] of result as [string, string, number, number][]) {
+        counts.set(id, count)
+      }
+    }
+    return counts
+  }
+
+  private async deadLetter(entries: StreamEntry[], reason: string) {
+    const pipeline = this.connection.pipeline()
+    for (const [id, fields] of entries) {
+      pipeline.xadd(
+        STREAM_NAMES.TRANSCRIPT_SEGMENTS_DEAD, 'MAXLEN', '~', DEAD_LETTER_MAXLEN, '*',
+        ...fields, 'sourceId', id, 'error', reason
+      )
+    }
+    for (const [error] of (await pipeline.exec()) ?? []) {
+      if (error) throw error
+    }
+    await this.ack(entries.map(([id]) => id))
+  }
+
+  private async ack(ids: string[]) {
+    await this.connection.xack(STREAM_NAMES.TRANSCRIPT_SEGMENTS, SEGMENT_STREAM_GROUP, ...ids)
+  }
+
+  async close() {
+    this.running = false
+    this.connection.disconnect()
+    await this.loop
+  }
+}
+
+function parseData(fields: string[]): unknown {
+  const index = fields.indexOf('data')
+  if (index < 0) return undefined
+  try {
+    return JSON.parse(fields[index + 1])
+  } catch {
+    return undefined
+  }
+}
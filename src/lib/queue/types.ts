@@ -16,4 +16,16 @@ export interface NotificationJobData {
   metadata?: Record<string, any>
 }
 
+// Entry written by the agents' Redis Streams transport (JSON in the `data` field)
+export interface SegmentStreamEntry {
+  roomId: string
+  segmentId?: string
+  participantId: string
+  participantName?: string
+  text: string
+  isFinal: boolean
+  confidence?: number
+  timestamp: number
+}
+
 export type JobData = TranscriptionJobData | EgressJobData | NotificationJobData
\ No newline at end of file
@@ -1,8 +1,14 @@
-import { TranscriptionProcessor, EgressProcessor, NotificationProcessor } from './processors'
+import {
+  TranscriptionProcessor,
+  EgressProcessor,
+  NotificationProcessor,
+  SegmentStreamProcessor,
+} from './processors'
 
 let transcriptionProcessor: TranscriptionProcessor | null = null
 let egressProcessor: EgressProcessor | null = null
 let notificationProcessor: NotificationProcessor | null = null
+let segmentStreamProcessor: SegmentStreamProcessor | null = null
 
 export function initializeWorkers() {
   if (process.env.NODE_ENV === 'test') {
@@ -24,6 +30,11 @@ export function initializeWorkers() {
     notificationProcessor = new NotificationProcessor()
     console.log('Notification processor initialized')
   }
+
+  if (!segmentStreamProcessor) {
+    segmentStreamProcessor = new SegmentStreamProcessor()
+    console.log('Segment stream processor initialized')
+  }
 }
 
 export async function shutdownWorkers() {
@@ -44,6 +55,11 @@ export async function shutdownWorkers() {
     notificationProcessor = null
   }
 
+  if (segmentStreamProcessor) {
+    shutdownPromises.push(segmentStreamProcessor.close())
+    segmentStreamProcessor = null
+  }
+
   await Promise.all(shutdownPromises)
   console.log('All workers shut down')
 }
\ No newline at end of file
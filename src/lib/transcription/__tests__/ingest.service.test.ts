@@ -0,0 +1,140 @@
+import { describe, it, expect, vi, beforeEach } from 'vitest'
+import { Prisma } from '@prisma/client'
+import { SegmentIngestService } from '../ingest.service'
+import { prisma } from '@/lib/prisma'
+
+vi.mock('@/lib/prisma', () => {
+  const tx = {
+    room: { findUnique: vi.fn() },
+    conversation: { create: vi.fn() },
+    transcript: { upsert: vi.fn() },
+    participant: { findMany: vi.fn(), create: vi.fn() },
+    segment: { createMany: vi.fn(), findMany: vi.fn() },
+  }
+  return {
+    prisma: {
+      ...tx,
+      $transaction: vi.fn((fn: (client: typeof tx) => unknown) => fn(tx)),
+    },
+  }
+})
+
+describe('SegmentIngestService', () => {
+  const segments = [
+    { participantId: 'alice', participantName: 'Alice', text: 'Hello', isFinal: true, confidence: 0.9, timestamp: 1000 },
+    { participantId: 'bob', participantName: 'Bob', text: 'Hi', isFinal: true, confidence: 0.8, timestamp: 2000 },
+    { participantId: 'alice', participantName: 'Alice', text: 'How are you?', isFinal: true, confidence: 0.95, timestamp: 3000 },
+  ]
+
+  beforeEach(() => {
+    vi.clearAllMocks()
+    vi.mocked(prisma.segment.findMany).mockResolvedValue([])
+    vi.mocked(prisma.transcript.upsert).mockResolvedValue({ id: 'transcript-1' } as any)
+  })
+
+  it('should return null when the room does not exist', async () => {
+    vi.mocked(prisma.room.findUnique).mockResolvedValue(null)
+
+    const result = await SegmentIngestService.ingestBatch('missing-room', segments)
+
+    expect(result).toBeNull()
+    expect(prisma.segment.createMany).not.toHaveBeenCalled()
+  })
+
+  it('should resolve participants once and insert all segments together', async () => {
+    vi.mocked(prisma.room.findUnique).mockResolvedValue({
+      id: 'room-1',
+      conversations: [{ id: 'conv-1', status: 'RECORDING' }],
+    } as any)
+    vi.mocked(prisma.participant.findMany).mockResolvedValue([
+      { id: 'participant-alice', liveKitIdentity: 'alice', name: 'Alice' },
+    ] as any)
+    vi.mocked(prisma.participant.create).mockResolvedValue({ id: 'participant-bob', name: 'Bob' } as any)
+    vi.mocked(prisma.segment.createMany).mockResolvedValue({ count: 3 })
+
+    const result = await SegmentIngestService.ingestBatch('livekit-room', segments)
+
+    expect(result).toEqual({ conversationId: 'conv-1', inserted: 3, duplicates: 0 })
+    expect(prisma.room.findUnique).toHaveBeenCalledTimes(1)
+    expect(prisma.participant.findMany).toHaveBeenCalledTimes(1)
+    expect(prisma.participant.create).toHaveBeenCalledTimes(1)
+    expect(prisma.transcript.upsert).toHaveBeenCalledWith(
+      expect.objectContaining({ where: { conversationId: 'conv-1' }, update: {} })
+    )
+
+    const { data } = vi.mocked(prisma.segment.createMany).mock.calls[0][0] as any
+    expect(data).toHaveLength(3)
+    expect(data.every((s: any) => s.transcriptId === 'transcript-1')).toBe(true)
+    expect(data.map((s: any) => s.speakerLabel)).toEqual(['Alice', 'Bob', 'Alice'])
+  })
+
+  it('should start a conversation when none is recording', async () => {
+    vi.mocked(prisma.room.findUnique).mockResolvedValue({
+      id: 'room-1',
+      conversations: [],
+    } as any)
+    vi.mocked(prisma.conversation.create).mockResolvedValue({ id: 'conv-new' } as any)
+    vi.mocked(prisma.participant.findMany).mockResolvedValue([])
+    vi.mocked(prisma.participant.create)
+      .mockResolvedValueOnce({ id: 'participant-alice', name: 'Alice' } as any)
+      .mockResolvedValueOnce({ id: 'participant-bob', name: 'Bob' } as any)
+    vi.mocked(prisma.segment.createMany).mockResolvedValue({ count: 3 })
+
+    const result = await SegmentIngestService.ingestBatch('livekit-room', segments)
+
+    expect(result).toEqual({ conversationId: 'conv-new', inserted: 3, duplicates: 0 })
+    expect(prisma.conversation.create).toHaveBeenCalledWith({
+      data: expect.objectContaining({ roomId: 'room-1', status: 'RECORDING' }),
+    })
+    expect(prisma.participant.create).toHaveBeenCalledTimes(2)
+  })
+
+  it('should skip segments that were already stored', async () => {
+    vi.mocked(prisma.room.findUnique).mockResolvedValue({
+      id: 'room-1',
+      conversations: [{ id: 'conv-1', status: 'RECORDING' }],
+    } as any)
+    vi.mocked(prisma.segment.findMany).mockResolvedValue([{ idempotencyKey: 'seg-1' }] as any)
+    vi.mocked(prisma.participant.findMany).mockResolvedValue([
+      { id: 'participant-alice', liveKitIdentity: 'alice', name: 'Alice' },
+    ] as any)
+    vi.mocked(prisma.segment.createMany).mockResolvedValue({ count: 1 })
+
+    const result = await SegmentIngestService.ingestBatch('livekit-room', [
+      { ...segments[0], segmentId: 'seg-1' },
+      { ...segments[2], segmentId: 'seg-2' },
+      { ...segments[2], segmentId: 'seg-2' },
+    ])
+
+    expect(result).toEqual({ conversationId: 'conv-1', inserted: 1, duplicates: 2 })
+    const { data } = vi.mocked(prisma.segment.createMany).mock.calls[0][0] as any
+    expect(data).toHaveLength(1)
+    expect(data[0].idempotencyKey).toBe('seg-2')
+  })
+
+  it('should retry when a concurrent replay stored the same segments first', async () => {
+    vi.mocked(prisma.room.findUnique).mockResolvedValue({
+      id: 'room-1',
+      conversations: [{ id: 'conv-1', status: 'RECORDING' }],
+    } as any)
+    vi.mocked(prisma.participant.findMany).mockResolvedValue([
+      { id: 'participant-alice', liveKitIdentity: 'alice', name: 'Alice' },
+    ] as any)
+    vi.mocked(prisma.segment.createMany).mockRejectedValueOnce(
+      new Prisma.PrismaClientKnownRequestError('Unique constraint failed', {
+        code: 'P2002',
+        clientVersion: 'test',
+      })
+    )
+    vi.mocked(prisma.segment.findMany)
+      .mockResolvedValueOnce([])
+      .mockResolvedValueOnce([{ idempotencyKey: 'seg-1' }] as any)
+
+    const result = await SegmentIngestService.ingestBatch('livekit-room', [
+      { ...segments[0], segmentId: 'seg-1' },
+    ])
+
+    expect(result).toEqual({ conversationId: 'conv-1', inserted: 0, duplicates: 1 })
+    expect(prisma.$transaction).toHaveBeenCalledTimes(2)
+  })
+})
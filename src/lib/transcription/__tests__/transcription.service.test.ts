@@ -2,17 +2,20 @@ import { describe, it, expect, vi, beforeEach } from 'vitest'
 import { TranscriptionService } from '../transcription.service'
 import { prisma } from '@/lib/prisma'
 
-vi.mock('@/lib/prisma', () => ({
-  prisma: {
+vi.mock('@/lib/prisma', () => {
+  const prisma = {
     transcript: {
-      create: vi.fn(),
+      upsert: vi.fn(),
       findUnique: vi.fn(),
     },
     segment: {
       create: vi.fn(),
+      deleteMany: vi.fn(),
     },
-  },
-}))
+    $transaction: vi.fn((fn: (client: unknown) => unknown) => fn(prisma)),
+  }
+  return { prisma }
+})
 
 vi.mock('../config', () => ({
   getSpeechClient: vi.fn(() => ({
@@ -142,7 +145,7 @@ describe('TranscriptionService', () => {
         confidence: 0.95,
       }
       
-      vi.mocked(prisma.transcript.create).mockResolvedValue({
+      vi.mocked(prisma.transcript.upsert).mockResolvedValue({
         id: 'transcript-123',
         conversationId,
         content: JSON.stringify(result),
@@ -175,16 +178,28 @@ describe('TranscriptionService', () => {
       expect(saved.transcript).toBeDefined()
       expect(saved.segments).toHaveLength(1)
       
-      expect(prisma.transcript.create).toHaveBeenCalledWith({
-        data: {
+      expect(prisma.transcript.upsert).toHaveBeenCalledWith({
+        where: { conversationId },
+        create: {
           conversationId,
           content: JSON.stringify(result),
           rawContent: result.fullText,
           processingTime: 1000,
           wordCount: 2,
         },
+        update: {
+          content: JSON.stringify(result),
+          rawContent: result.fullText,
+          processingTime: 1000,
+          wordCount: 2,
+        },
       })
       
+      // Live segments on the same transcript are replaced, not kept alongside
+      expect(prisma.segment.deleteMany).toHaveBeenCalledWith({
+        where: { transcriptId: 'transcript-123' },
+      })
+
       expect(prisma.segment.create).toHaveBeenCalledWith({
         data: {
           transcriptId: 'transcript-123',
@@ -1,4 +1,5 @@
 export { TranscriptionService } from './transcription.service'
 export { StorageService } from './storage.service'
+export { SegmentIngestService } from './ingest.service'
 export * from './types'
 export * from './config'
\ No newline at end of file
@@ -0,0 +1,146 @@
+import { Prisma } from '@prisma/client'
+import { prisma } from '@/lib/prisma'
+import { ConversationStatus } from '@/lib/db/types'
+import type { LiveSegmentInput, LiveSegmentBatchResult } from './types'
+
+type TransactionClient = Prisma.TransactionClient
+
+// Attempts before a unique constraint conflict is returned to the caller
+const MAX_ATTEMPTS = 3
+
+export class SegmentIngestService {
+  /**
+   * Persist a batch of live transcript segments for a room.
+   *
+   * The room, recording conversation, its transcript and participants are
+   * resolved once per batch and all segments are inserted in a single
+   * transaction. Segments whose segmentId was already stored (agent spool
+   * replays) are skipped. Returns null when the room does not exist.
+   */
+  static async ingestBatch(
+    roomId: string,
+    batch: LiveSegmentInput[]
+  ): Promise<LiveSegmentBatchResult | null> {
+    for (let attempt = 1; ; attempt++) {
+      try {
+        return await prisma.$transaction(tx => this.insertBatch(tx, roomId, batch))
+      } catch (error) {
+        // Another replay of the same segments committed between our duplicate
+        // check and insert; the retry sees its rows and skips them
+        if (!isUniqueViolation(error) || attempt >= MAX_ATTEMPTS) throw error
+      }
+    }
+  }
+
+  private static async insertBatch(
+    tx: TransactionClient,
+    roomId: string,
+    batch: LiveSegmentInput[]
+  ): Promise<LiveSegmentBatchResult | null> {
+    const room = await tx.room.findUnique({
+      where: { liveKitRoomId: roomId },
+      include: {
+        conversations: {
+          where: { status: ConversationStatus.RECORDING },
+          orderBy: { startTime: 'desc' },
+          take: 1,
+        },
+      },
+    })
+
+    if (!room) return null
+
+    const segments = await this.dropDuplicates(tx, batch)
+    const duplicates = batch.length - segments.length
+    if (segments.length === 0) {
+      return { conversationId: room.conversations[0]?.id ?? '', inserted: 0, duplicates }
+    }
+
+    // Get or create the recording conversation
+    const conversation = room.conversations[0] ?? await tx.conversation.create({
+      data: {
+        roomId: room.id,
+        startTime: new Date(),
+        status: ConversationStatus.RECORDING,
+      },
+    })
+
+    // Live segments hang off the conversation's transcript until the recording
+    // transcription finishes; saveTranscription then replaces its content and
+    // deletes these segments in favour of the recording's own
+    const transcript = await tx.transcript.upsert({
+      where: { conversationId: conversation.id },
+      create: {
+        conversationId: conversation.id,
+        content: JSON.stringify({ liveTranscription: true }),
+      },
+      update: {},
+    })
+
+    // Resolve every participant in the batch with one lookup
+    const identities = Array.from(new Set(segments.map(s => s.participantId)))
+    const existing = await tx.participant.findMany({
+      where: {
+        conversationId: conversation.id,
+        liveKitIdentity: { in: identities },
+      },
+    })
+    const speakerLabels = new Map<string, string>(
+      existing.map((p: { liveKitIdentity: string; name: string }) => [p.liveKitIdentity, p.name])
+    )
+
+    for (const identity of identities) {
+      if (speakerLabels.has(identity)) continue
+
+      const first = segments.find(s => s.participantId === identity)!
+      const participant = await tx.participant.create({
+        data: {
+          conversationId: conversation.id,
+          liveKitIdentity: identity,
+          name: first.participantName || identity,
+          joinedAt: new Date(first.timestamp),
+        },
+      })
+      speakerLabels.set(identity, participant.name)
+    }
+
+    const { count } = await tx.segment.createMany({
+      data: segments.map(segment => ({
+        transcriptId: transcript.id,
+        speakerLabel: speakerLabels.get(segment.participantId)!,
+        text: segment.text,
+        startTime: segment.timestamp / 1000, // Convert to seconds
+        endTime: (segment.timestamp + 1000) / 1000, // Approximate 1 second duration
+        confidence: segment.confidence,
+        idempotencyKey: segment.segmentId,
+      })),
+    })
+
+    return { conversationId: conversation.id, inserted: count, duplicates }
+  }
+
+  private static async dropDuplicates(
+    tx: Pick<TransactionClient, 'segment'>,
+    segments: LiveSegmentInput[]
+  ): Promise<LiveSegmentInput[]> {
+    const keys = segments.map(s => s.segmentId).filter((k): k is string => !!k)
+    if (keys.length === 0) return segments
+
+    const stored = await tx.segment.findMany({
+      where: { idempotencyKey: { in: keys } },
+      select: { idempotencyKey: true },
+    })
+    const seen = new Set(stored.map((s: { idempotencyKey: string | null }) => s.idempotencyKey))
+
+    return segments.filter(segment => {
+      if (!segment.segmentId) return true
+      if (seen.has(segment.segmentId)) return false
+      seen.add(segment.segmentId)
+      return true
+    })
+  }
+}
+
+function isUniqueViolation(error: unknown): boolean {
+  return error instanceof Prisma.PrismaClientKnownRequestError && error.code === 'P2002'
+}
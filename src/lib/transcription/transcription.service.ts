@@ -136,35 +136,44 @@ export class TranscriptionService {
     result: TranscriptionResult,
     processingTime: number
   ) {
-    // Create transcript record
-    const transcript = await prisma.transcript.create({
-      data: {
-        conversationId,
-        content: JSON.stringify(result),
-        rawContent: result.fullText,
-        processingTime,
-        wordCount: result.wordCount,
-      },
-    })
+    const data = {
+      content: JSON.stringify(result),
+      rawContent: result.fullText,
+      processingTime,
+      wordCount: result.wordCount,
+    }
 
-    // Create segment records
-    const segments = await Promise.all(
-      result.segments.map((segment, index) =>
-        prisma.segment.create({
-          data: {
-            transcriptId: transcript.id,
-            speakerLabel: `Speaker ${segment.speakerTag}`,
-            text: segment.text,
-            startTime: segment.startTime,
-            endTime: segment.endTime,
-            confidence: this.calculateSegmentConfidence(segment),
-            words: JSON.stringify(segment.words),
-          },
-        })
+    return prisma.$transaction(async tx => {
+      // Create the transcript record, or fill in the one live segments created
+      const transcript = await tx.transcript.upsert({
+        where: { conversationId },
+        create: { conversationId, ...data },
+        update: data,
+      })
+
+      // Live segments are stamped in epoch seconds; the recording's segments
+      // supersede them rather than repeating the same speech on another time base
+      await tx.segment.deleteMany({ where: { transcriptId: transcript.id } })
+
+      // Create segment records
+      const segments = await Promise.all(
+        result.segments.map(segment =>
+          tx.segment.create({
+            data: {
+              transcriptId: transcript.id,
+              speakerLabel: `Speaker ${segment.speakerTag}`,
+              text: segment.text,
+              startTime: segment.startTime,
+              endTime: segment.endTime,
+              confidence: this.calculateSegmentConfidence(segment),
+              words: JSON.stringify(segment.words),
+            },
+          })
+        )
       )
-    )
 
-    return { transcript, segments }
+      return { transcript, segments }
+    })
   }
 
   private static calculateSegmentConfidence(segment: TranscriptionSegment): number {
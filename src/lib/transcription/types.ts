@@ -36,4 +36,20 @@ export interface TranscriptionOptions {
   enablePunctuation?: boolean
   enableWordTimeOffsets?: boolean
   model?: string
-}
\ No newline at end of file
+}
+
+export interface LiveSegmentInput {
+  segmentId?: string // Idempotency key, replays with the same id are skipped
+  participantId: string
+  participantName?: string
+  text: string
+  isFinal: boolean
+  confidence?: number
+  timestamp: number // milliseconds
+}
+
+export interface LiveSegmentBatchResult {
+  conversationId: string
+  inserted: number
+  duplicates: number
+}